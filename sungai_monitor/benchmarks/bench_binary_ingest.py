@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Benchmark protokol ingest biner vs JSON: byte per reading dan biaya decode.
+
+    python benchmarks/bench_binary_ingest.py [--batch 1,10,100] [--repeat 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sungai_monitor.settings')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import django
+django.setup()
+
+from datetime import datetime, timezone as dt_timezone
+from monitoring.ingest import pack_readings, unpack_readings, clean_value
+
+
+def make_records(n, start=1760000000):
+    return [(start + i * 60, 2.35 + i * 0.01, 123.4, 97.5) for i in range(n)]
+
+
+def json_payload(identifier, records):
+    return json.dumps([
+        {
+            'sensor_id': identifier,
+            'timestamp': datetime.fromtimestamp(epoch, tz=dt_timezone.utc).isoformat(),
+            'flow_rate': flow,
+            'distance': distance,
+            'battery': battery,
+        }
+        for epoch, flow, distance, battery in records
+    ]).encode()
+
+
+def decode_binary(payload):
+    _, records = unpack_readings(payload)
+    for epoch, flow, distance, battery in records:
+        datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+        clean_value('flow_rate', flow)
+        clean_value('distance', distance)
+        clean_value('battery', battery)
+
+
+def decode_json(payload):
+    for item in json.loads(payload):
+        datetime.fromisoformat(item['timestamp'])
+        clean_value('flow_rate', item['flow_rate'])
+        clean_value('distance', item['distance'])
+        clean_value('battery', item['battery'])
+
+
+def timeit(func, payload, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(payload)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch', default='1,10,100')
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'batch':>6} {'fmt':>6} {'bytes/rd':>9} {'decode us/rd':>13}")
+    for batch in [int(b) for b in args.batch.split(',')]:
+        records = make_records(batch)
+        for name, payload, func in [
+            ('binary', pack_readings('SRF001', records), decode_binary),
+            ('json', json_payload('SRF001', records), decode_json),
+        ]:
+            per_reading = timeit(func, payload, args.repeat) / batch * 1e6
+            print(f"{batch:>6} {name:>6} {len(payload) / batch:>9.1f} {per_reading:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
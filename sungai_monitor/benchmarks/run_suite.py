@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+"""
+Benchmark suite: generate synthetic load data in a throwaway test database,
+run timed scenarios and print machine-readable JSON results.
+
+    python benchmarks/run_suite.py --sensors 20 --days 14 --cadence 5 --output bench.json
+    python benchmarks/run_suite.py --scenario dashboard --scenario api_sensor_page
+
+Results are written as {"meta": {...}, "results": [{"name", "unit", "value", ...}]}
+so runs can be diffed/tracked over time.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sungai_monitor.settings')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import django
+django.setup()
+
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from monitoring.ingest import ingest_batch, pack_readings
+from monitoring.models import Sensor, Reading, Report
+
+SCENARIOS = {}
+
+
+def scenario(func):
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+def timed(func, repeat):
+    """Jalankan func berulang kali; kembalikan (durasi ms per run, jumlah query run terakhir)"""
+    durations = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            func()
+            durations.append((time.perf_counter() - start) * 1000)
+    return durations, len(queries)
+
+
+def latency_result(name, durations, queries, **extra):
+    durations = sorted(durations)
+    return dict(
+        name=name,
+        unit='ms',
+        value=round(statistics.median(durations), 3),
+        p95=round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 3),
+        max=round(durations[-1], 3),
+        runs=len(durations),
+        queries=queries,
+        **extra,
+    )
+
+
+@scenario
+def ingest_batch_throughput(ctx):
+    now = timezone.now()
+    identifiers = list(Sensor.objects.values_list('identifier', flat=True)[:50])
+    rows = [
+        (identifiers[i % len(identifiers)], now - timedelta(seconds=i), 2.0, 150.0, 90.0, None, None)
+        for i in range(ctx.args.ingest_rows)
+    ]
+    start = time.perf_counter()
+    for i in range(0, len(rows), 1000):
+        ingest_batch(rows[i:i + 1000])
+    elapsed = time.perf_counter() - start
+    return [dict(name='ingest_batch_throughput', unit='rows/s', value=round(len(rows) / elapsed, 1),
+                 rows=len(rows))]
+
+
+@scenario
+def ingest_http(ctx):
+    sensor = Sensor.objects.first()
+    now = timezone.now()
+    payload = {'sensor_id': sensor.identifier, 'flow_rate': 1.5, 'distance': 120.0, 'battery': 90.0}
+
+    json_client, binary_client = Client(), Client()
+    # Satu sensor dipakai berulang kali: matikan batas laju per perangkat supaya yang diukur jalur simpan
+    with override_settings(INGEST_RATE_LIMIT=0):
+        durations, queries = timed(
+            lambda: json_client.post('/api/ingest/', payload, content_type='application/json'), ctx.args.repeat
+        )
+        results = [latency_result('ingest_http_json', durations, queries)]
+
+        # Epoch berbeda per request supaya tidak tertahan filter duplikat
+        packets = iter(
+            pack_readings(sensor.identifier, [(int(now.timestamp()) - 10 - i, 1.5, 120.0, 90.0)])
+            for i in range(ctx.args.repeat)
+        )
+        durations, queries = timed(
+            lambda: binary_client.post('/api/ingest/binary/', next(packets), content_type='application/octet-stream'),
+            ctx.args.repeat,
+        )
+        results.append(latency_result('ingest_http_binary', durations, queries))
+
+    # Perangkat yang membanjiri: semua request sesudah burst harus ditolak 429 tanpa menyentuh database
+    with override_settings(INGEST_RATE_LIMIT=0.001, INGEST_RATE_BURST=1):
+        json_client.post('/api/ingest/', {**payload, 'sensor_id': 'BENCH-FLOOD'}, content_type='application/json')
+        durations, queries = timed(
+            lambda: json_client.post('/api/ingest/', {**payload, 'sensor_id': 'BENCH-FLOOD'},
+                                     content_type='application/json'),
+            ctx.args.repeat,
+        )
+    results.append(latency_result('ingest_http_rate_limited', durations, queries))
+    return results
+
+
+@scenario
+def dashboard(ctx):
+    durations, queries = timed(lambda: ctx.client.get('/'), ctx.args.repeat)
+    response = ctx.client.get('/')
+    return [latency_result('dashboard_render', durations, queries, bytes=len(response.content))]
+
+
+@scenario
+def api_sensor_page(ctx):
+    sensor = Sensor.objects.first()
+    url = f'/api/sensors/{sensor.pk}/readings/?limit=100'
+    durations, queries = timed(lambda: ctx.client.get(url), ctx.args.repeat)
+    response = ctx.client.get(url)
+    return [latency_result('api_sensor_readings_page', durations, queries, bytes=len(response.content))]
+
+
+@scenario
+def api_reading_list(ctx):
+    total = Reading.objects.count()
+    if total > ctx.args.max_list_rows:
+        return [dict(name='api_reading_list', unit='ms', value=None,
+                     skipped=f'{total} readings > --max-list-rows {ctx.args.max_list_rows}')]
+    durations, queries = timed(lambda: ctx.client.get('/api/readings/'), max(1, ctx.args.repeat // 5))
+    response = ctx.client.get('/api/readings/')
+    return [latency_result('api_reading_list', durations, queries, bytes=len(response.content))]
+
+
+@scenario
+def report_build(ctx):
+    try:
+        from sungai_monitor.utils import generate_pdf_report
+    except ImportError as e:
+        return [dict(name='report_build', unit='ms', value=None, skipped=str(e))]
+
+    end = timezone.now()
+    report = Report.objects.create(
+        title='Benchmark Report', report_type='weekly',
+        start_date=end - timedelta(days=7), end_date=end, generated_by=ctx.user,
+    )
+    report.sensors.set(Sensor.objects.all()[:ctx.args.report_sensors])
+    durations, queries = timed(lambda: generate_pdf_report(report), max(1, ctx.args.repeat // 5))
+    return [latency_result('report_build', durations, queries, sensors=report.sensors.count())]
+
+
+@scenario
+def resample_grid(ctx):
+    from monitoring.resample import resample
+    sensor_ids = list(Sensor.objects.values_list('pk', flat=True))
+    end = timezone.now()
+    start = end - timedelta(days=ctx.args.days)
+    durations, queries = timed(
+        lambda: resample(sensor_ids, start, end, 900, fields=('distance', 'flow_rate'), fill='linear', limit=4),
+        max(1, ctx.args.repeat // 5),
+    )
+    return [latency_result('resample_grid_15min', durations, queries, sensors=len(sensor_ids),
+                           readings=Reading.objects.count())]
+
+
+@scenario
+def raw_promoted_filter(ctx):
+    from django.db.models import Avg, Max
+    sensor = Sensor.objects.first()
+    readings = Reading.objects.filter(sensor=sensor, temperature__gte=28)
+    durations, queries = timed(
+        lambda: readings.aggregate(avg=Avg('temperature'), max=Max('humidity')), ctx.args.repeat
+    )
+    results = [latency_result('reading_temperature_aggregate', durations, queries, rows=readings.count())]
+
+    url = f'/api/sensors/{sensor.pk}/readings/?limit=100&temperature__gte=28'
+    for name, suffix in (('api_readings_temperature_filter', ''), ('api_readings_temperature_filter_raw', '&include_raw=1')):
+        durations, queries = timed(lambda: ctx.client.get(url + suffix), ctx.args.repeat)
+        response = ctx.client.get(url + suffix)
+        results.append(latency_result(name, durations, queries, bytes=len(response.content)))
+    return results
+
+
+@scenario
+def api_key_auth(ctx):
+    from monitoring.authentication import issue_key, key_cache, verify_key
+    sensor = Sensor.objects.first()
+    key = issue_key(sensor)
+    repeat = max(ctx.args.repeat, 200)
+
+    def cold():
+        key_cache.clear()
+        verify_key(key)
+
+    # Per verifikasi dalam mikrodetik: cold = lookup prefix + HMAC, cached = HMAC + LRU saja
+    results = []
+    for name, func in (('api_key_verify_cold', cold), ('api_key_verify_cached', lambda: verify_key(key))):
+        durations, queries = timed(func, repeat)
+        result = latency_result(name, [d * 1000 for d in durations], queries)
+        result['unit'] = 'us'
+        results.append(result)
+
+    # Overhead end-to-end: request ingest dengan dan tanpa header key (filter duplikat menolak sebelum database)
+    client = Client()
+    payload = {'sensor_id': sensor.identifier, 'distance': 120.0, 'timestamp': timezone.now().isoformat()}
+    with override_settings(INGEST_RATE_LIMIT=0):
+        client.post('/api/ingest/', payload, content_type='application/json')
+        for name, headers in (('ingest_duplicate_no_key', {}), ('ingest_duplicate_with_key', {'HTTP_X_API_KEY': key})):
+            durations, queries = timed(
+                lambda: client.post('/api/ingest/', payload, content_type='application/json', **headers), repeat
+            )
+            results.append(latency_result(name, durations, queries))
+    return results
+
+
+class Context:
+    def __init__(self, args):
+        self.args = args
+        self.user = User.objects.create_user('bench', password='bench')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sensors', type=int, default=10)
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--cadence', type=float, default=5)
+    parser.add_argument('--floods', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--ingest-rows', type=int, default=5000)
+    parser.add_argument('--report-sensors', type=int, default=5)
+    parser.add_argument('--max-list-rows', type=int, default=20000)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Run only these scenarios (repeatable)')
+    parser.add_argument('--output', help='Write JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        started = time.perf_counter()
+        call_command('generate_load_data', sensors=args.sensors, days=args.days,
+                     cadence=args.cadence, floods=args.floods, stdout=open(os.devnull, 'w'))
+        meta = {
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'sensors': Sensor.objects.count(),
+            'readings': Reading.objects.count(),
+            'generate_seconds': round(time.perf_counter() - started, 3),
+        }
+
+        ctx = Context(args)
+        results = []
+        for name in args.scenario or list(SCENARIOS):
+            results.extend(SCENARIOS[name](ctx))
+            print(f'{name}: done', file=sys.stderr)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    output = json.dumps({'meta': meta, 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
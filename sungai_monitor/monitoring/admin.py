@@ -1,11 +1,42 @@
 from django.contrib import admin
-from .models import Sensor, Reading
+from .models import Sensor, SensorApiKey, SensorGroup, Reading, SensorCalibration, AlertEpisode, AlertSubscription
 
 @admin.register(Sensor)
 class SensorAdmin(admin.ModelAdmin):
-    list_display = ('name','identifier','location','created_at')
+    list_display = ('name','identifier','location','group','alert_level','created_at')
+    list_filter = ('group',)
+
+@admin.register(SensorGroup)
+class SensorGroupAdmin(admin.ModelAdmin):
+    list_display = ('name','group_type','parent','sensor_count','online_count','worst_alert','avg_distance')
+    list_filter = ('group_type',)
 
 @admin.register(Reading)
 class ReadingAdmin(admin.ModelAdmin):
-    list_display = ('sensor','timestamp','flow_rate','distance','created_at')
+    list_display = ('sensor','timestamp','flow_rate','distance','quality','created_at')
+    list_filter = ('sensor','quality')
+
+@admin.register(SensorCalibration)
+class SensorCalibrationAdmin(admin.ModelAdmin):
+    list_display = ('sensor','valid_from','mount_height','distance_offset','distance_scale','flow_unit','flow_scale')
+    list_filter = ('sensor',)
+
+@admin.register(AlertEpisode)
+class AlertEpisodeAdmin(admin.ModelAdmin):
+    list_display = ('sensor','level','started_at','ended_at','reading_count','peak_flow','peak_distance')
+    list_filter = ('level','sensor')
+
+@admin.register(AlertSubscription)
+class AlertSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('user','sensor','group','min_level','email','telegram','is_active')
+    list_filter = ('min_level','is_active','group')
+
+@admin.register(SensorApiKey)
+class SensorApiKeyAdmin(admin.ModelAdmin):
+    """Hanya hash yang tersimpan; key baru dibuat lewat `manage.py rotate_api_key`"""
+    list_display = ('sensor','prefix','created_at','expires_at')
     list_filter = ('sensor',)
+    readonly_fields = ('sensor','prefix','key_hash','created_at')
+    
+    def has_add_permission(self, request):
+        return False
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class MonitoringConfig(AppConfig):
     name = 'monitoring'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import profiling
+        profiling.install()
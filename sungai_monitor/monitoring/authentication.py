@@ -0,0 +1,235 @@
+"""
+Autentikasi perangkat dengan API key yang di-hash.
+
+Format key: "<prefix>.<rahasia>" (prefix 8 karakter hex). Database hanya
+menyimpan prefix dan HMAC-SHA256(API_KEY_SECRET atau SECRET_KEY, key);
+key acak 256-bit tidak butuh KDF lambat seperti password, sehingga satu
+HMAC (mikrodetik) cukup untuk verifikasi.
+
+Hasil verifikasi disimpan di LRU per proses (API_KEY_CACHE_SIZE entri,
+dikunci dengan digest, bukan key plaintext) selama API_KEY_CACHE_TTL detik,
+jadi request berikutnya tidak menyentuh database. expires_at ikut disimpan
+dan dicek setiap request, sehingga key lama dalam masa rotasi berhenti
+berlaku tepat waktu.
+
+Saat key atau sensor berubah (signal, issue_key) nomor generasi di Django
+cache dinaikkan; setiap verifikasi membandingkannya dengan generasi LRU
+proses ini dan mengosongkan LRU kalau berbeda. Dengan cache bersama
+(Redis/Memcached) pencabutan key langsung berlaku di semua worker; dengan
+LocMemCache bawaan hanya di proses yang sama, proses lain menyusul paling
+lambat setelah TTL.
+
+Perangkat mengirim key lewat header `Authorization: Device <key>` atau
+`X-API-Key: <key>`.
+"""
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import authentication, exceptions, permissions
+
+from .models import SensorApiKey
+
+KEYWORD = 'Device'
+PREFIX_LENGTH = 8
+GENERATION_KEY = 'api-key-generation'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def hash_key(key):
+    secret = _setting('API_KEY_SECRET', None) or settings.SECRET_KEY
+    return hmac.new(secret.encode(), key.encode(), hashlib.sha256).hexdigest()
+
+
+def key_prefix(key):
+    # Key lama (sebelum format prefix.rahasia) memakai 8 karakter pertamanya
+    return key.split('.', 1)[0][:16] if '.' in key else key[:PREFIX_LENGTH]
+
+
+def generate_key():
+    return f"{secrets.token_hex(PREFIX_LENGTH // 2)}.{secrets.token_urlsafe(32)}"
+
+
+def issue_key(sensor, overlap=None, now=None):
+    """
+    Buat API key baru untuk sensor
+
+    Args:
+        overlap: timedelta; kalau diisi, key lain yang masih berlaku dibuat
+                 kedaluwarsa setelah jangka ini (0 = langsung dicabut)
+
+    Returns:
+        str: key plaintext, hanya bisa dilihat sekali ini
+    """
+    now = now or timezone.now()
+    if overlap is not None:
+        cutoff = now + overlap
+        sensor.api_keys.filter(expires_at__isnull=True).update(expires_at=cutoff)
+        sensor.api_keys.filter(expires_at__gt=cutoff).update(expires_at=cutoff)
+    key = generate_key()
+    SensorApiKey.objects.create(sensor=sensor, prefix=key_prefix(key), key_hash=hash_key(key))
+    # update() tidak memicu signal; expires_at baru harus terlihat semua worker
+    invalidate_keys()
+    return key
+
+
+# ========== VERIFIKASI ==========
+
+class DeviceUser:
+    """Principal request perangkat (bukan User Django; pk None supaya tidak ditulis ke SystemLog.user)"""
+    pk = None
+    is_authenticated = True
+    is_anonymous = False
+    is_staff = False
+    is_superuser = False
+
+    def __init__(self, sensor_id, identifier):
+        self.sensor_id = sensor_id
+        self.identifier = identifier
+
+    def __str__(self):
+        return f"device:{self.identifier}"
+
+
+class KeyCache:
+    """LRU digest -> (sensor_id, identifier, expires_at, disimpan_sampai); None untuk key tidak dikenal"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = None
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            if time.monotonic() >= entry[3]:
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return entry
+
+    def put(self, digest, sensor_id, identifier, expires_at, ttl):
+        entry = (sensor_id, identifier, expires_at, time.monotonic() + ttl)
+        with self._lock:
+            self._entries[digest] = entry
+            self._entries.move_to_end(digest)
+            while len(self._entries) > _setting('API_KEY_CACHE_SIZE', 10000):
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def sync(self):
+        """Kosongkan LRU kalau generasi di cache bersama sudah dinaikkan proses lain"""
+        generation = cache.get(GENERATION_KEY)
+        if generation != self.generation:
+            with self._lock:
+                self._entries.clear()
+                self.generation = generation
+
+    def __len__(self):
+        return len(self._entries)
+
+
+key_cache = KeyCache()
+
+
+def invalidate_keys():
+    """Batalkan hasil verifikasi yang tersimpan di semua proses"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, timeout=None)
+    key_cache.clear()
+
+
+def verify_key(key, now=None):
+    """
+    Returns:
+        DeviceUser, atau None kalau key tidak dikenal/kedaluwarsa/sensor nonaktif
+    """
+    if not key:
+        return None
+    key_cache.sync()
+    digest = hash_key(key)
+    entry = key_cache.get(digest)
+    if entry is None:
+        entry = _lookup(key, digest)
+    sensor_id, identifier, expires_at, _ = entry
+    if sensor_id is None or (expires_at is not None and expires_at <= (now or timezone.now())):
+        return None
+    return DeviceUser(sensor_id, identifier)
+
+
+def _lookup(key, digest):
+    candidates = SensorApiKey.objects.filter(prefix=key_prefix(key), sensor__is_active=True) \
+        .values_list('key_hash', 'sensor_id', 'sensor__identifier', 'expires_at')
+    for key_hash, sensor_id, identifier, expires_at in candidates:
+        if hmac.compare_digest(key_hash, digest):
+            return key_cache.put(digest, sensor_id, identifier, expires_at, _setting('API_KEY_CACHE_TTL', 300))
+    # Key salah juga di-cache sebentar supaya perangkat yang salah konfigurasi tidak membebani database
+    return key_cache.put(digest, None, None, None, _setting('API_KEY_NEGATIVE_TTL', 30))
+
+
+class DeviceKeyAuthentication(authentication.BaseAuthentication):
+    """
+    DRF authentication untuk perangkat; request.user = DeviceUser,
+    request.auth = sensor_id
+    """
+
+    def authenticate(self, request):
+        key = None
+        header = authentication.get_authorization_header(request).split()
+        if header and header[0].lower() == KEYWORD.lower().encode():
+            if len(header) != 2:
+                raise exceptions.AuthenticationFailed('Header Authorization Device tidak valid')
+            key = header[1].decode('latin-1')
+        elif request.headers.get('X-API-Key'):
+            key = request.headers['X-API-Key']
+        if key is None:
+            return None
+        device = verify_key(key)
+        if device is None:
+            raise exceptions.AuthenticationFailed('API key tidak valid atau kedaluwarsa')
+        return device, device.sensor_id
+
+    def authenticate_header(self, request):
+        return KEYWORD
+
+
+class DeviceIngestPermission(permissions.BasePermission):
+    """Ingest tanpa API key hanya boleh selama INGEST_REQUIRE_API_KEY = False"""
+
+    def has_permission(self, request, view):
+        return isinstance(request.user, DeviceUser) or not _setting('INGEST_REQUIRE_API_KEY', False)
+
+
+def device_identifier(request, claimed):
+    """
+    Identifier sensor untuk request ingest. Perangkat yang login dengan
+    API key hanya boleh mengirim untuk sensornya sendiri; sensor_id boleh
+    dikosongkan.
+
+    Raises:
+        PermissionDenied: identifier berbeda dengan pemilik key
+    """
+    device = request.user if isinstance(request.user, DeviceUser) else None
+    if device is None:
+        return claimed
+    if claimed and claimed != device.identifier:
+        raise exceptions.PermissionDenied(f'API key ini bukan milik sensor {claimed}')
+    return device.identifier
+
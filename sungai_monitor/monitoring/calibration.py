@@ -0,0 +1,154 @@
+"""
+Transformasi nilai mentah sensor ke besaran fisik berdasarkan SensorCalibration.
+
+Setiap kalibrasi dikompilasi menjadi Transform berisi koefisien linear:
+
+    water_level = level_base - distance * level_scale      (cm di atas datum)
+    flow_m3s    = flow_rate * flow_factor                  (m³/s)
+
+Transform dipakai saat ingest (apply) dan saat hitung ulang histori
+(expressions, sebagai UPDATE berbasis set di database), sehingga hasil
+keduanya sama. Kalibrasi per sensor di-cache di memori proses dan
+dikosongkan lewat signal saat SensorCalibration berubah. Signal juga
+menaikkan nomor generasi di Django cache; proses lain membandingkannya
+paling sering sekali per SYNC_INTERVAL detik dan mengosongkan cache-nya
+kalau berbeda (seperti API key, lihat authentication.py).
+"""
+import threading
+import time
+from bisect import bisect_right
+
+from django.core.cache import cache
+from django.db.models import F, Value
+
+from .models import SensorCalibration
+
+FLOW_UNIT_FACTORS = {
+    'm3/s': 1.0,
+    'l/s': 0.001,
+    'm3/h': 1 / 3600,
+    'l/min': 0.001 / 60,
+}
+
+GENERATION_KEY = 'calibration-generation'
+# Cek generasi di cache bersama paling sering sekali per detik, bukan per reading
+SYNC_INTERVAL = 1.0
+
+
+class Transform:
+    __slots__ = ('level_base', 'level_scale', 'flow_factor')
+
+    def __init__(self, level_base=None, level_scale=1.0, flow_factor=1.0):
+        self.level_base = level_base
+        self.level_scale = level_scale
+        self.flow_factor = flow_factor
+
+    @classmethod
+    def compile(cls, calibration):
+        level_base = None
+        if calibration.mount_height is not None:
+            level_base = calibration.mount_height - calibration.distance_offset
+        return cls(
+            level_base=level_base,
+            level_scale=calibration.distance_scale,
+            flow_factor=calibration.flow_scale * FLOW_UNIT_FACTORS[calibration.flow_unit],
+        )
+
+    def apply(self, reading):
+        """Isi water_level dan flow_m3s dari distance dan flow_rate"""
+        reading.water_level = None
+        if self.level_base is not None and reading.distance is not None:
+            reading.water_level = self.level_base - reading.distance * self.level_scale
+        reading.flow_m3s = None if reading.flow_rate is None else reading.flow_rate * self.flow_factor
+
+    def expressions(self):
+        """Ekspresi ORM setara apply() untuk QuerySet.update()"""
+        if self.level_base is None:
+            water_level = None
+        else:
+            water_level = Value(self.level_base) - F('distance') * Value(self.level_scale)
+        return {'water_level': water_level, 'flow_m3s': F('flow_rate') * Value(self.flow_factor)}
+
+
+# Tanpa kalibrasi: flow dianggap sudah m³/s, water_level tidak diketahui
+DEFAULT_TRANSFORM = Transform()
+
+
+class CalibrationCache:
+    """sensor_id -> ([valid_from epoch], [Transform]) terurut naik"""
+
+    def __init__(self):
+        self._sensors = {}
+        self._lock = threading.Lock()
+        self.generation = None
+        self._synced_at = None
+
+    def sync(self):
+        """Kosongkan cache kalau generasi di cache bersama sudah dinaikkan proses lain"""
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._synced_at < SYNC_INTERVAL:
+            return
+        self._synced_at = now
+        generation = cache.get(GENERATION_KEY)
+        if generation != self.generation:
+            with self._lock:
+                self._sensors.clear()
+                self.generation = generation
+
+    def load(self, sensor_ids):
+        """Muat kalibrasi sensor yang belum ada di cache dalam satu query"""
+        self.sync()
+        missing = [sensor_id for sensor_id in sensor_ids if sensor_id not in self._sensors]
+        if not missing:
+            return
+        loaded = {sensor_id: ([], []) for sensor_id in missing}
+        for calibration in SensorCalibration.objects.filter(sensor_id__in=missing).order_by('valid_from'):
+            starts, transforms = loaded[calibration.sensor_id]
+            starts.append(calibration.valid_from.timestamp())
+            transforms.append(Transform.compile(calibration))
+        with self._lock:
+            self._sensors.update(loaded)
+
+    def transform_for(self, sensor_id, timestamp):
+        """Transform yang berlaku untuk reading sensor pada `timestamp`"""
+        self.sync()
+        if sensor_id not in self._sensors:
+            self.load([sensor_id])
+        starts, transforms = self._sensors[sensor_id]
+        index = bisect_right(starts, timestamp.timestamp()) - 1
+        return transforms[index] if index >= 0 else DEFAULT_TRANSFORM
+
+    def apply(self, reading):
+        self.transform_for(reading.sensor_id, reading.timestamp).apply(reading)
+
+    def invalidate(self, sensor_id=None):
+        with self._lock:
+            if sensor_id is None:
+                self._sensors.clear()
+            else:
+                self._sensors.pop(sensor_id, None)
+
+    def changed(self, sensor_id):
+        """Kalibrasi sensor berubah: kosongkan di proses ini dan minta proses lain menyusul"""
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.set(GENERATION_KEY, 1, timeout=None)
+        self.invalidate(sensor_id)
+
+
+calibrations = CalibrationCache()
+
+
+def periods(sensor_id):
+    """
+    Rentang waktu berlakunya setiap transform milik sensor
+
+    Returns:
+        list (mulai atau None, akhir atau None, Transform); rentang pertama
+        (sebelum kalibrasi pertama) memakai DEFAULT_TRANSFORM
+    """
+    calibration_list = list(SensorCalibration.objects.filter(sensor_id=sensor_id).order_by('valid_from'))
+    bounds = [None] + [c.valid_from for c in calibration_list] + [None]
+    transforms = [DEFAULT_TRANSFORM] + [Transform.compile(c) for c in calibration_list]
+    return [(bounds[i], bounds[i + 1], transform) for i, transform in enumerate(transforms)]
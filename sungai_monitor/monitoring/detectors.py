@@ -0,0 +1,281 @@
+"""
+Deteksi laju kenaikan muka air (rate-of-rise) secara streaming.
+
+Threshold distance baru berbunyi setelah air sudah tinggi; detektor ini
+memberi peringatan dini dari kecepatan naiknya. Per sensor hanya disimpan
+beberapa jumlahan berbobot eksponensial (konstanta waktu RISE_WINDOW_SECONDS):
+
+    - EWMA distance
+    - slope regresi linear berbobot distance terhadap waktu (laju naik)
+    - rata-rata & varians laju sesaat, untuk z-score laju terbaru
+
+sehingga update per reading O(1) tanpa query histori. Distance adalah jarak
+sensor ke permukaan air, jadi air naik = distance mengecil; laju naik
+dinyatakan dalam cm/jam (positif = naik).
+
+Batas laju per sensor diatur lewat SensorThreshold dengan threshold_type
+'rise' (min_value dalam cm/jam); kalau tidak ada, dipakai
+settings.RISE_RATE_WARNING / RISE_RATE_DANGER.
+
+State disimpan per proses dan mulai kosong setelah restart, jadi alert rise
+baru muncul setelah RISE_MIN_SAMPLES reading. Untuk data historis pakai
+`python manage.py backfill_rise_alerts` (versi vektor NumPy, hasil identik).
+"""
+import math
+import threading
+
+from django.conf import settings
+
+LEVEL_ORDER = {'safe': 0, 'warning': 1, 'danger': 2, 'critical': 3}
+
+# Varians waktu minimum (detik^2) supaya slope tidak dihitung dari titik yang berimpit
+MIN_TIME_VARIANCE = 1.0
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def rise_levels(thresholds):
+    """
+    Daftar (laju minimum cm/jam, alert_level) terurut menurun
+
+    Args:
+        thresholds: SensorThreshold milik satu sensor (boleh berisi tipe lain)
+    """
+    levels = [
+        (t.min_value, t.alert_level) for t in thresholds
+        if t.is_active and t.threshold_type == 'rise' and t.min_value is not None
+    ]
+    if not levels:
+        levels = [
+            (_setting('RISE_RATE_DANGER', 40.0), 'danger'),
+            (_setting('RISE_RATE_WARNING', 20.0), 'warning'),
+        ]
+    return sorted(levels, reverse=True)
+
+
+def level_for_rate(rate, levels):
+    for min_rate, level in levels:
+        if rate >= min_rate:
+            return level
+    return 'safe'
+
+
+class RiseState:
+    """
+    Jumlahan berbobot exp(-umur/tau) dengan origin waktu di reading terakhir:
+    s0 = sum(w), st = sum(w*t), sx = sum(w*x), stt = sum(w*t^2), stx = sum(w*t*x),
+    r0/r1/r2 = sum(w), sum(w*r), sum(w*r^2) untuk laju sesaat r
+    """
+    __slots__ = ('last_t', 'last_x', 'count', 's0', 'st', 'sx', 'stt', 'stx',
+                 'r0', 'r1', 'r2', 'levels')
+
+    def __init__(self, levels=None):
+        self.last_t = None
+        self.last_x = None
+        self.count = 0
+        self.s0 = self.st = self.sx = self.stt = self.stx = 0.0
+        self.r0 = self.r1 = self.r2 = 0.0
+        self.levels = levels
+
+    def update(self, t, x, tau):
+        """
+        Tambahkan satu titik (t detik epoch, x distance cm)
+
+        Returns:
+            tuple (laju naik cm/jam atau None, z-score atau None); None juga
+            untuk reading yang lebih lama dari reading terakhir (diabaikan)
+        """
+        if self.last_t is None:
+            self.last_t, self.last_x = t, x
+            self.count, self.s0, self.sx = 1, 1.0, x
+            return None, None
+        dt = t - self.last_t
+        if dt <= 0:
+            return None, None
+
+        decay = math.exp(-dt / tau)
+        # Pindahkan origin waktu ke titik baru (titik lama jadi t negatif), lalu luruhkan
+        self.stt = decay * (self.stt - 2 * dt * self.st + dt * dt * self.s0)
+        self.stx = decay * (self.stx - dt * self.sx)
+        self.st = decay * (self.st - dt * self.s0)
+        self.s0 = decay * self.s0 + 1.0
+        self.sx = decay * self.sx + x
+
+        instant = (self.last_x - x) / dt * 3600
+        z = None
+        if self.r0 > 0:
+            mean = self.r1 / self.r0
+            variance = self.r2 / self.r0 - mean * mean
+            if variance > 0:
+                z = (instant - mean) / math.sqrt(variance)
+        self.r0 = decay * self.r0 + 1.0
+        self.r1 = decay * self.r1 + instant
+        self.r2 = decay * self.r2 + instant * instant
+
+        self.last_t, self.last_x = t, x
+        self.count += 1
+        return self.rise_rate(), z
+
+    def rise_rate(self):
+        """Laju naik (cm/jam) dari slope regresi berbobot; None kalau belum cukup data"""
+        denominator = self.s0 * self.stt - self.st * self.st
+        if denominator <= MIN_TIME_VARIANCE * self.s0 * self.s0:
+            return None
+        slope = (self.s0 * self.stx - self.st * self.sx) / denominator
+        return -slope * 3600
+
+    @property
+    def ewma(self):
+        return self.sx / self.s0 if self.s0 else None
+
+
+class RiseDetector:
+    """State RiseState per sensor_id untuk proses ini"""
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def evaluate(self, reading, thresholds=None):
+        """
+        Update state sensor dengan reading baru (belum disimpan) dan naikkan
+        alert_level-nya kalau laju naik melewati batas
+
+        Args:
+            thresholds: threshold aktif sensor (opsional); kalau None, threshold
+                        'rise' di-query sekali lalu disimpan di state
+        """
+        if reading.distance is None:
+            return None
+        with self._lock:
+            state = self._states.get(reading.sensor_id)
+            if state is None:
+                state = self._states[reading.sensor_id] = RiseState()
+            if thresholds is not None:
+                state.levels = rise_levels(thresholds)
+            elif state.levels is None:
+                state.levels = rise_levels(reading.sensor.thresholds.filter(threshold_type='rise'))
+            rate, z = state.update(
+                reading.timestamp.timestamp(), reading.distance, _setting('RISE_WINDOW_SECONDS', 1800)
+            )
+            if rate is None or state.count < _setting('RISE_MIN_SAMPLES', 3):
+                return None
+            level = level_for_rate(rate, state.levels)
+
+        if LEVEL_ORDER[level] > LEVEL_ORDER.get(reading.alert_level, 0):
+            reading.alert_level = level
+            note = f"Muka air naik {rate:.1f} cm/jam"
+            if z is not None:
+                note += f" (z={z:.1f})"
+            reading.notes = note
+        return level
+
+    def state(self, sensor_id):
+        return self._states.get(sensor_id)
+
+    def reset(self, sensor_id=None):
+        with self._lock:
+            if sensor_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(sensor_id, None)
+
+    def reset_levels(self, sensor_id):
+        """Threshold sensor berubah: muat ulang batas laju pada reading berikutnya"""
+        with self._lock:
+            state = self._states.get(sensor_id)
+            if state is not None:
+                state.levels = None
+
+
+rise_detector = RiseDetector()
+
+
+# ========== BACKFILL (NUMPY) ==========
+
+# Panjang blok dalam satuan tau; exp(-50) masih jauh di atas batas underflow float64
+_BLOCK_TAUS = 50
+
+
+def rise_rates(t, x, tau, state=None):
+    """
+    Versi vektor dari RiseState.update untuk histori satu sensor
+
+    Bobot exp(-(t_n - t_i)/tau) ditulis sebagai exp((t_i - T)/tau) / exp((t_n - T)/tau)
+    dengan T titik terakhir blok; pembagi bersama itu saling menghapus di slope,
+    mean dan varians, jadi semua jumlahan cukup berupa cumsum. Data dipotong per
+    blok _BLOCK_TAUS supaya bobot dalam satu blok tidak underflow; state dibawa
+    antar blok.
+
+    Args:
+        t: array detik epoch, terurut naik
+        x: array distance (cm)
+        state: RiseState awal (opsional); diperbarui ke titik terakhir
+
+    Returns:
+        tuple (rates, z): laju naik cm/jam dan z-score per titik, NaN bila
+        belum tersedia (sama seperti None di versi streaming)
+    """
+    import numpy as np
+
+    t = np.asarray(t, dtype=float)
+    x = np.asarray(x, dtype=float)
+    n = len(t)
+    rates = np.full(n, np.nan)
+    zscores = np.full(n, np.nan)
+    state = state or RiseState()
+
+    start = 0
+    if state.last_t is None and n:
+        state.update(t[0], x[0], tau)
+        start = 1
+    # Titik yang tidak lebih baru dari titik sebelumnya diabaikan, sama seperti streaming
+    keep = np.zeros(n, dtype=bool)
+    if start < n:
+        running_max = np.maximum.accumulate(np.concatenate(([state.last_t], t[start:])))
+        keep[start:] = t[start:] > running_max[:-1]
+
+    while start < n:
+        t0 = state.last_t
+        end = start + int(np.searchsorted(t[start:], t0 + _BLOCK_TAUS * tau, side='right'))
+        end = max(end, start + 1)
+        index = np.nonzero(keep[start:end])[0] + start
+        if len(index):
+            tb, xb = t[index], x[index]
+            u = tb - t0
+            w = np.exp((u - u[-1]) / tau)
+            carry = math.exp(-u[-1] / tau)
+            s0 = carry * state.s0 + np.cumsum(w)
+            st = carry * state.st + np.cumsum(w * u)
+            sx = carry * state.sx + np.cumsum(w * xb)
+            stt = carry * state.stt + np.cumsum(w * u * u)
+            stx = carry * state.stx + np.cumsum(w * u * xb)
+            denominator = s0 * stt - st * st
+            previous_t = np.concatenate(([t0], tb[:-1]))
+            previous_x = np.concatenate(([state.last_x], xb[:-1]))
+            instant = (previous_x - xb) / (tb - previous_t) * 3600
+            # z memakai statistik laju SEBELUM titik ini ditambahkan
+            r0 = carry * state.r0 + np.concatenate(([0.0], np.cumsum(w)))
+            r1 = carry * state.r1 + np.concatenate(([0.0], np.cumsum(w * instant)))
+            r2 = carry * state.r2 + np.concatenate(([0.0], np.cumsum(w * instant * instant)))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                slope = (s0 * stx - st * sx) / denominator
+                rates[index] = np.where(denominator > MIN_TIME_VARIANCE * s0 * s0, -slope * 3600, np.nan)
+                mean = r1[:-1] / r0[:-1]
+                variance = r2[:-1] / r0[:-1] - mean * mean
+                zscores[index] = np.where((r0[:-1] > 0) & (variance > 0),
+                                          (instant - mean) / np.sqrt(variance), np.nan)
+
+            # State baru: origin waktu dan skala bobot di titik terakhir blok
+            shift = u[-1]
+            state.stt = stt[-1] - 2 * shift * st[-1] + shift * shift * s0[-1]
+            state.stx = stx[-1] - shift * sx[-1]
+            state.st = st[-1] - shift * s0[-1]
+            state.s0, state.sx = s0[-1], sx[-1]
+            state.r0, state.r1, state.r2 = r0[-1], r1[-1], r2[-1]
+            state.last_t, state.last_x = float(tb[-1]), float(xb[-1])
+            state.count += len(index)
+        start = end
+    return rates, zscores
@@ -0,0 +1,82 @@
+"""
+Konfigurasi downlink perangkat: interval lapor adaptif.
+
+Perangkat melapor jarang saat sungai tenang dan rapat saat banjir. Interval
+diambil dari DEVICE_REPORT_INTERVALS menurut alert_level sensor saat ini;
+sensor yang masih safe tapi airnya naik >= DEVICE_RISING_RATE cm/jam (laju
+dari rise detector) sudah memakai interval warning.
+
+Konfigurasi ikut dikirim di respons ingest HTTP sehingga perangkat tidak
+perlu request tambahan. Perangkat yang mengirim lewat UDP/MQTT (tanpa
+respons) memakai GET /api/device/config/ dengan API key-nya (lihat
+authentication.py); jawabannya diambil dari cache proses sensor_id -> config
+yang diperbarui setiap ingest reading terbaru (reading terlambat diabaikan)
+dan kedaluwarsa setelah DEVICE_CONFIG_TTL detik, lalu dibaca ulang dari
+Sensor.alert_level.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .detectors import rise_detector
+from .models import Sensor
+
+DEFAULT_INTERVALS = {'safe': 900, 'warning': 300, 'danger': 60, 'critical': 60}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def report_interval(alert_level, rise_rate=None):
+    """Interval lapor (detik) untuk level alert dan laju naik (cm/jam) ini"""
+    intervals = {**DEFAULT_INTERVALS, **_setting('DEVICE_REPORT_INTERVALS', {})}
+    interval = intervals.get(alert_level, intervals['safe'])
+    if rise_rate is not None and rise_rate >= _setting('DEVICE_RISING_RATE', 10.0):
+        interval = min(interval, intervals['warning'])
+    return interval
+
+
+def _rise_rate(sensor_id):
+    state = rise_detector.state(sensor_id)
+    return state.rise_rate() if state is not None else None
+
+
+class DeviceConfigCache:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configs = {}
+
+    def clear(self):
+        with self._lock:
+            self._configs = {}
+
+    def update(self, sensor_id, alert_level, timestamp=None):
+        """
+        Hitung dan simpan config dari alert_level terbaru (dipanggil saat ingest)
+
+        Args:
+            timestamp: waktu reading asal alert_level; reading yang lebih lama
+                       dari last_seen sensor (terlambat/backfill) tidak mengubah
+                       config dan yang dikembalikan adalah config saat ini
+        """
+        if timestamp is not None and Sensor.objects.filter(pk=sensor_id, last_seen__gt=timestamp).exists():
+            return self.for_sensor(sensor_id)
+        config = {
+            'report_interval': report_interval(alert_level, _rise_rate(sensor_id)),
+            'alert_level': alert_level,
+        }
+        self._configs[sensor_id] = (config, time.monotonic() + _setting('DEVICE_CONFIG_TTL', 60))
+        return config
+
+    def for_sensor(self, sensor_id):
+        cached = self._configs.get(sensor_id)
+        if cached is not None and time.monotonic() < cached[1]:
+            return cached[0]
+        level = Sensor.objects.filter(pk=sensor_id).values_list('alert_level', flat=True).first()
+        return self.update(sensor_id, level or 'safe')
+
+
+device_configs = DeviceConfigCache()
@@ -0,0 +1,218 @@
+"""
+Indeks episode alert per sensor.
+
+Satu AlertEpisode = rangkaian reading berurutan (menurut timestamp) dengan
+alert_level yang sama selain safe. Pertanyaan "kapan sensor masuk danger dan
+berapa lama" cukup dijawab dari beberapa baris episode, tanpa memindai
+reading berdasarkan alert_level.
+
+Episode diperbarui di save_readings:
+    - reading yang datang berurutan hanya melanjutkan/menutup episode yang
+      sedang berjalan (satu query kalau level tidak berubah)
+    - reading terlambat membuat episode sejak timestamp-nya diputar ulang
+      dari reading di database
+
+Episode yang dibuka oleh reading berurutan dengan level lebih tinggi dari
+reading sebelumnya memicu notifikasi (send_alert_notification) setelah
+transaksi commit. Rebuild (reading terlambat, rebuild_alert_episodes) tidak
+mengirim notifikasi karena episodenya sudah lewat.
+
+Data yang ada sebelum tabel ini dibuat, atau alert_level yang diubah massal
+(backfill_rise_alerts), perlu `python manage.py rebuild_alert_episodes`.
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .detectors import LEVEL_ORDER
+from .models import AlertEpisode, Reading, SensorThreshold
+from .quality import SUSPECT
+
+ROW_FIELDS = ('timestamp', 'alert_level', 'flow_rate', 'distance', 'quality')
+
+# Pengganti SensorThreshold untuk send_alert_notification (alert juga bisa dari rise detector)
+AlertTrigger = namedtuple('AlertTrigger', 'alert_level message')
+
+
+def _walk(sensor_id, rows, episode=None):
+    """
+    Terapkan reading (terurut naik) ke episode yang sedang berjalan
+
+    Args:
+        rows: iterable tuple ROW_FIELDS
+        episode: AlertEpisode yang masih terbuka sebelum rows, atau None
+
+    Returns:
+        list AlertEpisode yang berubah atau baru (belum disimpan)
+    """
+    touched = [episode] if episode is not None else []
+    for timestamp, level, flow, distance, quality in rows:
+        if episode is not None and level != episode.level:
+            episode.ended_at = timestamp
+            episode = None
+        if level == 'safe':
+            continue
+        if episode is None:
+            episode = AlertEpisode(sensor_id=sensor_id, level=level, started_at=timestamp, reading_count=0)
+            touched.append(episode)
+        episode.last_timestamp = timestamp
+        episode.reading_count += 1
+        if flow is not None and (episode.peak_flow is None or flow > episode.peak_flow):
+            episode.peak_flow = flow
+        if distance is not None and quality not in SUSPECT and (
+            episode.peak_distance is None or distance < episode.peak_distance
+        ):
+            episode.peak_distance = distance
+    return touched
+
+
+def _save(episodes, batch_size=1000):
+    new = [episode for episode in episodes if episode.pk is None]
+    changed = [episode for episode in episodes if episode.pk is not None]
+    if changed:
+        AlertEpisode.objects.bulk_update(
+            changed, ['ended_at', 'last_timestamp', 'reading_count', 'peak_flow', 'peak_distance'],
+        )
+    if new:
+        AlertEpisode.objects.bulk_create(new, batch_size=batch_size)
+
+
+# ========== UPDATE SAAT INGEST ==========
+
+def update_episodes(readings):
+    """Perbarui episode untuk reading yang baru tersimpan (dipanggil di dalam transaksi)"""
+    by_sensor = {}
+    for reading in readings:
+        by_sensor.setdefault(reading.sensor_id, []).append(reading)
+    for sensor_id, new in by_sensor.items():
+        new.sort(key=lambda r: r.timestamp)
+        _update_sensor(sensor_id, new)
+
+
+def _update_sensor(sensor_id, new):
+    first = new[0].timestamp
+    current = AlertEpisode.objects.select_for_update().filter(sensor_id=sensor_id, ended_at__isnull=True).first()
+
+    # Episode terbuka berarti reading terakhir sensor ada di dalamnya, jadi
+    # reading sesudah last_timestamp pasti berurutan tanpa perlu query lagi
+    if current is not None:
+        in_order = first > current.last_timestamp
+    else:
+        in_order = not Reading.objects.filter(sensor_id=sensor_id, timestamp__gt=first) \
+            .exclude(pk__in=[r.pk for r in new]).exists()
+    if not in_order:
+        rebuild(sensor_id, since=first)
+        return
+
+    rows = [(r.timestamp, r.alert_level, r.flow_rate, r.distance, r.quality) for r in new]
+    if current is None and all(row[1] == 'safe' for row in rows):
+        return
+    touched = _walk(sensor_id, rows, current)
+    opened = {episode.started_at for episode in touched if episode.pk is None}
+    _save(touched)
+    _notify(new, opened, current.level if current is not None else 'safe')
+
+
+def _notify(readings, opened, level):
+    """
+    Jadwalkan notifikasi untuk reading yang membuka episode dengan level
+    lebih tinggi dari reading sebelumnya (turun dari danger ke warning tidak)
+
+    Args:
+        readings: reading baru terurut naik
+        opened: timestamp awal episode yang baru dibuat
+        level: alert_level reading sebelum `readings`
+    """
+    for reading in readings:
+        if reading.timestamp in opened and LEVEL_ORDER.get(reading.alert_level, 0) > LEVEL_ORDER.get(level, 0):
+            # Setelah commit: pengiriman email/Telegram tidak boleh menahan lock ingest,
+            # dan kegagalannya hanya di-log tanpa menggagalkan request
+            transaction.on_commit(_sender(reading, _trigger(reading)), robust=True)
+        level = reading.alert_level
+
+
+def _sender(reading, trigger):
+    from sungai_monitor.utils import send_alert_notification
+
+    def send_alert():
+        send_alert_notification(reading, trigger)
+    return send_alert
+
+
+def _trigger(reading):
+    # notes berisi alasan dari rise detector; pada reading suspect isinya hanya status quality
+    if reading.notes and reading.quality not in SUSPECT:
+        return AlertTrigger(reading.alert_level, reading.notes)
+    message = SensorThreshold.objects.filter(
+        sensor_id=reading.sensor_id, alert_level=reading.alert_level, is_active=True,
+    ).values_list('message', flat=True).first()
+    return AlertTrigger(reading.alert_level, message or f"Status {reading.alert_level.upper()}")
+
+
+# ========== REBUILD ==========
+
+def rebuild(sensor_id, since=None):
+    """
+    Bangun ulang episode sensor dari reading, seluruhnya atau mulai `since`
+
+    Episode yang belum selesai atau berakhir sesudah `since` dihapus, lalu
+    reading sejak awal episode tersebut diputar ulang.
+
+    Returns:
+        int: jumlah episode yang dibuat
+    """
+    episodes = AlertEpisode.objects.filter(sensor_id=sensor_id)
+    readings = Reading.objects.filter(sensor_id=sensor_id)
+    with transaction.atomic():
+        if since is not None:
+            episodes = episodes.filter(Q(ended_at__isnull=True) | Q(ended_at__gt=since))
+            earliest = episodes.aggregate(start=Min('started_at'))['start']
+            readings = readings.filter(timestamp__gte=min(since, earliest or since))
+        episodes.delete()
+        rows = readings.order_by('timestamp').values_list(*ROW_FIELDS).iterator(chunk_size=10000)
+        created = _walk(sensor_id, rows)
+        _save(created)
+    return len(created)
+
+
+# ========== QUERY ==========
+
+def episodes_between(sensor_id, start, end):
+    """Episode yang bersinggungan dengan [start, end]"""
+    return AlertEpisode.objects.filter(
+        Q(ended_at__isnull=True) | Q(ended_at__gt=start),
+        sensor_id=sensor_id, started_at__lte=end,
+    ).order_by('started_at')
+
+
+def summarize(sensor_id, start, end, now=None):
+    """
+    Ringkasan alert per level untuk laporan
+
+    Durasi dipotong ke [start, end]; puncak adalah nilai seluruh episode.
+
+    Returns:
+        list dict (level, episodes, duration, longest, peak_flow, peak_distance),
+        level tertinggi lebih dulu
+    """
+    now = now or timezone.now()
+    summary = {}
+    for episode in episodes_between(sensor_id, start, end):
+        duration = max(min(episode.ended_at or now, end) - max(episode.started_at, start), timedelta(0))
+        entry = summary.setdefault(episode.level, {
+            'level': episode.level, 'episodes': 0, 'duration': timedelta(0), 'longest': timedelta(0),
+            'peak_flow': None, 'peak_distance': None,
+        })
+        entry['episodes'] += 1
+        entry['duration'] += duration
+        entry['longest'] = max(entry['longest'], duration)
+        if episode.peak_flow is not None and (entry['peak_flow'] is None or episode.peak_flow > entry['peak_flow']):
+            entry['peak_flow'] = episode.peak_flow
+        if episode.peak_distance is not None and (
+            entry['peak_distance'] is None or episode.peak_distance < entry['peak_distance']
+        ):
+            entry['peak_distance'] = episode.peak_distance
+    return sorted(summary.values(), key=lambda entry: -LEVEL_ORDER.get(entry['level'], 0))
@@ -0,0 +1,228 @@
+"""
+Prakiraan distance jangka pendek (mis. 1 jam / 3 jam) per sensor.
+
+Reading terakhir dirangkum menjadi rata-rata per bucket (FORECAST_BUCKET_MINUTES)
+dalam satu query untuk banyak sensor sekaligus, lalu semua sensor di-fit
+bersamaan sebagai matriks NumPy (sensor x bucket) dengan model ringan:
+
+    - naive        : nilai terakhir (baseline)
+    - linear       : tren linear pada FORECAST_TREND_MINUTES terakhir
+    - exponential  : tren linear pada log(distance)
+    - seasonal     : nilai terakhir + perubahan pada jam yang sama kemarin
+                     (periode FORECAST_SEASON_MINUTES)
+
+Per sensor dan per horizon dipilih model dengan galat backtest terkecil pada
+beberapa titik asal sebelumnya. Hasil disimpan di SensorForecast oleh command
+`update_forecasts` (dijalankan terjadwal) sehingga API dan dashboard hanya
+membaca hasil yang sudah jadi.
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .ingest import load_thresholds
+from .models import Sensor, Reading, SensorForecast
+
+MODELS = ('naive', 'linear', 'exponential', 'seasonal')
+
+# Jumlah titik asal backtest untuk memilih model
+BACKTEST_ORIGINS = 4
+
+# Minimal bucket terisi supaya tren dianggap valid
+MIN_TREND_POINTS = 3
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def horizons():
+    """dict nama -> menit, mis. {'1h': 60, '3h': 180}"""
+    return _setting('FORECAST_HORIZONS', {'1h': 60, '3h': 180})
+
+
+# ========== DATA ==========
+
+def bucket_end(now, bucket_seconds):
+    """Batas bucket terakhir yang sudah lengkap"""
+    epoch = now.timestamp()
+    return datetime.fromtimestamp(epoch - epoch % bucket_seconds, tz=dt_timezone.utc)
+
+
+def load_series(sensor_ids, end, buckets, bucket_seconds):
+    """
+    Rata-rata distance per bucket untuk banyak sensor dalam satu query
+
+    Returns:
+        ndarray (len(sensor_ids), buckets); NaN untuk bucket tanpa data.
+        Kolom terakhir adalah bucket yang berakhir di `end`.
+    """
+    start = end - timedelta(seconds=buckets * bucket_seconds)
+    rows = Reading.objects.filter(
+        sensor_id__in=sensor_ids, timestamp__gte=start, timestamp__lt=end,
+        distance__isnull=False, quality='good',
+    ).values_list('sensor_id', 'timestamp', 'distance')
+
+    row_of = {sensor_id: i for i, sensor_id in enumerate(sensor_ids)}
+    sensor_index, epochs, distances = [], [], []
+    for sensor_id, timestamp, distance in rows.iterator(chunk_size=10000):
+        sensor_index.append(row_of[sensor_id])
+        epochs.append(timestamp.timestamp())
+        distances.append(distance)
+
+    size = len(sensor_ids) * buckets
+    if not distances:
+        return np.full((len(sensor_ids), buckets), np.nan)
+    columns = ((np.array(epochs) - start.timestamp()) // bucket_seconds).astype(int)
+    flat = np.array(sensor_index) * buckets + np.clip(columns, 0, buckets - 1)
+    sums = np.bincount(flat, weights=distances, minlength=size)
+    counts = np.bincount(flat, minlength=size)
+    with np.errstate(invalid='ignore'):
+        return (sums / counts).reshape(len(sensor_ids), buckets)
+
+
+def forward_fill(series):
+    valid = ~np.isnan(series)
+    index = np.where(valid, np.arange(series.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    return series[np.arange(series.shape[0])[:, None], index]
+
+
+# ========== MODELS ==========
+
+def _trend(series, origin, window):
+    """Least squares per baris pada kolom (origin-window, origin]; x=0 di origin"""
+    segment = series[:, origin - window + 1:origin + 1]
+    x = np.arange(window, dtype=float) - (window - 1)
+    mask = ~np.isnan(segment)
+    y = np.where(mask, segment, 0.0)
+    n = mask.sum(axis=1)
+    sx = (mask * x).sum(axis=1)
+    sxx = (mask * x * x).sum(axis=1)
+    sy = y.sum(axis=1)
+    sxy = (y * x).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        intercept = (sy - slope * sx) / n
+    invalid = n < MIN_TREND_POINTS
+    slope[invalid] = np.nan
+    intercept[invalid] = np.nan
+    return intercept, slope
+
+
+def predict(series, filled, origin, steps, window, season):
+    """
+    Prakiraan semua model dari kolom `origin` sejauh `steps` bucket
+
+    Returns:
+        ndarray (len(MODELS), sensor)
+    """
+    intercept, slope = _trend(series, origin, window)
+    linear = intercept + slope * steps
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_intercept, log_slope = _trend(np.log(np.maximum(series, 1e-3)), origin, window)
+        exponential = np.exp(log_intercept + log_slope * steps)
+
+    if origin - season >= 0:
+        seasonal = filled[:, origin] + filled[:, origin + steps - season] - filled[:, origin - season]
+    else:
+        seasonal = np.full(series.shape[0], np.nan)
+    return np.vstack([filled[:, origin], linear, exponential, seasonal])
+
+
+def forecast_matrix(series, steps, window, season):
+    """
+    Pilih model per sensor dengan backtest lalu prakirakan dari kolom terakhir
+
+    Returns:
+        tuple (nilai prakiraan, index model di MODELS); NaN/-1 kalau tidak ada model yang valid
+    """
+    filled = forward_fill(series)
+    origin = series.shape[1] - 1
+
+    errors = []
+    for lag in range(BACKTEST_ORIGINS):
+        past = origin - steps - lag
+        if past - window + 1 < 0:
+            continue
+        actual = series[:, past + steps]
+        errors.append(np.abs(predict(series, filled, past, steps, window, season) - actual))
+    if errors:
+        errors = np.stack(errors)
+        valid = ~np.isnan(errors)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = np.where(valid, errors, 0.0).sum(axis=0) / valid.sum(axis=0)
+    else:
+        score = np.full((len(MODELS), series.shape[0]), np.nan)
+
+    current = predict(series, filled, origin, steps, window, season)
+    # Model tanpa skor backtest hanya dipilih kalau tidak ada yang punya skor
+    score = np.where(np.isnan(current), np.inf, np.where(np.isnan(score), 1e12, score))
+    choice = np.argmin(score, axis=0)
+    values = current[choice, np.arange(series.shape[0])]
+    choice[np.isnan(values)] = -1
+    return np.maximum(values, 0.0), choice
+
+
+# ========== UPDATE ==========
+
+def stale_sensors(end):
+    """Sensor yang belum punya prakiraan atau punya data baru sejak prakiraan terakhir"""
+    return Sensor.objects.filter(is_active=True, last_seen__isnull=False).filter(
+        Q(forecast__isnull=True)
+        | Q(forecast__issued_at__lt=end, last_seen__gte=F('forecast__issued_at'))
+    )
+
+
+def update_forecasts(sensors=None, now=None, batch_size=1000):
+    """
+    Fit ulang dan simpan prakiraan untuk sensor yang datanya berubah
+
+    Args:
+        sensors: queryset Sensor (default: stale_sensors)
+
+    Returns:
+        int: jumlah sensor yang diperbarui
+    """
+    bucket_seconds = _setting('FORECAST_BUCKET_MINUTES', 15) * 60
+    window = max(2, _setting('FORECAST_TREND_MINUTES', 180) * 60 // bucket_seconds)
+    season = _setting('FORECAST_SEASON_MINUTES', 1440) * 60 // bucket_seconds
+    steps = {name: max(1, math.ceil(minutes * 60 / bucket_seconds)) for name, minutes in horizons().items()}
+    buckets = season + max(steps.values()) + BACKTEST_ORIGINS + 1
+
+    end = bucket_end(now or timezone.now(), bucket_seconds)
+    sensor_ids = list((stale_sensors(end) if sensors is None else sensors).values_list('pk', flat=True))
+
+    updated = 0
+    for i in range(0, len(sensor_ids), batch_size):
+        batch = sensor_ids[i:i + batch_size]
+        series = load_series(batch, end, buckets, bucket_seconds)
+        results = {name: forecast_matrix(series, n, window, season) for name, n in steps.items()}
+        thresholds = load_thresholds(batch)
+
+        forecasts = []
+        for row, sensor_id in enumerate(batch):
+            values = {}
+            for name, (predicted, choice) in results.items():
+                if choice[row] < 0:
+                    continue
+                reading = Reading(distance=float(predicted[row]))
+                reading.check_thresholds(thresholds[sensor_id])
+                values[name] = {
+                    'distance': round(float(predicted[row]), 1),
+                    'model': MODELS[choice[row]],
+                    'alert_level': reading.alert_level,
+                }
+            forecasts.append(SensorForecast(sensor_id=sensor_id, issued_at=end, values=values))
+
+        SensorForecast.objects.bulk_create(
+            forecasts, update_conflicts=True, unique_fields=['sensor'],
+            update_fields=['issued_at', 'values', 'generated_at'],
+        )
+        updated += len(forecasts)
+    return updated
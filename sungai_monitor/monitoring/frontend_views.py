@@ -2,17 +2,26 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from .models import Sensor, Reading
+from .models import Sensor, SensorGroup, Reading
 from django.db.models import Avg, Max, Min, Count
 from django.utils import timezone
 from datetime import timedelta
+from .log_handlers import request_extra
+from . import metrics
+import logging
+
+logger = logging.getLogger(__name__)
 
 def dashboard(request):
     if not request.user.is_authenticated:
         return redirect('login')
     
+    with metrics.DASHBOARD_RENDER.time():
+        return _dashboard(request)
+
+def _dashboard(request):
     # Get all sensors
-    sensors = Sensor.objects.all()
+    sensors = Sensor.objects.select_related('forecast')
     
     # Get recent readings (last 24 hours)
     last_24h = timezone.now() - timedelta(hours=24)
@@ -33,8 +42,8 @@ def dashboard(request):
                 'readings_24h': Reading.objects.filter(sensor=sensor, timestamp__gte=last_24h).count()
             })
     
-    # Get system overview stats
-    stats_24h = Reading.objects.filter(timestamp__gte=last_24h).aggregate(
+    # Get system overview stats (tanpa reading yang ditandai spike/stuck)
+    stats_24h = Reading.objects.filter(timestamp__gte=last_24h, quality='good').aggregate(
         avg_flow=Avg('flow_rate'),
         max_flow=Max('flow_rate'),
         min_flow=Min('flow_rate'),
@@ -49,6 +58,8 @@ def dashboard(request):
         'total_sensors': total_sensors,
         'total_readings': total_readings,
         'stats_24h': stats_24h,
+        # Agregat sudah dipelihara per grup; tidak perlu memindai sensor anggota
+        'basins': SensorGroup.objects.filter(parent__isnull=True),
     }
     
     return render(request, 'monitor/dashboard.html', context)
@@ -60,8 +71,10 @@ def login_view(request):
         user = authenticate(request, username=username, password=password)
         if user is not None:
             login(request, user)
+            logger.info("Login %s", username, extra=request_extra(request))
             return redirect('dashboard')
         else:
+            logger.warning("Login gagal untuk %s", username, extra=request_extra(request))
             messages.error(request, 'Username atau password salah')
     return render(request, 'monitor/login.html')
 
@@ -69,7 +82,8 @@ def register_view(request):
     if request.method == 'POST':
         form = UserCreationForm(request.POST)
         if form.is_valid():
-            form.save()
+            user = form.save()
+            logger.info("Registrasi akun %s", user.username, extra=request_extra(request))
             messages.success(request, 'Akun berhasil dibuat! Silakan login.')
             return redirect('login')
     else:
@@ -77,5 +91,6 @@ def register_view(request):
     return render(request, 'monitor/register.html', {'form': form})
 
 def logout_view(request):
+    logger.info("Logout %s", request.user.get_username(), extra=request_extra(request))
     logout(request)
     return redirect('login')
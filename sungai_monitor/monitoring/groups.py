@@ -0,0 +1,234 @@
+"""
+Agregat kelompok sensor (DAS/sungai/ruas) yang dipelihara inkremental.
+
+Setiap sensor menyumbang counter ke grupnya dan semua leluhur grup itu:
+
+    sensor_count, online_count, <level>_count (warning/danger/critical),
+    distance_sum/count dan water_level_sum/count (nilai terkini)
+
+Saat state sensor berubah (reading baru, status offline, pindah grup)
+hanya selisih sumbangan lama dan baru yang diterapkan sebagai
+UPDATE ... SET x = x + delta ke rantai grup, sehingga biaya tidak
+bergantung pada jumlah anggota. `rebuild_group_stats` menghitung ulang
+semuanya kalau perlu (mis. setelah migrasi).
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .models import Reading, Sensor, SensorGroup
+
+COUNTERS = SensorGroup.AGGREGATE_FIELDS
+
+# Field Sensor yang menentukan sumbangannya ke grup
+STATE_FIELDS = ('group_id', 'status', 'alert_level', 'current_distance', 'current_water_level')
+
+
+def contribution(status, alert_level, distance, water_level):
+    """Counter yang disumbangkan satu sensor dengan state ini"""
+    counters = dict.fromkeys(COUNTERS, 0)
+    counters['sensor_count'] = 1
+    counters['online_count'] = int(status == 'online')
+    if alert_level in ('warning', 'danger', 'critical'):
+        counters[f'{alert_level}_count'] = 1
+    if distance is not None:
+        counters['distance_sum'], counters['distance_count'] = distance, 1
+    if water_level is not None:
+        counters['water_level_sum'], counters['water_level_count'] = water_level, 1
+    return counters
+
+
+# ========== HIRARKI ==========
+
+class GroupTree:
+    """
+    group_id -> parent_id, dibaca dari database sekali per pemakaian (satu
+    transaksi tulis atau satu pembangunan indeks). Sengaja tidak di-cache
+    per proses: worker lain bisa memindah grup kapan saja, dan delta yang
+    diterapkan ke rantai leluhur lama membuat counter menyimpang permanen.
+    """
+
+    def __init__(self):
+        self._parents = None
+
+    def ancestors(self, group_id):
+        """group_id beserta semua leluhurnya"""
+        if self._parents is None:
+            self._parents = dict(SensorGroup.objects.values_list('pk', 'parent_id'))
+        chain, seen = [], set()
+        while group_id is not None and group_id not in seen:
+            chain.append(group_id)
+            seen.add(group_id)
+            group_id = self._parents.get(group_id)
+        return chain
+
+
+# ========== DELTA ==========
+
+class Changes:
+    """
+    Kumpulan delta counter per grup yang diterapkan sekaligus; hirarki
+    dibaca di dalam transaksi yang sama dengan UPDATE-nya
+    """
+
+    def __init__(self):
+        self.deltas = {}
+        self.tree = GroupTree()
+
+    def add(self, group_id, counters, sign=1):
+        if group_id is None:
+            return
+        for ancestor in self.tree.ancestors(group_id):
+            delta = self.deltas.setdefault(ancestor, dict.fromkeys(COUNTERS, 0))
+            for name, value in counters.items():
+                delta[name] += sign * value
+
+    def sensor(self, old, new):
+        """
+        Catat perubahan state satu sensor
+
+        Args:
+            old, new: tuple STATE_FIELDS atau None (sensor baru/terhapus)
+        """
+        if old == new:
+            return
+        if old is not None:
+            self.add(old[0], contribution(*old[1:]), -1)
+        if new is not None:
+            self.add(new[0], contribution(*new[1:]))
+
+    def apply(self):
+        for group_id, delta in self.deltas.items():
+            fields = {name: F(name) + value for name, value in delta.items() if value}
+            if fields:
+                SensorGroup.objects.filter(pk=group_id).update(**fields)
+        self.deltas = {}
+
+
+def sensor_state(sensor):
+    return tuple(getattr(sensor, field) for field in STATE_FIELDS)
+
+
+# ========== STATE SENSOR SAAT INGEST ==========
+
+def update_sensor_states(readings, online_window, now):
+    """
+    Perbarui last_seen/status/alert_level/nilai terkini sensor dari reading
+    yang baru tersimpan dan terapkan deltanya ke grup (di dalam transaksi).
+    Reading yang lebih lama dari last_seen (import/backfill) tidak mengubah
+    state terkini.
+    """
+    latest, latest_good = {}, {}
+    for reading in readings:
+        sensor_id = reading.sensor_id
+        if sensor_id not in latest or reading.timestamp > latest[sensor_id].timestamp:
+            latest[sensor_id] = reading
+        if reading.quality == 'good' and reading.distance is not None and (
+            sensor_id not in latest_good or reading.timestamp > latest_good[sensor_id].timestamp
+        ):
+            latest_good[sensor_id] = reading
+
+    current = {
+        row[0]: row[1:]
+        for row in Sensor.objects.select_for_update().filter(pk__in=latest)
+        .values_list('pk', 'last_seen', *STATE_FIELDS)
+    }
+    changes = Changes()
+    for sensor_id, reading in latest.items():
+        last_seen, *old = current[sensor_id]
+        old = tuple(old)
+        if last_seen is not None and reading.timestamp <= last_seen:
+            continue
+        # Data historis tidak boleh membuat sensor tampak online
+        status = 'online' if now - reading.timestamp <= online_window else old[1]
+        distance, water_level = old[3], old[4]
+        good = latest_good.get(sensor_id)
+        if good is not None and (last_seen is None or good.timestamp > last_seen):
+            distance, water_level = good.distance, good.water_level
+        new = (old[0], status, reading.alert_level, distance, water_level)
+        Sensor.objects.filter(pk=sensor_id).update(
+            last_seen=reading.timestamp, status=status, alert_level=reading.alert_level,
+            current_distance=distance, current_water_level=water_level,
+        )
+        changes.sensor(old, new)
+    changes.apply()
+
+
+def mark_offline(before):
+    """
+    Tandai offline sensor online yang last_seen-nya sebelum `before`
+
+    Returns:
+        int: jumlah sensor yang berubah
+    """
+    with transaction.atomic():
+        stale = list(
+            Sensor.objects.select_for_update().filter(status='online', last_seen__lt=before)
+            .values_list('pk', *STATE_FIELDS)
+        )
+        if not stale:
+            return 0
+        Sensor.objects.filter(pk__in=[row[0] for row in stale]).update(status='offline')
+        changes = Changes()
+        for _, group_id, status, alert_level, distance, water_level in stale:
+            changes.sensor(
+                (group_id, status, alert_level, distance, water_level),
+                (group_id, 'offline', alert_level, distance, water_level),
+            )
+        changes.apply()
+    return len(stale)
+
+
+def refresh_water_levels(sensor_ids):
+    """
+    Baca ulang current_water_level sensor dari reading good terakhirnya
+    (mis. setelah recalibrate_readings) dan terapkan selisihnya ke grup
+
+    Returns:
+        int: jumlah sensor yang berubah
+    """
+    changed = 0
+    with transaction.atomic():
+        changes = Changes()
+        for sensor_id, *old in Sensor.objects.select_for_update().filter(pk__in=sensor_ids) \
+                .values_list('pk', *STATE_FIELDS):
+            water_level = Reading.objects.filter(sensor_id=sensor_id, quality='good', distance__isnull=False) \
+                .order_by('-timestamp').values_list('water_level', flat=True).first()
+            old = tuple(old)
+            new = old[:4] + (water_level,)
+            if new == old:
+                continue
+            Sensor.objects.filter(pk=sensor_id).update(current_water_level=water_level)
+            changes.sensor(old, new)
+            changed += 1
+        changes.apply()
+    return changed
+
+
+# ========== REBUILD ==========
+
+def rebuild():
+    """
+    Hitung ulang state terkini semua sensor dari reading terakhirnya dan
+    seluruh agregat grup dari nol
+
+    Returns:
+        int: jumlah grup
+    """
+    with transaction.atomic():
+        for sensor in Sensor.objects.all():
+            last = Reading.objects.filter(sensor=sensor).order_by('-timestamp') \
+                .values_list('alert_level', flat=True).first()
+            good = Reading.objects.filter(sensor=sensor, quality='good', distance__isnull=False) \
+                .order_by('-timestamp').values_list('distance', 'water_level').first()
+            Sensor.objects.filter(pk=sensor.pk).update(
+                alert_level=last or 'safe',
+                current_distance=good[0] if good else None,
+                current_water_level=good[1] if good else None,
+            )
+
+        SensorGroup.objects.update(**dict.fromkeys(COUNTERS, 0))
+        changes = Changes()
+        for row in Sensor.objects.filter(group__isnull=False).values_list(*STATE_FIELDS):
+            changes.sensor(None, row)
+        changes.apply()
+    return SensorGroup.objects.count()
@@ -0,0 +1,524 @@
+"""
+Jalur validasi & penulisan reading yang dipakai bersama oleh semua
+protokol ingest (JSON, biner, UDP/MQTT, dll).
+"""
+import math
+import struct
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Sensor, Reading, SensorThreshold
+from .calibration import calibrations
+from .detectors import rise_detector
+from .quality import SUSPECT, quality_filter
+from . import episodes, groups, volume
+from . import metrics
+
+
+class IngestError(ValueError):
+    """Payload ingest tidak valid"""
+
+
+# ========== VALIDASI ==========
+
+# Toleransi jam perangkat yang lebih cepat dari server
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+# Sama dengan batas di Sensor.update_status
+ONLINE_WINDOW = timedelta(minutes=5)
+
+VALUE_RANGES = {
+    'flow_rate': (0.0, 10000.0),
+    'distance': (0.0, 10000.0),
+    'battery': (0.0, 100.0),
+    'temperature': (-50.0, 100.0),
+    'humidity': (0.0, 100.0),
+}
+
+IDENTIFIER_MAX_LENGTH = Sensor._meta.get_field('identifier').max_length
+
+# Kolom Reading yang boleh diisi dari key raw (RAW_PROMOTED_FIELDS: key raw -> kolom)
+PROMOTABLE_FIELDS = ('temperature', 'humidity')
+
+
+def clean_value(field, value):
+    """Konversi nilai ke float dan cek range; None/NaN berarti tidak ada nilai"""
+    if value is None or value == '':
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise IngestError(f"{field}: bukan angka ({value!r})")
+    if math.isnan(value):
+        return None
+    low, high = VALUE_RANGES[field]
+    if not low <= value <= high:
+        raise IngestError(f"{field}: {value} di luar range {low}-{high}")
+    return value
+
+
+def promoted_fields():
+    mapping = getattr(settings, 'RAW_PROMOTED_FIELDS', {'temperature': 'temperature', 'humidity': 'humidity'})
+    return {key: field for key, field in mapping.items() if field in PROMOTABLE_FIELDS}
+
+
+def promote_raw(reading, mapping=None):
+    """
+    Pindahkan key raw yang dideklarasikan ke kolom bertipe supaya bisa
+    difilter/diagregasi lewat index tanpa parsing JSON. Nilai yang bukan
+    angka atau di luar range dibiarkan di raw, reading tetap diterima.
+
+    Returns:
+        bool: True kalau ada key yang dipindahkan
+    """
+    if not isinstance(reading.raw, dict) or not reading.raw:
+        return False
+    mapping = promoted_fields() if mapping is None else mapping
+    raw = dict(reading.raw)
+    changed = False
+    for key, field in mapping.items():
+        if key not in raw:
+            continue
+        try:
+            value = clean_value(field, raw[key])
+        except IngestError:
+            continue
+        setattr(reading, field, value)
+        del raw[key]
+        changed = True
+    if changed:
+        reading.raw = raw or None
+    return changed
+
+
+def clean_sequence(sequence):
+    if sequence is None or sequence == '':
+        return None
+    try:
+        sequence = int(sequence)
+    except (TypeError, ValueError):
+        raise IngestError(f"seq: bukan bilangan bulat ({sequence!r})")
+    if sequence < 0:
+        raise IngestError(f"seq: tidak boleh negatif ({sequence})")
+    return sequence
+
+
+def clean_timestamp(timestamp, now=None):
+    """
+    Timestamp datetime atau string ISO 8601; default ke waktu server.
+    Timestamp tanpa zona waktu dianggap UTC, timestamp dari masa depan ditolak.
+    """
+    now = now or timezone.now()
+    if timestamp is None or timestamp == '':
+        return now
+    if isinstance(timestamp, str):
+        try:
+            parsed = parse_datetime(timestamp)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise IngestError(f"timestamp: bukan ISO 8601 yang valid ({timestamp!r})")
+        timestamp = parsed
+    elif not isinstance(timestamp, datetime):
+        raise IngestError(f"timestamp: harus string ISO 8601 ({timestamp!r})")
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+    if timestamp > now + MAX_CLOCK_SKEW:
+        raise IngestError(f"timestamp di masa depan ({timestamp.isoformat()})")
+    return timestamp
+
+
+def clean_identifier(identifier):
+    """Identifier sensor dari payload; None kalau kosong"""
+    if identifier is None or identifier == '':
+        return None
+    if not isinstance(identifier, str):
+        raise IngestError(f"sensor_id: harus string ({identifier!r})")
+    if len(identifier) > IDENTIFIER_MAX_LENGTH:
+        raise IngestError(f"sensor_id: lebih dari {IDENTIFIER_MAX_LENGTH} karakter")
+    return identifier
+
+
+# ========== SENSOR LOOKUP ==========
+
+# Cache identifier -> Sensor per proses, dikosongkan lewat signal saat sensor
+# berubah/dihapus (lihat monitoring.signals)
+_sensor_cache = {}
+
+
+def clear_sensor_cache():
+    _sensor_cache.clear()
+
+
+def resolve_sensor(identifier, name=None):
+    """Ambil sensor berdasarkan identifier, buat baru kalau belum terdaftar"""
+    identifier = clean_identifier(identifier)
+    if not identifier:
+        raise IngestError("sensor_id wajib diisi")
+    sensor = _sensor_cache.get(identifier)
+    if sensor is None:
+        sensor, _ = Sensor.objects.get_or_create(
+            identifier=identifier,
+            defaults={'name': name or f'Sensor {identifier}'}
+        )
+        _sensor_cache[identifier] = sensor
+    return sensor
+
+
+def resolve_sensors(identifiers):
+    """
+    Versi batch dari resolve_sensor: satu query untuk semua identifier yang
+    belum ada di cache, sensor baru dibuat dengan bulk_create
+
+    Returns:
+        dict: identifier -> Sensor
+    """
+    missing = {i for i in identifiers if i and i not in _sensor_cache}
+    if missing:
+        for sensor in Sensor.objects.filter(identifier__in=missing):
+            _sensor_cache[sensor.identifier] = sensor
+        new = [
+            Sensor(identifier=i, name=f'Sensor {i}')
+            for i in missing if i not in _sensor_cache
+        ]
+        if new:
+            Sensor.objects.bulk_create(new, ignore_conflicts=True)
+            for sensor in Sensor.objects.filter(identifier__in=[s.identifier for s in new]):
+                _sensor_cache[sensor.identifier] = sensor
+    return {i: _sensor_cache[i] for i in identifiers if i in _sensor_cache}
+
+
+def load_thresholds(sensor_ids):
+    """
+    Ambil threshold aktif untuk banyak sensor sekaligus
+
+    Returns:
+        dict: sensor_id -> list SensorThreshold
+    """
+    thresholds = {sensor_id: [] for sensor_id in sensor_ids}
+    for threshold in SensorThreshold.objects.filter(sensor_id__in=sensor_ids, is_active=True):
+        thresholds[threshold.sensor_id].append(threshold)
+    return thresholds
+
+
+# ========== DUPLICATE SUPPRESSION ==========
+
+# Nomor urut perangkat kembali ke 0 setelah reboot, jadi hanya dianggap
+# duplikat kalau jarak waktunya masih dalam jendela retry
+SEQUENCE_WINDOW = timedelta(minutes=30)
+
+
+class RecentKeys:
+    """
+    Set LRU berukuran tetap berisi key reading yang baru saja disimpan.
+    Retry perangkat hampir selalu datang beberapa detik setelah aslinya,
+    jadi duplikat bisa ditolak tanpa query; kalau key sudah tergeser dari
+    cache, unique constraint (sensor, timestamp) tetap menjadi pengaman.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def keys_for(reading):
+        keys = [(reading.sensor_id, reading.timestamp)]
+        if reading.sequence is not None:
+            keys.append((reading.sensor_id, 'seq', reading.sequence))
+        return keys
+
+    def is_duplicate(self, reading):
+        with self._lock:
+            if (reading.sensor_id, reading.timestamp) in self._keys:
+                return True
+            if reading.sequence is not None:
+                seen_at = self._keys.get((reading.sensor_id, 'seq', reading.sequence))
+                if seen_at is not None and abs(reading.timestamp - seen_at) <= SEQUENCE_WINDOW:
+                    return True
+        return False
+
+    def add(self, readings):
+        with self._lock:
+            for reading in readings:
+                for key in self.keys_for(reading):
+                    self._keys[key] = reading.timestamp
+                    self._keys.move_to_end(key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+recent_readings = RecentKeys()
+
+
+def _drop_existing(readings):
+    """Buang reading yang (sensor, timestamp)-nya sudah ada di database"""
+    timestamps = [r.timestamp for r in readings]
+    existing = set(
+        Reading.objects.filter(
+            sensor_id__in={r.sensor_id for r in readings},
+            timestamp__range=(min(timestamps), max(timestamps)),
+        ).values_list('sensor_id', 'timestamp')
+    )
+    return [r for r in readings if (r.sensor_id, r.timestamp) not in existing]
+
+
+# ========== BUILD & SAVE ==========
+
+def build_reading(sensor, timestamp=None, flow_rate=None, distance=None,
+                  battery=None, raw=None, sequence=None, now=None, thresholds=None, seen=None):
+    """
+    Validasi nilai dan buat instance Reading (belum disimpan)
+
+    Args:
+        thresholds: threshold aktif sensor dari load_thresholds (opsional)
+        seen: set (sensor_id, timestamp) reading sebelumnya di batch yang sama (opsional)
+
+    Raises:
+        IngestError: kalau nilai tidak valid
+    """
+    reading = Reading(
+        sensor=sensor,
+        timestamp=clean_timestamp(timestamp, now),
+        flow_rate=clean_value('flow_rate', flow_rate),
+        distance=clean_value('distance', distance),
+        battery=clean_value('battery', battery),
+        raw=raw,
+        sequence=clean_sequence(sequence),
+    )
+    promote_raw(reading)
+    calibrations.apply(reading)
+    key = (reading.sensor_id, reading.timestamp)
+    if recent_readings.is_duplicate(reading) or (seen is not None and key in seen):
+        # Retry perangkat akan dibuang save_readings; jangan sampai ikut masuk ring
+        # buffer quality (nilai berulang terbaca stuck) atau state detektor laju
+        return reading
+    if seen is not None:
+        seen.add(key)
+    quality_filter.evaluate(reading)
+    threshold = reading.check_thresholds(thresholds)
+    if reading.quality in SUSPECT:
+        # Spike distance tidak boleh memicu alert; alert dari flow tetap berlaku
+        if threshold is not None and threshold.threshold_type == 'distance':
+            reading.alert_level = 'safe'
+        reading.notes = f"Distance ditandai {reading.quality}"
+    else:
+        rise_detector.evaluate(reading, thresholds)
+    metrics.THRESHOLD_EVALUATIONS.inc()
+    return reading
+
+
+def save_readings(readings):
+    """
+    Simpan reading dalam satu transaksi dan update last_seen/status sensor.
+    Duplikat (retry perangkat) dilewati tanpa error.
+
+    Args:
+        readings: list Reading hasil build_reading
+
+    Returns:
+        list: Reading yang benar-benar baru tersimpan
+    """
+    # Filter duplikat di memori, termasuk duplikat di dalam batch yang sama
+    unique, batch_keys = [], set()
+    for reading in readings:
+        key = (reading.sensor_id, reading.timestamp)
+        if key in batch_keys or recent_readings.is_duplicate(reading):
+            continue
+        batch_keys.add(key)
+        unique.append(reading)
+    readings = unique
+    if not readings:
+        return []
+
+    now = timezone.now()
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                readings = _insert_readings(readings)
+        except IntegrityError:
+            # Key sudah tergeser dari cache tapi ada di database
+            readings = _drop_existing(readings)
+            readings = _insert_readings(readings) if readings else []
+        if readings:
+            # last_seen/status/alert_level sensor + agregat grupnya; data historis
+            # (import/backfill) tidak memundurkan last_seen atau membuat sensor tampak online
+            groups.update_sensor_states(readings, ONLINE_WINDOW, now)
+        volume.update_index(readings)
+        episodes.update_episodes(readings)
+
+    recent_readings.add(readings)
+    _record_metrics(readings)
+    return readings
+
+
+def _record_metrics(readings):
+    if not readings:
+        return
+    metrics.INGEST_BATCH_SIZE.observe(len(readings))
+    by_type, by_level, by_quality = {}, {}, {}
+    for reading in readings:
+        sensor_type = reading.sensor.sensor_type
+        by_type[sensor_type] = by_type.get(sensor_type, 0) + 1
+        if reading.alert_level != 'safe':
+            by_level[reading.alert_level] = by_level.get(reading.alert_level, 0) + 1
+        if reading.quality != 'good':
+            by_quality[reading.quality] = by_quality.get(reading.quality, 0) + 1
+    for sensor_type, count in by_type.items():
+        metrics.READINGS_INGESTED.inc(count, sensor_type=sensor_type)
+    for level, count in by_level.items():
+        metrics.ALERTS.inc(count, level=level)
+    for quality, count in by_quality.items():
+        metrics.READINGS_FLAGGED.inc(count, quality=quality)
+
+
+def _insert_readings(readings):
+    if len(readings) == 1:
+        readings[0].save()
+        return readings
+    return Reading.objects.bulk_create(readings)
+
+
+def ingest_batch(rows, now=None):
+    """
+    Validasi dan simpan banyak reading sekaligus; baris yang tidak valid
+    dilewati supaya satu perangkat rusak tidak menggagalkan satu batch
+
+    Args:
+        rows: iterable (identifier, timestamp, flow_rate, distance, battery, raw, sequence)
+
+    Returns:
+        tuple: (list Reading tersimpan, list (row, pesan error));
+               duplikat tidak termasuk di keduanya
+    """
+    rows = list(rows)
+    now = now or timezone.now()
+    sensors = resolve_sensors({row[0] for row in rows})
+    thresholds = load_thresholds([sensor.pk for sensor in sensors.values()])
+    calibrations.load(list(thresholds))
+
+    readings, rejected, seen = [], [], set()
+    for row in rows:
+        identifier, timestamp, flow_rate, distance, battery, raw, sequence = row
+        try:
+            sensor = sensors.get(identifier)
+            if sensor is None:
+                raise IngestError("sensor_id wajib diisi")
+            readings.append(build_reading(
+                sensor, timestamp, flow_rate, distance, battery, raw, sequence,
+                now=now, thresholds=thresholds[sensor.pk], seen=seen,
+            ))
+        except IngestError as e:
+            rejected.append((row, str(e)))
+
+    return save_readings(readings), rejected
+
+
+# ========== PROTOKOL BINER ==========
+#
+# Layout (little-endian, tanpa padding):
+#
+#   header : version (uint8), identifier (8 byte ASCII, null-padded), count (uint16)
+#   record : epoch (uint32), flow_rate (float32), distance (float32), battery (float32)
+#
+# Nilai yang tidak diukur dikirim sebagai NaN. Satu paket bisa membawa
+# beberapa record (batching) untuk sensor yang sama.
+
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<B8sH')
+BINARY_RECORD = struct.Struct('<Ifff')
+BINARY_MAX_RECORDS = 1000
+
+
+def pack_readings(identifier, records):
+    """
+    Encode reading ke format biner (dipakai firmware/benchmark)
+
+    Args:
+        identifier: Sensor.identifier (maks 8 karakter)
+        records: iterable (epoch, flow_rate, distance, battery), None untuk kosong
+    """
+    nan = float('nan')
+    records = list(records)
+    body = b''.join(
+        BINARY_RECORD.pack(
+            int(epoch),
+            nan if flow is None else flow,
+            nan if distance is None else distance,
+            nan if battery is None else battery,
+        )
+        for epoch, flow, distance, battery in records
+    )
+    return BINARY_HEADER.pack(BINARY_VERSION, identifier.encode('ascii'), len(records)) + body
+
+
+def unpack_readings(payload):
+    """
+    Decode paket biner tanpa membuat dict perantara
+
+    Returns:
+        tuple: (identifier, iterator tuple (epoch, flow_rate, distance, battery))
+
+    Raises:
+        IngestError: kalau layout paket tidak valid
+    """
+    view = memoryview(payload)
+    if len(view) < BINARY_HEADER.size:
+        raise IngestError("paket terlalu pendek")
+
+    version, identifier, count = BINARY_HEADER.unpack_from(view)
+    if version != BINARY_VERSION:
+        raise IngestError(f"versi protokol tidak dikenal ({version})")
+    if count > BINARY_MAX_RECORDS:
+        raise IngestError(f"terlalu banyak record ({count} > {BINARY_MAX_RECORDS})")
+
+    body = view[BINARY_HEADER.size:]
+    if len(body) != count * BINARY_RECORD.size:
+        raise IngestError(
+            f"panjang paket tidak sesuai: {count} record butuh "
+            f"{count * BINARY_RECORD.size} byte, diterima {len(body)}"
+        )
+
+    try:
+        identifier = identifier.rstrip(b'\x00').decode('ascii')
+    except UnicodeDecodeError:
+        raise IngestError("identifier bukan ASCII")
+    return identifier, BINARY_RECORD.iter_unpack(body)
+
+
+def ingest_binary(payload, now=None):
+    """
+    Decode, validasi dan simpan paket biner
+
+    Returns:
+        list: Reading yang tersimpan
+    """
+    identifier, records = unpack_readings(payload)
+    sensor = resolve_sensor(identifier)
+    thresholds = load_thresholds([sensor.pk])[sensor.pk]
+    now = now or timezone.now()
+    seen = set()
+    readings = [
+        build_reading(
+            sensor,
+            timestamp=datetime.fromtimestamp(epoch, tz=dt_timezone.utc),
+            flow_rate=flow,
+            distance=distance,
+            battery=battery,
+            now=now,
+            thresholds=thresholds,
+            seen=seen,
+        )
+        for epoch, flow, distance, battery in records
+    ]
+    return save_readings(readings)
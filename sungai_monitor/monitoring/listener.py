@@ -0,0 +1,380 @@
+"""
+Daemon ingest ringan berbasis asyncio (UDP datagram dan langganan MQTT)
+sebagai alternatif HTTP. Dijalankan lewat `manage.py run_ingest_listener`.
+
+Format payload sama dengan endpoint HTTP: paket biner (monitoring.ingest)
+atau JSON berisi satu objek / list objek {sensor_id, timestamp, flow_rate,
+distance, battery, raw, seq, api_key}.
+
+Tanpa header HTTP, API key perangkat dikirim di field api_key payload JSON
+(satu key per paket) dan diverifikasi di thread penulis seperti header
+Authorization di HTTP: key yang salah menolak paketnya, dan baris untuk
+sensor lain ditolak. Dengan INGEST_REQUIRE_API_KEY = True paket tanpa key,
+termasuk semua paket biner (formatnya tidak punya tempat untuk key),
+dibuang dan dihitung sebagai unauthorized.
+"""
+import asyncio
+import json
+import logging
+import socket
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import metrics
+from .authentication import key_prefix, verify_key
+from .ingest import BINARY_VERSION, IngestError, clean_identifier, ingest_batch, unpack_readings
+from .ratelimit import RateLimited, device_limiter
+
+logger = logging.getLogger(__name__)
+
+UDP_RECEIVE_BUFFER = 4 * 1024 * 1024
+
+
+def decode_payload(payload):
+    """
+    Decode satu datagram/pesan menjadi baris untuk ingest_batch
+
+    Returns:
+        tuple: (list tuple (identifier, timestamp, flow_rate, distance, battery, raw, sequence),
+                api_key atau None)
+
+    Raises:
+        IngestError: kalau payload tidak bisa dibaca
+    """
+    if not payload:
+        raise IngestError("payload kosong")
+
+    if payload[0] == BINARY_VERSION:
+        identifier, records = unpack_readings(payload)
+        return [
+            (identifier, datetime.fromtimestamp(epoch, tz=dt_timezone.utc), flow, distance, battery, None, None)
+            for epoch, flow, distance, battery in records
+        ], None
+
+    try:
+        data = json.loads(payload)
+    except (UnicodeDecodeError, ValueError):
+        raise IngestError("payload bukan JSON/biner yang valid")
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        raise IngestError("payload JSON harus objek atau list objek")
+
+    # Tanpa timestamp dari perangkat pakai waktu terima, bukan waktu flush,
+    # supaya reading berurutan dalam satu batch tidak dianggap duplikat.
+    # Timestamp dari perangkat divalidasi per baris oleh ingest.clean_timestamp.
+    received_at = timezone.now()
+    rows, keys = [], set()
+    for item in data:
+        if not isinstance(item, dict):
+            raise IngestError("payload JSON harus objek atau list objek")
+        api_key = item.get('api_key')
+        if api_key:
+            if not isinstance(api_key, str):
+                raise IngestError("api_key harus string")
+            keys.add(api_key)
+        rows.append((
+            clean_identifier(item.get('sensor_id')),
+            item.get('timestamp') or received_at,
+            item.get('flow_rate'),
+            item.get('distance'),
+            item.get('battery'),
+            item.get('raw'),
+            item.get('seq'),
+        ))
+    if len(keys) > 1:
+        raise IngestError("api_key harus sama untuk semua reading dalam satu paket")
+    return rows, keys.pop() if keys else None
+
+
+class BatchWriter:
+    """
+    Kumpulkan baris dari semua listener lalu tulis ke database per batch
+    (setiap `batch_size` baris atau `flush_interval` detik).
+
+    ORM Django bersifat sinkron, jadi penulisan dilakukan di satu thread
+    khusus supaya event loop tetap bebas menerima paket.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, max_pending=50000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = []
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-writer')
+        self.stats = {'received': 0, 'saved': 0, 'rejected': 0, 'dropped': 0, 'limited': 0, 'unauthorized': 0}
+        self._flushing = None
+
+    def submit(self, rows, api_key=None):
+        if api_key is None and getattr(settings, 'INGEST_REQUIRE_API_KEY', False):
+            self.stats['unauthorized'] += len(rows)
+            return
+        rows = self._limit(rows, api_key)
+        if not rows:
+            return
+        if len(self.pending) + len(rows) > self.max_pending:
+            # Database tertinggal jauh: buang paket baru daripada kehabisan memori
+            self.stats['dropped'] += len(rows)
+            return
+        self.stats['received'] += len(rows)
+        self.pending.extend((api_key, row) for row in rows)
+        if len(self.pending) >= self.batch_size and self._flushing is None:
+            self._flushing = asyncio.ensure_future(self.flush())
+
+    def _limit(self, rows, api_key):
+        """
+        Satu token per sensor per paket (seperti satu request HTTP); baris
+        sensor yang bucket-nya kosong dibuang, sensor lain di paket yang sama
+        tetap diterima
+        """
+        fallback = api_key and f"key:{key_prefix(api_key)}"
+        limited = set()
+        for identifier in {row[0] or fallback for row in rows}:
+            try:
+                device_limiter.check(identifier)
+            except RateLimited:
+                limited.add(identifier)
+        if not limited:
+            return rows
+        allowed = [row for row in rows if (row[0] or fallback) not in limited]
+        self.stats['limited'] += len(rows) - len(allowed)
+        metrics.INGEST_RATE_LIMITED.inc(len(rows) - len(allowed), reason='device')
+        return allowed
+
+    async def flush(self):
+        try:
+            while self.pending:
+                batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+                loop = asyncio.get_running_loop()
+                saved, rejected, unauthorized = await loop.run_in_executor(self.executor, self._write, batch)
+                self.stats['saved'] += saved
+                self.stats['rejected'] += rejected
+                self.stats['unauthorized'] += unauthorized
+                if len(self.pending) < self.batch_size:
+                    break
+        finally:
+            self._flushing = None
+
+    @staticmethod
+    def _authenticate(batch):
+        """
+        Baris yang boleh ditulis: tanpa key (selama tidak diwajibkan) atau milik
+        sensor pemilik key; identifier kosong diisi dari key
+
+        Returns:
+            tuple (list baris, jumlah baris yang ditolak)
+        """
+        devices, rows, unauthorized = {}, [], 0
+        for api_key, row in batch:
+            if api_key is None:
+                rows.append(row)
+                continue
+            if api_key not in devices:
+                devices[api_key] = verify_key(api_key)
+            device = devices[api_key]
+            if device is None or row[0] not in (None, device.identifier):
+                unauthorized += 1
+                continue
+            rows.append((device.identifier,) + row[1:])
+        if unauthorized:
+            logger.warning("%d reading listener ditolak: API key tidak valid atau bukan milik sensornya", unauthorized)
+        return rows, unauthorized
+
+    @classmethod
+    def _write(cls, batch):
+        close_old_connections()
+        try:
+            rows, unauthorized = cls._authenticate(batch)
+            with metrics.INGEST_LATENCY.time(protocol='listener'):
+                saved, rejected = ingest_batch(rows)
+        except Exception:
+            logger.exception("Gagal menulis batch %d reading", len(batch))
+            return 0, len(batch), 0
+        for row, error in rejected[:5]:
+            logger.warning("Reading ditolak (%s): %s", row[0], error)
+        return len(saved), len(rejected), unauthorized
+
+    async def run(self):
+        """Flush periodik sampai dibatalkan"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                if self._flushing is None and self.pending:
+                    self._flushing = asyncio.ensure_future(self.flush())
+        finally:
+            if self._flushing is not None:
+                await self._flushing
+            await self.flush()
+            self.executor.shutdown(wait=True)
+
+
+class UDPIngestProtocol(asyncio.DatagramProtocol):
+    """Setiap datagram berisi satu paket (biner atau JSON)"""
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def datagram_received(self, data, addr):
+        try:
+            rows, api_key = decode_payload(data)
+        except IngestError as e:
+            self.writer.stats['rejected'] += 1
+            logger.debug("Datagram dari %s ditolak: %s", addr, e)
+            return
+        self.writer.submit(rows, api_key)
+
+
+# ========== MQTT 3.1.1 (QoS 0, subscriber saja) ==========
+
+def _encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def _encode_string(value):
+    value = value.encode('utf-8')
+    return struct.pack('!H', len(value)) + value
+
+
+def _packet(packet_type, body=b''):
+    return bytes([packet_type]) + _encode_length(len(body)) + body
+
+
+async def _read_packet(reader):
+    header = (await reader.readexactly(1))[0]
+    length, multiplier = 0, 1
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+    body = await reader.readexactly(length) if length else b''
+    return header, body
+
+
+class MQTTSubscriber:
+    """
+    Client MQTT minimal: CONNECT, SUBSCRIBE (QoS 0), terima PUBLISH dan
+    kirim PINGREQ. Cukup untuk broker apa pun (mosquitto, EMQX, dll) tanpa
+    dependency tambahan; reconnect otomatis kalau koneksi putus.
+    """
+
+    def __init__(self, writer, host, port=1883, topic='sungai/+/reading',
+                 client_id='sungai-ingest', keepalive=60, reconnect_delay=5.0):
+        self.writer = writer
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.client_id = client_id
+        self.keepalive = keepalive
+        self.reconnect_delay = reconnect_delay
+
+    async def run(self):
+        while True:
+            try:
+                await self._session()
+            except (OSError, asyncio.IncompleteReadError, IngestError) as e:
+                logger.warning("Koneksi MQTT %s:%s terputus: %s", self.host, self.port, e)
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _session(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            connect = (
+                _encode_string('MQTT') + bytes([4, 0x02]) + struct.pack('!H', self.keepalive)
+                + _encode_string(self.client_id)
+            )
+            writer.write(_packet(0x10, connect))
+            header, body = await _read_packet(reader)
+            if header >> 4 != 2 or len(body) < 2 or body[1] != 0:
+                raise IngestError(f"CONNACK ditolak broker ({body.hex()})")
+
+            writer.write(_packet(0x82, struct.pack('!H', 1) + _encode_string(self.topic) + b'\x00'))
+            await writer.drain()
+            logger.info("Subscribe MQTT %s:%s topic %s", self.host, self.port, self.topic)
+
+            ping = asyncio.ensure_future(self._ping(writer))
+            try:
+                while True:
+                    header, body = await _read_packet(reader)
+                    if header >> 4 == 3:
+                        self._on_publish(header, body)
+            finally:
+                ping.cancel()
+        finally:
+            writer.close()
+
+    async def _ping(self, writer):
+        while True:
+            await asyncio.sleep(self.keepalive / 2)
+            writer.write(_packet(0xC0))
+            await writer.drain()
+
+    def _on_publish(self, header, body):
+        topic_length = struct.unpack_from('!H', body)[0] if len(body) >= 2 else 0
+        offset = 2 + topic_length
+        if (header >> 1) & 0x03:
+            offset += 2  # packet identifier untuk QoS > 0
+        if offset > len(body):
+            # Paket terpotong tidak boleh mematikan subscriber; buang saja
+            self.writer.stats['rejected'] += 1
+            logger.warning("PUBLISH MQTT terpotong (%d byte) dibuang", len(body))
+            return
+        try:
+            rows, api_key = decode_payload(body[offset:])
+        except IngestError as e:
+            self.writer.stats['rejected'] += 1
+            logger.debug("Pesan MQTT ditolak: %s", e)
+            return
+        self.writer.submit(rows, api_key)
+
+
+async def serve(writer, udp_address=None, mqtt=None, stats_interval=60.0, on_stats=None):
+    """
+    Jalankan listener yang dikonfigurasi sampai dibatalkan
+
+    Args:
+        writer: BatchWriter
+        udp_address: (host, port) atau None
+        mqtt: MQTTSubscriber atau None
+        on_stats: callable(stats, rate) untuk laporan periodik
+    """
+    loop = asyncio.get_running_loop()
+    tasks = [asyncio.ensure_future(writer.run())]
+    transport = None
+    if udp_address:
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: UDPIngestProtocol(writer), local_addr=udp_address
+        )
+        # Buffer kernel besar supaya burst datagram tidak langsung dibuang
+        sock = transport.get_extra_info('socket')
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER)
+    if mqtt:
+        tasks.append(asyncio.ensure_future(mqtt.run()))
+
+    try:
+        last_saved, last_time = 0, time.monotonic()
+        while True:
+            await asyncio.sleep(stats_interval)
+            now = time.monotonic()
+            rate = (writer.stats['saved'] - last_saved) / (now - last_time)
+            last_saved, last_time = writer.stats['saved'], now
+            if on_stats:
+                on_stats(dict(writer.stats), rate)
+    finally:
+        if transport:
+            transport.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
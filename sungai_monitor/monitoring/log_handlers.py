@@ -0,0 +1,153 @@
+"""
+Logging handler yang menulis ke tabel SystemLog secara batch dari thread
+latar belakang, supaya logging di jalur request hanya berupa append ke
+antrian di memori.
+"""
+import atexit
+import json
+import logging
+import random
+import threading
+import traceback
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+
+LEVEL_NAMES = {
+    logging.DEBUG: 'info',
+    logging.INFO: 'info',
+    logging.WARNING: 'warning',
+    logging.ERROR: 'error',
+    logging.CRITICAL: 'critical',
+}
+
+
+def request_extra(request, **extra_data):
+    """Extra logging standar untuk event yang berasal dari request"""
+    user = getattr(request, 'user', None)
+    return {
+        'user_id': user.pk if getattr(user, 'is_authenticated', False) else None,
+        'ip_address': request.META.get('REMOTE_ADDR') or None,
+        'user_agent': request.META.get('HTTP_USER_AGENT'),
+        'extra_data': extra_data or None,
+    }
+
+
+class SystemLogHandler(logging.Handler):
+    """
+    Antrikan log record lalu simpan ke SystemLog dengan bulk_create setiap
+    `batch_size` record atau `flush_interval` detik.
+
+    Saat antrian mulai penuh (di atas `high_watermark`), record level info
+    hanya disimpan sebagian (`info_sample_rate`); saat antrian penuh semua
+    record baru dibuang dan jumlahnya dicatat sebagai satu baris warning.
+
+    Extra yang dikenali: user / user_id, ip_address, user_agent, extra_data
+    (mis. logger.info("...", extra={'ip_address': ip})).
+    """
+
+    def __init__(self, level=logging.INFO, batch_size=200, flush_interval=0.5,
+                 max_queue=10000, high_watermark=0.5, info_sample_rate=0.1):
+        super().__init__(level)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.high_watermark = int(max_queue * high_watermark)
+        self.info_sample_rate = info_sample_rate
+        self.queue = deque()
+        self.dropped = 0
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def emit(self, record):
+        size = len(self.queue)
+        if size >= self.max_queue or (
+            size >= self.high_watermark
+            and record.levelno < logging.WARNING
+            and random.random() >= self.info_sample_rate
+        ):
+            self.dropped += 1
+            return
+        try:
+            record.message = record.getMessage()
+        except Exception:
+            self.handleError(record)
+            return
+        self.queue.append(record)
+        if self._thread is None:
+            self._start()
+        if size + 1 >= self.batch_size:
+            self._wakeup.set()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='systemlog-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        from django.db import connection
+        from .models import SystemLog
+
+        while self.queue:
+            batch = []
+            while self.queue and len(batch) < self.batch_size:
+                batch.append(self._to_model(SystemLog, self.queue.popleft()))
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                batch.append(SystemLog(
+                    level='warning', module=__name__,
+                    message=f'{dropped} log record dibuang karena antrian penuh',
+                ))
+            try:
+                SystemLog.objects.bulk_create(batch)
+            except Exception:
+                # Database tidak tersedia (mis. saat migrate): buang batch ini,
+                # jangan sampai logging menghentikan aplikasi
+                self.dropped += len(batch)
+                connection.close()
+                return
+
+    @staticmethod
+    def _to_model(model, record):
+        user = getattr(record, 'user', None)
+        extra_data = getattr(record, 'extra_data', None)
+        if record.exc_info:
+            extra_data = dict(extra_data or {})
+            extra_data['traceback'] = ''.join(traceback.format_exception(*record.exc_info))
+        if extra_data is not None:
+            # Nilai yang tidak bisa disimpan sebagai JSON (datetime, Decimal, objek) jadi str,
+            # supaya satu record tidak menggagalkan bulk_create seluruh batch
+            try:
+                extra_data = json.loads(json.dumps(extra_data, default=str))
+            except (TypeError, ValueError):
+                extra_data = {'repr': repr(extra_data)}
+        return model(
+            level=LEVEL_NAMES.get(record.levelno, 'info'),
+            module=record.name[:100],
+            message=record.message,
+            user_id=getattr(record, 'user_id', None) or (user.pk if getattr(user, 'is_authenticated', False) else None),
+            ip_address=getattr(record, 'ip_address', None),
+            user_agent=getattr(record, 'user_agent', None),
+            extra_data=extra_data,
+            timestamp=datetime.fromtimestamp(record.created, tz=dt_timezone.utc),
+        )
+
+    def close(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        try:
+            self.flush()
+        except Exception:
+            pass
+        super().close()
@@ -57,10 +57,8 @@ class Command(BaseCommand):
                         'flow_rate': round(random.uniform(0.5, 5.0), 2),  # 0.5 - 5.0 m³/s
                         'distance': round(random.uniform(50, 200), 1),    # 50 - 200 cm
                         'battery': round(random.uniform(85, 100), 1),     # 85% - 100%
-                        'raw': {
-                            'temperature': round(random.uniform(25, 35), 1),
-                            'humidity': round(random.uniform(60, 90), 1)
-                        }
+                        'temperature': round(random.uniform(25, 35), 1),  # dulu di raw, lihat RAW_PROMOTED_FIELDS
+                        'humidity': round(random.uniform(60, 90), 1),
                     }
                 )
         
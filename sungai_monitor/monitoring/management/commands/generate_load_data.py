@@ -0,0 +1,136 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from monitoring.models import Sensor, SensorGroup, Reading, SensorThreshold
+from monitoring.calibration import calibrations
+from monitoring.ingest import promote_raw
+from monitoring import episodes, groups, volume
+from django.utils import timezone
+from datetime import timedelta
+import math
+import random
+import time
+
+# Bentuk kejadian banjir (menit relatif terhadap awal): naik, puncak, surut
+FLOOD_RISE = 180
+FLOOD_PEAK = 120
+FLOOD_RECEDE = 360
+
+
+def flood_factor(minute):
+    """0 (normal) sampai 1 (puncak banjir) untuk menit ke-n sejak awal kejadian"""
+    if minute < 0:
+        return 0.0
+    if minute < FLOOD_RISE:
+        return minute / FLOOD_RISE
+    minute -= FLOOD_RISE
+    if minute < FLOOD_PEAK:
+        return 1.0
+    minute -= FLOOD_PEAK
+    if minute < FLOOD_RECEDE:
+        return 1.0 - minute / FLOOD_RECEDE
+    return 0.0
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic load data: N sensors x M days of readings with flood events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensors', type=int, default=10)
+        parser.add_argument('--days', type=int, default=7)
+        parser.add_argument('--cadence', type=float, default=5, help='Minutes between readings')
+        parser.add_argument('--floods', type=int, default=3, help='Flood events per sensor over the whole period')
+        parser.add_argument('--prefix', default='LOAD')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        sensors = self.create_sensors(options)
+
+        end = timezone.now().replace(second=0, microsecond=0)
+        start = end - timedelta(days=options['days'])
+        step = timedelta(minutes=options['cadence'])
+        count = int((end - start) / step)
+        total_minutes = options['days'] * 1440
+
+        # Kejadian banjir dipakai bersama; sensor hilir menerima gelombang
+        # yang sama dengan jeda (lag) supaya korelasi antar stasiun realistis
+        floods = sorted(rng.uniform(0, total_minutes - FLOOD_RISE) for _ in range(options['floods']))
+
+        total = 0
+        for index, sensor in enumerate(sensors):
+            lag = (index % 5) * 30
+            thresholds = list(sensor.thresholds.filter(is_active=True))
+            baseline = rng.uniform(140, 170)
+            batch = []
+            for i in range(count):
+                minute = i * options['cadence']
+                flood = max((flood_factor(minute - f - lag) for f in floods), default=0.0)
+                diurnal = 5 * math.sin(2 * math.pi * minute / 1440)
+                distance = baseline + diurnal - flood * (baseline - 35) + rng.gauss(0, 1.5)
+                reading = Reading(
+                    sensor=sensor,
+                    timestamp=start + i * step,
+                    flow_rate=round(max(0.1, 1.2 + flood * 6 + rng.gauss(0, 0.1)), 2),
+                    distance=round(max(1.0, distance), 1),
+                    battery=round(100 - 15 * i / count, 1),
+                    raw={
+                        'temperature': round(27 + 3 * math.sin(2 * math.pi * minute / 1440) + rng.gauss(0, 0.3), 1),
+                        'humidity': round(rng.uniform(60, 90), 1),
+                    },
+                )
+                promote_raw(reading)
+                calibrations.apply(reading)
+                reading.check_thresholds(thresholds)
+                batch.append(reading)
+                if len(batch) >= options['chunk_size']:
+                    total += self.flush(batch)
+            total += self.flush(batch)
+
+        Sensor.objects.filter(pk__in=[s.pk for s in sensors]).update(last_seen=end, status='online')
+        for sensor in sensors:
+            volume.rebuild(sensor.pk)
+            episodes.rebuild(sensor.pk)
+        # Reading di-bulk_create tanpa save_readings: hitung state sensor & agregat grup sekali
+        groups.rebuild()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {total} readings for {len(sensors)} sensors in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)'
+        ))
+
+    def create_sensors(self, options):
+        sensors = []
+        basin, _ = SensorGroup.objects.get_or_create(name='DAS Sintetis', group_type='basin', parent=None)
+        for i in range(options['sensors']):
+            identifier = f"{options['prefix']}{i + 1:04d}"
+            sensor, created = Sensor.objects.get_or_create(
+                identifier=identifier,
+                defaults={
+                    'name': f'Load Sensor {i + 1}',
+                    'location': f'Sungai Sintetis {i // 5 + 1} - Stasiun {i % 5 + 1}',
+                    # Stasiun berjajar di sepanjang sungai sekitar Bandar Lampung
+                    'latitude': round(-5.35 - (i // 5) * 0.02 - (i % 5) * 0.01, 6),
+                    'longitude': round(105.20 + (i // 5) * 0.02 + (i % 5) * 0.01, 6),
+                    'group': SensorGroup.objects.get_or_create(
+                        name=f'Sungai Sintetis {i // 5 + 1}', group_type='river', parent=basin
+                    )[0],
+                }
+            )
+            if created:
+                # Jarak sensor ke permukaan air mengecil saat air naik
+                SensorThreshold.objects.bulk_create([
+                    SensorThreshold(sensor=sensor, threshold_type='distance', alert_level='warning',
+                                    min_value=70, max_value=100, message='Tinggi muka air waspada'),
+                    SensorThreshold(sensor=sensor, threshold_type='distance', alert_level='danger',
+                                    min_value=1, max_value=70, message='Tinggi muka air bahaya'),
+                ])
+            sensors.append(sensor)
+        return sensors
+
+    def flush(self, batch):
+        with transaction.atomic():
+            Reading.objects.bulk_create(batch)
+        count = len(batch)
+        batch.clear()
+        return count
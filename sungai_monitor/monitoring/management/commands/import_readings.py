@@ -0,0 +1,169 @@
+from django.core.management.base import BaseCommand, CommandError
+from monitoring.models import Reading
+from monitoring.ingest import resolve_sensors, ingest_batch
+from datetime import datetime, timezone as dt_timezone
+from multiprocessing import Pool
+from itertools import islice
+import csv
+import gzip
+import json
+import time
+
+FIELD_ALIASES = {
+    'sensor_id': 'sensor_id',
+    'identifier': 'sensor_id',
+    'sensor': 'sensor_id',
+    'timestamp': 'timestamp',
+    'time': 'timestamp',
+    'flow_rate': 'flow_rate',
+    'flow': 'flow_rate',
+    'distance': 'distance',
+    'battery': 'battery',
+    'seq': 'sequence',
+    'sequence': 'sequence',
+}
+
+
+def parse_timestamp(value):
+    """ISO 8601 atau epoch detik; tanpa zona waktu dianggap UTC"""
+    if value is None or value == '':
+        raise ValueError('timestamp wajib diisi untuk data historis')
+    if isinstance(value, (int, float)) or value.replace('.', '', 1).isdigit():
+        return datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=dt_timezone.utc)
+    return timestamp
+
+
+def parse_record(record, default_sensor):
+    values = {'raw': {}}
+    for key, value in record.items():
+        field = FIELD_ALIASES.get(key)
+        if field:
+            values[field] = value
+        elif value not in (None, ''):
+            values['raw'][key] = value
+    return (
+        values.get('sensor_id') or default_sensor,
+        parse_timestamp(values.get('timestamp')),
+        values.get('flow_rate'),
+        values.get('distance'),
+        values.get('battery'),
+        values['raw'] or None,
+        values.get('sequence'),
+    )
+
+
+def parse_chunk(args):
+    """Parse sekumpulan baris mentah; dijalankan di worker process kalau --workers > 1"""
+    lines, fmt, header, default_sensor = args
+    rows, errors = [], []
+    if fmt == 'csv':
+        records = csv.DictReader(lines, fieldnames=header)
+    else:
+        records = (json.loads(line) for line in lines if line.strip())
+    for record in records:
+        try:
+            rows.append(parse_record(record, default_sensor))
+        except (ValueError, TypeError, AttributeError) as e:
+            errors.append(f'{record!r}: {e}')
+    return rows, errors
+
+
+class Command(BaseCommand):
+    help = 'Import historical readings from CSV or NDJSON files (optionally gzipped)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument('--format', choices=['auto', 'csv', 'ndjson'], default='auto')
+        parser.add_argument('--sensor', help='Sensor identifier for files without a sensor_id column')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=1, help='Parser processes (default: parse in-process)')
+
+    def handle(self, *args, **options):
+        self.totals = {'read': 0, 'imported': 0, 'duplicates': 0, 'rejected': 0}
+        self.errors_shown = 0
+        started = time.perf_counter()
+
+        pool = Pool(options['workers']) if options['workers'] > 1 else None
+        try:
+            for path in options['paths']:
+                self.import_file(path, options, pool)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        elapsed = time.perf_counter() - started
+        rate = self.totals['read'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {imported} of {read} rows ({duplicates} duplicates, {rejected} rejected)'.format(**self.totals)
+            + f' in {elapsed:.1f}s, {rate:.0f} rows/s'
+        ))
+
+    def import_file(self, path, options, pool):
+        fmt = options['format']
+        if fmt == 'auto':
+            name = path[:-3] if path.endswith('.gz') else path
+            fmt = 'ndjson' if name.endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+        opener = gzip.open if path.endswith('.gz') else open
+
+        try:
+            handle = opener(path, 'rt', newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f'Cannot open {path}: {e}')
+
+        with handle:
+            header = next(csv.reader([handle.readline()])) if fmt == 'csv' else None
+            if header is not None and not options['sensor'] and not set(header) & {'sensor_id', 'identifier', 'sensor'}:
+                raise CommandError(f'{path}: no sensor column, pass --sensor')
+
+            chunks = (
+                (lines, fmt, header, options['sensor'])
+                for lines in iter(lambda: list(islice(handle, options['chunk_size'])), [])
+            )
+            parsed = pool.imap(parse_chunk, chunks) if pool else map(parse_chunk, chunks)
+            for rows, errors in parsed:
+                self.totals['read'] += len(rows) + len(errors)
+                self.totals['rejected'] += len(errors)
+                self.show_errors(errors)
+                self.write_chunk(rows)
+                self.stdout.write(f'  {path}: {self.totals["read"]} rows', ending='\r')
+        self.stdout.write('')
+
+    def write_chunk(self, rows):
+        if not rows:
+            return
+
+        # De-duplikasi di dalam chunk dan terhadap data yang sudah ada di database
+        sensors = resolve_sensors({row[0] for row in rows})
+        timestamps = [row[1] for row in rows]
+        existing = set(
+            Reading.objects.filter(
+                sensor_id__in=[s.pk for s in sensors.values()],
+                timestamp__range=(min(timestamps), max(timestamps)),
+            ).values_list('sensor_id', 'timestamp')
+        )
+
+        unique = []
+        for row in rows:
+            sensor = sensors.get(row[0])
+            key = (sensor.pk if sensor else None, row[1])
+            if key in existing:
+                self.totals['duplicates'] += 1
+                continue
+            existing.add(key)
+            unique.append(row)
+
+        saved, rejected = ingest_batch(unique)
+        self.totals['imported'] += len(saved)
+        self.totals['rejected'] += len(rejected)
+        self.show_errors(f'{row[0]} @ {row[1]}: {error}' for row, error in rejected)
+
+    def show_errors(self, errors):
+        for error in errors:
+            if self.errors_shown >= 20:
+                return
+            self.errors_shown += 1
+            self.stderr.write(f'Rejected {error}')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from monitoring.groups import mark_offline
+from monitoring.ingest import ONLINE_WINDOW
+import time
+
+
+class Command(BaseCommand):
+    help = 'Mark sensors offline when they stop reporting and update group online counts (cron or --interval)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running and check every N seconds (default: run once)')
+
+    def handle(self, *args, **options):
+        while True:
+            changed = mark_offline(timezone.now() - ONLINE_WINDOW)
+            self.stdout.write(self.style.SUCCESS(f'Marked {changed} sensors offline'))
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
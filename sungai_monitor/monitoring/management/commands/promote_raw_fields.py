@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from monitoring.models import Reading
+from monitoring.ingest import PROMOTABLE_FIELDS, promote_raw, promoted_fields
+import time
+
+
+class Command(BaseCommand):
+    help = 'Move declared Reading.raw keys (RAW_PROMOTED_FIELDS) of historical readings into typed columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Readings loaded and updated per transaction')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        mapping = promoted_fields()
+        fields = sorted(set(mapping.values()))
+        if not fields:
+            self.stdout.write(self.style.WARNING(
+                f'RAW_PROMOTED_FIELDS has no usable columns (supported: {", ".join(PROMOTABLE_FIELDS)})'
+            ))
+            return
+
+        scanned = promoted = 0
+        last_id = 0
+        while True:
+            # Paginasi keyset per id supaya setiap transaksi tetap kecil
+            chunk = list(
+                Reading.objects.filter(id__gt=last_id, raw__isnull=False)
+                .order_by('id').only('id', 'raw', *fields)[:options['chunk_size']]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            scanned += len(chunk)
+            changed = [reading for reading in chunk if promote_raw(reading, mapping)]
+            if changed:
+                with transaction.atomic():
+                    Reading.objects.bulk_update(changed, ['raw', *fields], batch_size=1000)
+                promoted += len(changed)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Promoted {", ".join(sorted(mapping))} on {promoted} of {scanned} readings with raw data '
+            f'in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from monitoring.models import Sensor
+from monitoring import episodes
+import time
+
+
+class Command(BaseCommand):
+    help = 'Rebuild alert episodes (start, end, peak per alert level run) from raw readings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensor', action='append', help='Sensor identifier (repeatable, default: all)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        sensors = Sensor.objects.all()
+        if options['sensor']:
+            sensors = sensors.filter(identifier__in=options['sensor'])
+
+        total = 0
+        for sensor in sensors:
+            created = episodes.rebuild(sensor.pk)
+            total += created
+            self.stdout.write(f'  {sensor.identifier}: {created} episodes')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} alert episodes in {elapsed:.1f}s'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from monitoring.groups import rebuild
+import time
+
+
+class Command(BaseCommand):
+    help = 'Recompute current sensor state from latest readings and all sensor group aggregates from scratch'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        groups = rebuild()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt aggregates for {groups} groups in {elapsed:.1f}s'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from monitoring.models import Sensor
+from monitoring import volume
+import time
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the cumulative flow volume index (checkpoints per bucket) from raw readings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensor', action='append', help='Sensor identifier (repeatable, default: all)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        sensors = Sensor.objects.all()
+        if options['sensor']:
+            sensors = sensors.filter(identifier__in=options['sensor'])
+
+        total = 0
+        for sensor in sensors:
+            checkpoints = volume.rebuild(sensor.pk)
+            total += checkpoints
+            self.stdout.write(f'  {sensor.identifier}: {checkpoints} checkpoints')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} volume checkpoints in {elapsed:.1f}s'))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from monitoring.models import Sensor, Reading
+from monitoring.calibration import periods
+from monitoring import groups, volume
+import time
+
+
+class Command(BaseCommand):
+    help = 'Recompute water_level/flow_m3s of historical readings from the current sensor calibrations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensor', action='append', help='Sensor identifier (repeatable, default: all)')
+        parser.add_argument('--chunk-size', type=int, default=50000,
+                            help='Reading id range updated per transaction')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        sensors = Sensor.objects.all()
+        if options['sensor']:
+            sensors = sensors.filter(identifier__in=options['sensor'])
+
+        total = 0
+        sensor_ids = []
+        for sensor in sensors:
+            sensor_ids.append(sensor.pk)
+            updated = 0
+            for start, end, transform in periods(sensor.pk):
+                readings = Reading.objects.filter(sensor=sensor)
+                if start is not None:
+                    readings = readings.filter(timestamp__gte=start)
+                if end is not None:
+                    readings = readings.filter(timestamp__lt=end)
+
+                # Satu UPDATE berbasis set per rentang id, supaya transaksi tetap kecil
+                bounds = readings.aggregate(first=Min('id'), last=Max('id'))
+                if bounds['first'] is None:
+                    continue
+                expressions = transform.expressions()
+                for low in range(bounds['first'], bounds['last'] + 1, options['chunk_size']):
+                    with transaction.atomic():
+                        updated += readings.filter(
+                            id__gte=low, id__lt=low + options['chunk_size']
+                        ).update(**expressions)
+
+            # flow_m3s berubah: indeks volume kumulatif harus dibangun ulang
+            checkpoints = volume.rebuild(sensor.pk)
+            total += updated
+            self.stdout.write(f'  {sensor.identifier}: {updated} readings, {checkpoints} volume checkpoints')
+
+        # Nilai terkini sensor (dashboard) dan agregat grupnya ikut memakai kalibrasi baru
+        refreshed = groups.refresh_water_levels(sensor_ids)
+        self.stdout.write(f'  current water level refreshed for {refreshed} sensors')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Recalibrated {total} readings in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/s)'
+        ))
@@ -0,0 +1,33 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from monitoring.authentication import issue_key
+from monitoring.models import Sensor
+
+
+class Command(BaseCommand):
+    help = 'Issue a new device API key for a sensor; existing keys stay valid for the overlap window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('identifier', help='Sensor identifier')
+        parser.add_argument('--overlap-hours', type=float,
+                            default=getattr(settings, 'API_KEY_ROTATION_OVERLAP_HOURS', 24),
+                            help='Hours the old keys keep working (0 = revoke immediately)')
+        parser.add_argument('--keep-old', action='store_true',
+                            help='Add a key without expiring the existing ones')
+
+    def handle(self, *args, **options):
+        try:
+            sensor = Sensor.objects.get(identifier=options['identifier'])
+        except Sensor.DoesNotExist:
+            raise CommandError(f"Sensor {options['identifier']} not found")
+
+        overlap = None if options['keep_old'] else timedelta(hours=options['overlap_hours'])
+        key = issue_key(sensor, overlap=overlap)
+
+        self.stdout.write(key)
+        expiring = sensor.api_keys.filter(expires_at__isnull=False).order_by('-expires_at').first()
+        note = f'; old keys expire at {expiring.expires_at.isoformat()}' if overlap is not None and expiring else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'Issued new API key for {sensor.identifier} (shown only once){note}'
+        ))
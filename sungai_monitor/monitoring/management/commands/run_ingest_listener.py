@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from monitoring.listener import BatchWriter, MQTTSubscriber, serve
+import asyncio
+
+class Command(BaseCommand):
+    help = 'Run the UDP/MQTT ingest listener (lightweight alternative to the HTTP ingest endpoint)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--udp', metavar='HOST:PORT', help='Listen for UDP datagrams, e.g. 0.0.0.0:5683')
+        parser.add_argument('--mqtt', metavar='HOST:PORT', help='Subscribe to an MQTT broker, e.g. localhost:1883')
+        parser.add_argument('--mqtt-topic', default='sungai/+/reading')
+        parser.add_argument('--mqtt-client-id', default='sungai-ingest')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--flush-interval', type=float, default=1.0, help='Seconds between flushes')
+        parser.add_argument('--stats-interval', type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        if not options['udp'] and not options['mqtt']:
+            raise CommandError('Specify at least one of --udp or --mqtt')
+
+        writer = BatchWriter(
+            batch_size=options['batch_size'],
+            flush_interval=options['flush_interval'],
+        )
+        udp_address = self.parse_address(options['udp']) if options['udp'] else None
+        mqtt = None
+        if options['mqtt']:
+            host, port = self.parse_address(options['mqtt'])
+            mqtt = MQTTSubscriber(
+                writer, host, port,
+                topic=options['mqtt_topic'],
+                client_id=options['mqtt_client_id'],
+            )
+
+        if udp_address:
+            self.stdout.write(f'Listening for UDP on {udp_address[0]}:{udp_address[1]}')
+        if mqtt:
+            self.stdout.write(f'Subscribing to mqtt://{mqtt.host}:{mqtt.port} topic {mqtt.topic}')
+        if getattr(settings, 'INGEST_REQUIRE_API_KEY', False):
+            self.stdout.write('INGEST_REQUIRE_API_KEY is on: only JSON packets with a valid api_key are accepted')
+
+        try:
+            asyncio.run(serve(
+                writer,
+                udp_address=udp_address,
+                mqtt=mqtt,
+                stats_interval=options['stats_interval'],
+                on_stats=self.report,
+            ))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            'Stopped: {received} received, {saved} saved, {rejected} rejected, {unauthorized} unauthorized, '
+            '{dropped} dropped'.format(**writer.stats)
+        ))
+
+    def report(self, stats, rate):
+        self.stdout.write(
+            '{:.0f} readings/s | {received} received, {saved} saved, {rejected} rejected, '
+            '{unauthorized} unauthorized, {dropped} dropped'.format(rate, **stats)
+        )
+
+    @staticmethod
+    def parse_address(value):
+        host, _, port = value.rpartition(':')
+        try:
+            return host or '0.0.0.0', int(port)
+        except ValueError:
+            raise CommandError(f'Invalid address {value!r}, expected HOST:PORT')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from sungai_monitor.utils import send_alert_digests
+import time
+
+
+class Command(BaseCommand):
+    help = 'Send queued alerts as one digest per recipient once ALERT_DIGEST_WINDOW has passed (cron or --interval)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running and check every N seconds (default: run once)')
+        parser.add_argument('--flush', action='store_true',
+                            help='Send everything queued without waiting for the window')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = send_alert_digests(flush=options['flush'])
+            self.stdout.write(self.style.SUCCESS(f'Sent {sent} alert digests'))
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
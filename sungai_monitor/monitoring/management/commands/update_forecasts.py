@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from monitoring.forecasting import update_forecasts
+from monitoring.models import Sensor
+import time
+
+
+class Command(BaseCommand):
+    help = 'Refit short-horizon forecasts for sensors with new data (run from cron or with --interval)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensor', action='append', help='Sensor identifier (repeatable); implies --force')
+        parser.add_argument('--force', action='store_true', help='Refit all active sensors, not only stale ones')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Sensors fitted per NumPy batch')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running and refresh every N seconds (default: run once)')
+
+    def handle(self, *args, **options):
+        while True:
+            sensors = None
+            if options['sensor']:
+                sensors = Sensor.objects.filter(identifier__in=options['sensor'])
+            elif options['force']:
+                sensors = Sensor.objects.filter(is_active=True, last_seen__isnull=False)
+
+            started = time.perf_counter()
+            updated = update_forecasts(sensors, batch_size=options['batch_size'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f'Updated forecasts for {updated} sensors in {elapsed:.2f}s'))
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,269 @@
+"""
+Metrik aplikasi dalam format teks Prometheus, tanpa dependency dan tanpa
+menyentuh database saat di-scrape.
+
+Nilai disimpan per proses. Kalau settings.METRICS_DIR diisi, setiap worker
+menulis ke file mmap miliknya sendiri (metrics_<pid>.db) dan endpoint
+/metrics menjumlahkan semua file di direktori itu, sehingga hasil scrape
+mencakup semua worker gunicorn/uwsgi. Kosongkan direktori itu saat deploy
+ulang supaya counter dari proses lama tidak ikut terhitung.
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+
+# ========== STORAGE ==========
+
+class LocalStore:
+    """Nilai metrik di memori proses ini"""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class MmapStore:
+    """
+    Nilai metrik di file mmap per proses. Layout: 8 byte jumlah byte terpakai,
+    lalu entri [panjang key (uint32)][key JSON][padding ke 8 byte][nilai float64].
+    Entri baru ditulis dulu sebelum header diperbarui, jadi pembaca dari proses
+    lain selalu melihat prefix yang konsisten.
+    """
+
+    HEADER = struct.Struct('Q')
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions = {}
+        self._file = open(path, 'a+b')
+        if os.path.getsize(path) < self.INITIAL_SIZE:
+            self._file.truncate(self.INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = self.HEADER.unpack_from(self._map)[0] or self.HEADER.size
+        for key, position, _ in self._entries(self._map, self._used):
+            self._positions[key] = position
+
+    @classmethod
+    def _entries(cls, data, used):
+        position = cls.HEADER.size
+        while position < used:
+            length = struct.unpack_from('I', data, position)[0]
+            key = bytes(data[position + 4:position + 4 + length]).decode()
+            value_position = position + 4 + length
+            value_position += -value_position % 8
+            yield key, value_position, struct.unpack_from('d', data, value_position)[0]
+            position = value_position + 8
+
+    def _append(self, key):
+        encoded = key.encode()
+        value_position = self._used + 4 + len(encoded)
+        value_position += -value_position % 8
+        end = value_position + 8
+        if end > len(self._map):
+            size = len(self._map)
+            while size < end:
+                size *= 2
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        struct.pack_into('I', self._map, self._used, len(encoded))
+        self._map[self._used + 4:self._used + 4 + len(encoded)] = encoded
+        struct.pack_into('d', self._map, value_position, 0.0)
+        self._used = end
+        self.HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = value_position
+        return value_position
+
+    def inc(self, key, amount):
+        key = json.dumps(key)
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._append(key)
+            value = struct.unpack_from('d', self._map, position)[0]
+            struct.pack_into('d', self._map, position, value + amount)
+
+    @classmethod
+    def collect_dir(cls, directory):
+        """Jumlahkan nilai dari semua file proses di direktori"""
+        totals = {}
+        for path in glob.glob(os.path.join(directory, 'metrics_*.db')):
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            if len(data) < cls.HEADER.size:
+                continue
+            used = min(cls.HEADER.unpack_from(data)[0], len(data))
+            for key, _, value in cls._entries(data, used):
+                key = tuple(tuple(k) if isinstance(k, list) else k for k in json.loads(key))
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    # Dibuat ulang setelah fork supaya setiap worker punya file sendiri
+    global _store, _store_pid
+    if _store is None or _store_pid != os.getpid():
+        with _store_lock:
+            if _store is None or _store_pid != os.getpid():
+                directory = getattr(settings, 'METRICS_DIR', None)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                    _store = MmapStore(os.path.join(directory, f'metrics_{os.getpid()}.db'))
+                else:
+                    _store = LocalStore()
+                _store_pid = os.getpid()
+    return _store
+
+
+def collect():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if directory:
+        get_store()
+        return MmapStore.collect_dir(directory)
+    return get_store().collect()
+
+
+# ========== METRIC TYPES ==========
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _labels(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (
+            '{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+            for k, v in pairs
+        )
+        return '{' + ','.join(escaped) + '}'
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        get_store().inc((self.name, '', self._labels(labels)), amount)
+
+    def render(self, samples):
+        return [
+            f'{self.name}_total{self._format_labels(labels)} {value:g}'
+            for (_, _, labels), value in sorted(samples.items())
+        ]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        store = get_store()
+        labels = self._labels(labels)
+        # Bucket disimpan non-kumulatif (1 increment), dikumulatifkan saat render
+        store.inc((self.name, bisect_left(self.buckets, value), labels), 1)
+        store.inc((self.name, 'sum', labels), value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self, samples):
+        by_labels = {}
+        for (_, sample, labels), value in samples.items():
+            by_labels.setdefault(labels, {})[sample] = value
+        lines = []
+        for labels, values in sorted(by_labels.items()):
+            cumulative = 0.0
+            for index, bound in enumerate(self.buckets):
+                cumulative += values.get(index, 0.0)
+                lines.append(f'{self.name}_bucket{self._format_labels(labels, [("le", f"{bound:g}")])} {cumulative:g}')
+            cumulative += values.get(len(self.buckets), 0.0)
+            lines.append(f'{self.name}_bucket{self._format_labels(labels, [("le", "+Inf")])} {cumulative:g}')
+            lines.append(f'{self.name}_sum{self._format_labels(labels)} {values.get("sum", 0.0):g}')
+            lines.append(f'{self.name}_count{self._format_labels(labels)} {cumulative:g}')
+        return lines
+
+
+def render():
+    """Semua metrik dalam format teks Prometheus 0.0.4"""
+    samples = {}
+    for key, value in collect().items():
+        samples.setdefault(key[0], {})[key] = value
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.render(samples.get(metric.name, {})))
+    return '\n'.join(lines) + '\n'
+
+
+# ========== METRIK APLIKASI ==========
+
+READINGS_INGESTED = Counter(
+    'sungai_readings_ingested', 'Reading tersimpan per tipe sensor', ['sensor_type'])
+INGEST_LATENCY = Histogram(
+    'sungai_ingest_latency_seconds', 'Durasi memproses satu request/batch ingest', ['protocol'])
+INGEST_BATCH_SIZE = Histogram(
+    'sungai_ingest_batch_size', 'Jumlah reading per penulisan ke database',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000))
+THRESHOLD_EVALUATIONS = Counter(
+    'sungai_threshold_evaluations', 'Evaluasi threshold per reading')
+ALERTS = Counter(
+    'sungai_alerts', 'Reading tersimpan dengan alert_level selain safe', ['level'])
+INGEST_RATE_LIMITED = Counter(
+    'sungai_ingest_rate_limited', 'Request/reading ingest ditolak karena batas laju', ['reason'])
+READINGS_FLAGGED = Counter(
+    'sungai_readings_flagged', 'Reading tersimpan dengan quality selain good', ['quality'])
+NOTIFICATION_LATENCY = Histogram(
+    'sungai_notification_send_seconds', 'Durasi pengiriman notifikasi', ['notification_type'])
+NOTIFICATION_FAILURES = Counter(
+    'sungai_notification_failures', 'Notifikasi gagal dikirim', ['notification_type'])
+DASHBOARD_RENDER = Histogram(
+    'sungai_dashboard_render_seconds', 'Durasi render dashboard')
@@ -0,0 +1,195 @@
+"""
+Middleware instrumentasi performa per request (opt-in lewat PERF_SAMPLE_RATE).
+
+Untuk request yang tersampel dicatat: waktu total, jumlah & durasi query DB,
+waktu serializer DRF, waktu render dan ukuran response. Hasilnya dikirim
+sebagai header `Server-Timing`, dikumpulkan per view untuk persentil
+(lihat /api/perf/), dan pola N+1 (SQL identik berulang) dicatat ke log.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('perf_request', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.render_start = None
+        self.render_time = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.shapes[sql_shape(sql)] += 1
+
+
+_IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+
+
+def sql_shape(sql):
+    """Normalisasi SQL supaya query yang hanya beda parameter/jumlah IN dianggap sama"""
+    return _IN_LIST.sub('(%s...)', sql)
+
+
+class PerformanceStats:
+    """Reservoir durasi terakhir per view untuk menghitung persentil"""
+
+    def __init__(self, size=1000):
+        self.size = size
+        self._samples = defaultdict(lambda: deque(maxlen=self.size))
+        self._lock = threading.Lock()
+
+    def add(self, view, total, queries, db_time, size):
+        with self._lock:
+            self._samples[view].append((total, queries, db_time, size))
+
+    def summary(self):
+        with self._lock:
+            samples = {view: list(values) for view, values in self._samples.items()}
+        result = {}
+        for view, values in samples.items():
+            totals = sorted(v[0] for v in values)
+            result[view] = {
+                'count': len(values),
+                'p50_ms': round(percentile(totals, 50) * 1000, 3),
+                'p95_ms': round(percentile(totals, 95) * 1000, 3),
+                'p99_ms': round(percentile(totals, 99) * 1000, 3),
+                'avg_queries': round(sum(v[1] for v in values) / len(values), 2),
+                'avg_db_ms': round(sum(v[2] for v in values) / len(values) * 1000, 3),
+                'avg_bytes': round(sum(v[3] for v in values) / len(values)),
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+stats = PerformanceStats()
+
+
+def _instrument_serializers():
+    """Bungkus property `.data` serializer DRF supaya waktunya tercatat per request"""
+    try:
+        from rest_framework import serializers
+    except ImportError:
+        return
+
+    def timed(prop):
+        def data(self):
+            timings = _current.get()
+            if timings is None:
+                return prop.fget(self)
+            timings.serializer_depth += 1
+            start = time.perf_counter()
+            try:
+                return prop.fget(self)
+            finally:
+                timings.serializer_depth -= 1
+                if not timings.serializer_depth:
+                    timings.serializer_time += time.perf_counter() - start
+        data._perf_instrumented = True
+        return property(data)
+
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(cls.data.fget, '_perf_instrumented', False):
+            cls.data = timed(cls.data)
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, 'PERF_SAMPLE_RATE', 0.0)
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.n_plus_one_threshold = getattr(settings, 'PERF_N_PLUS_ONE_THRESHOLD', 10)
+        self.server_timing = getattr(settings, 'PERF_SERVER_TIMING', True)
+        self.get_response = get_response
+        _instrument_serializers()
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total = time.perf_counter() - timings.started
+        size = len(response.content) if not response.streaming else 0
+        view = self.view_name(request)
+        stats.add(view, total, timings.queries, timings.db_time, size)
+
+        repeated = [(shape, n) for shape, n in timings.shapes.items() if n >= self.n_plus_one_threshold]
+        if repeated:
+            shape, n = max(repeated, key=lambda item: item[1])
+            logger.warning(
+                "Kemungkinan N+1 di %s: %d query identik (%d total)", view, n, timings.queries,
+                extra={'extra_data': {'view': view, 'sql': shape[:500], 'count': n}},
+            )
+
+        if self.server_timing:
+            metrics = [
+                f'db;dur={timings.db_time * 1000:.2f};desc="{timings.queries} queries"',
+                f'total;dur={total * 1000:.2f}',
+            ]
+            if timings.serializer_time:
+                metrics.insert(1, f'serializer;dur={timings.serializer_time * 1000:.2f}')
+            if timings.render_time:
+                metrics.insert(1, f'render;dur={timings.render_time * 1000:.2f}')
+            if repeated:
+                metrics.append(f'nplusone;desc="{max(n for _, n in repeated)} repeated queries"')
+            response['Server-Timing'] = ', '.join(metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        timings = _current.get()
+        if timings is not None:
+            timings.render_start = time.perf_counter()
+            response.add_post_render_callback(lambda r: self._rendered(timings))
+        return response
+
+    @staticmethod
+    def _rendered(timings):
+        timings.render_time = time.perf_counter() - timings.render_start
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unresolved'
+        return match.view_name or match._func_path
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:18
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_readings(apps, schema_editor):
+    """Sisakan reading paling awal untuk setiap (sensor, timestamp) ganda"""
+    Reading = apps.get_model('monitoring', 'Reading')
+    duplicates = (
+        Reading.objects.values('sensor_id', 'timestamp')
+        .annotate(n=Count('id'), keep=Min('id'))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    for row in duplicates.iterator():
+        Reading.objects.filter(
+            sensor_id=row['sensor_id'], timestamp=row['timestamp']
+        ).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0002_alertnotification_report_sensorthreshold_systemlog_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reading',
+            name='sequence',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(remove_duplicate_readings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reading',
+            constraint=models.UniqueConstraint(fields=('sensor', 'timestamp'), name='unique_reading_sensor_timestamp'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0003_reading_sequence_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sensorthreshold',
+            name='threshold_type',
+            field=models.CharField(choices=[('flow', 'Flow Rate'), ('distance', 'Distance (Water Level)'), ('rise', 'Rise Rate (cm/jam)')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0004_sensorthreshold_rise'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('issued_at', models.DateTimeField()),
+                ('values', models.JSONField(default=dict)),
+                ('generated_at', models.DateTimeField(auto_now=True)),
+                ('sensor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast', to='monitoring.sensor')),
+            ],
+            options={
+                'verbose_name': 'Sensor Forecast',
+                'verbose_name_plural': 'Sensor Forecasts',
+            },
+        ),
+    ]
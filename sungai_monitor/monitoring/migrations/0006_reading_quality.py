@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0005_sensorforecast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reading',
+            name='quality',
+            field=models.CharField(choices=[('good', 'Good'), ('spike', 'Spike'), ('range', 'Out of Range'), ('stuck', 'Stuck Value')], default='good', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['sensor', 'quality', 'timestamp'], name='monitoring__sensor__14f5f9_idx'),
+        ),
+    ]
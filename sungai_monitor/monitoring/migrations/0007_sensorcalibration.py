@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_flow_rate(apps, schema_editor):
+    """Tanpa kalibrasi, flow_rate dianggap sudah dalam m³/s"""
+    Reading = apps.get_model('monitoring', 'Reading')
+    Reading.objects.filter(flow_rate__isnull=False).update(flow_m3s=F('flow_rate'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0006_reading_quality'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reading',
+            name='flow_m3s',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reading',
+            name='water_level',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='SensorCalibration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valid_from', models.DateTimeField()),
+                ('mount_height', models.FloatField(blank=True, null=True)),
+                ('distance_offset', models.FloatField(default=0.0)),
+                ('distance_scale', models.FloatField(default=1.0)),
+                ('flow_unit', models.CharField(choices=[('m3/s', 'm³/s'), ('l/s', 'liter/s'), ('m3/h', 'm³/jam'), ('l/min', 'liter/menit')], default='m3/s', max_length=10)),
+                ('flow_scale', models.FloatField(default=1.0)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calibrations', to='monitoring.sensor')),
+            ],
+            options={
+                'verbose_name': 'Sensor Calibration',
+                'verbose_name_plural': 'Sensor Calibrations',
+                'ordering': ['sensor', '-valid_from'],
+                'constraints': [models.UniqueConstraint(fields=('sensor', 'valid_from'), name='unique_calibration_sensor_valid_from')],
+            },
+        ),
+        migrations.RunPython(copy_flow_rate, migrations.RunPython.noop),
+    ]
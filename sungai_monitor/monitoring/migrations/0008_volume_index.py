@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0007_sensorcalibration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VolumeIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_timestamp', models.DateTimeField()),
+                ('cumulative', models.FloatField(default=0.0)),
+                ('sensor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='volume_index', to='monitoring.sensor')),
+            ],
+            options={
+                'verbose_name': 'Volume Index',
+                'verbose_name_plural': 'Volume Indexes',
+            },
+        ),
+        migrations.CreateModel(
+            name='VolumeCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('cumulative', models.FloatField()),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='volume_checkpoints', to='monitoring.sensor')),
+            ],
+            options={
+                'ordering': ['sensor', 'timestamp'],
+                'constraints': [models.UniqueConstraint(fields=('sensor', 'timestamp'), name='unique_volume_checkpoint')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0008_volume_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertEpisode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('safe', 'Safe'), ('warning', 'Warning'), ('danger', 'Danger'), ('critical', 'Critical')], max_length=20)),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('last_timestamp', models.DateTimeField()),
+                ('reading_count', models.PositiveIntegerField(default=0)),
+                ('peak_flow', models.FloatField(blank=True, null=True)),
+                ('peak_distance', models.FloatField(blank=True, null=True)),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_episodes', to='monitoring.sensor')),
+            ],
+            options={
+                'verbose_name': 'Alert Episode',
+                'verbose_name_plural': 'Alert Episodes',
+                'ordering': ['sensor', '-started_at'],
+                'indexes': [models.Index(fields=['sensor', 'started_at'], name='monitoring__sensor__616f2a_idx'), models.Index(fields=['level', 'started_at'], name='monitoring__level_90ce72_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0009_alert_episode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensor',
+            name='alert_level',
+            field=models.CharField(default='safe', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='sensor',
+            name='current_distance',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='sensor',
+            name='current_water_level',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='SensorGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('group_type', models.CharField(choices=[('basin', 'Daerah Aliran Sungai'), ('river', 'Sungai'), ('segment', 'Ruas'), ('other', 'Lainnya')], default='basin', max_length=20)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sensor_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('online_count', models.IntegerField(default=0, editable=False)),
+                ('warning_count', models.IntegerField(default=0, editable=False)),
+                ('danger_count', models.IntegerField(default=0, editable=False)),
+                ('critical_count', models.IntegerField(default=0, editable=False)),
+                ('distance_sum', models.FloatField(default=0.0, editable=False)),
+                ('distance_count', models.IntegerField(default=0, editable=False)),
+                ('water_level_sum', models.FloatField(default=0.0, editable=False)),
+                ('water_level_count', models.IntegerField(default=0, editable=False)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='monitoring.sensorgroup')),
+            ],
+            options={
+                'verbose_name': 'Sensor Group',
+                'verbose_name_plural': 'Sensor Groups',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='sensor',
+            name='group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sensors', to='monitoring.sensorgroup'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0011_alert_subscription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertnotification',
+            name='alert_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='PendingAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('email', 'Email'), ('telegram', 'Telegram'), ('whatsapp', 'WhatsApp'), ('web', 'Web Push')], max_length=20)),
+                ('recipient', models.CharField(max_length=200)),
+                ('level', models.CharField(max_length=20)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reading', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_alerts', to='monitoring.reading')),
+            ],
+            options={
+                'verbose_name': 'Pending Alert',
+                'verbose_name_plural': 'Pending Alerts',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['notification_type', 'recipient', 'created_at'], name='monitoring__notific_37dd21_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:54
+
+import hashlib
+import hmac
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def hash_existing_keys(apps, schema_editor):
+    """Pindahkan Sensor.api_key plaintext ke SensorApiKey (hash sama dengan authentication.hash_key)"""
+    Sensor = apps.get_model('monitoring', 'Sensor')
+    SensorApiKey = apps.get_model('monitoring', 'SensorApiKey')
+    secret = (getattr(settings, 'API_KEY_SECRET', None) or settings.SECRET_KEY).encode()
+    keys = []
+    for sensor_id, key in Sensor.objects.exclude(api_key__isnull=True).exclude(api_key='').values_list('id', 'api_key'):
+        prefix = key.split('.', 1)[0][:16] if '.' in key else key[:8]
+        digest = hmac.new(secret, key.encode(), hashlib.sha256).hexdigest()
+        keys.append(SensorApiKey(sensor_id=sensor_id, prefix=prefix, key_hash=digest))
+    SensorApiKey.objects.bulk_create(keys)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0012_alert_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorApiKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(db_index=True, max_length=16)),
+                ('key_hash', models.CharField(max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='api_keys', to='monitoring.sensor')),
+            ],
+            options={
+                'verbose_name': 'Sensor API Key',
+                'verbose_name_plural': 'Sensor API Keys',
+                'ordering': ['sensor', '-created_at'],
+            },
+        ),
+        # Kolom Sensor.api_key baru dihapus di 0015; rollback migrasi ini aman
+        # karena key plaintext masih ada di kolom lama
+        migrations.RunPython(hash_existing_keys, migrations.RunPython.noop),
+    ]
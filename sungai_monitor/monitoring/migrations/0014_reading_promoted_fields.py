@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0013_sensor_api_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reading',
+            name='humidity',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reading',
+            name='temperature',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['sensor', 'temperature'], name='monitoring__sensor__cd0a78_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['sensor', 'humidity'], name='monitoring__sensor__e6ab8a_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0014_reading_promoted_fields'),
+    ]
+
+    operations = [
+        # Tanpa reverse_code: key plaintext tidak bisa dipulihkan dari hash,
+        # jadi rollback ditolak (IrreversibleError) daripada mengembalikan
+        # kolom api_key kosong dan diam-diam memutus semua perangkat
+        migrations.RunPython(migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='sensor',
+            name='api_key',
+        ),
+    ]
@@ -5,6 +5,82 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 
 # ========== MODELS EXISTING (Your Original) ==========
 
+class SensorGroup(models.Model):
+    """
+    Kelompok sensor bertingkat (DAS > sungai > ruas). Agregat di bawah
+    mencakup seluruh sensor di subtree dan diperbarui inkremental dari
+    perubahan state sensor (lihat groups.py), bukan dihitung ulang.
+    """
+    GROUP_TYPES = [
+        ('basin', 'Daerah Aliran Sungai'),
+        ('river', 'Sungai'),
+        ('segment', 'Ruas'),
+        ('other', 'Lainnya'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    group_type = models.CharField(max_length=20, choices=GROUP_TYPES, default='basin')
+    parent = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='children')
+    description = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    # ===== AGREGAT SUBTREE (dipelihara oleh groups.py) =====
+    sensor_count = models.PositiveIntegerField(default=0, editable=False)
+    online_count = models.IntegerField(default=0, editable=False)
+    warning_count = models.IntegerField(default=0, editable=False)
+    danger_count = models.IntegerField(default=0, editable=False)
+    critical_count = models.IntegerField(default=0, editable=False)
+    distance_sum = models.FloatField(default=0.0, editable=False)
+    distance_count = models.IntegerField(default=0, editable=False)
+    water_level_sum = models.FloatField(default=0.0, editable=False)
+    water_level_count = models.IntegerField(default=0, editable=False)
+    
+    AGGREGATE_FIELDS = (
+        'sensor_count', 'online_count', 'warning_count', 'danger_count', 'critical_count',
+        'distance_sum', 'distance_count', 'water_level_sum', 'water_level_count',
+    )
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Sensor Group'
+        verbose_name_plural = 'Sensor Groups'
+    
+    def __str__(self):
+        return f"{self.name} ({self.get_group_type_display()})"
+    
+    def save(self, *args, **kwargs):
+        # Agregat hanya diubah lewat groups.py (x = x + delta); instance lama tidak boleh menimpanya
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.AGGREGATE_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        parent = self.parent
+        while parent is not None:
+            if parent.pk == self.pk:
+                raise ValidationError({'parent': 'Grup tidak boleh menjadi leluhur dirinya sendiri'})
+            parent = parent.parent
+    
+    @property
+    def worst_alert(self):
+        for level in ('critical', 'danger', 'warning'):
+            if getattr(self, f'{level}_count') > 0:
+                return level
+        return 'safe'
+    
+    @property
+    def avg_distance(self):
+        return self.distance_sum / self.distance_count if self.distance_count else None
+    
+    @property
+    def avg_water_level(self):
+        return self.water_level_sum / self.water_level_count if self.water_level_count else None
+
+
 class Sensor(models.Model):
     """
     Identitas sensor / perangkat (flow sensor + ultrasonic)
@@ -35,14 +111,30 @@ class Sensor(models.Model):
         ],
         default='offline'
     )
-    api_key = models.CharField(max_length=100, unique=True, blank=True, null=True)
     last_seen = models.DateTimeField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
     updated_at = models.DateTimeField(auto_now=True)
+    
+    # ===== KELOMPOK & STATE TERKINI (dari reading terakhir, lihat groups.py) =====
+    group = models.ForeignKey(SensorGroup, on_delete=models.SET_NULL, blank=True, null=True, related_name='sensors')
+    alert_level = models.CharField(max_length=20, default='safe', editable=False)
+    current_distance = models.FloatField(blank=True, null=True, editable=False)     # distance good terakhir
+    current_water_level = models.FloatField(blank=True, null=True, editable=False)
+
+    # Diisi save_readings (groups.py), tidak ditulis ulang oleh save() biasa
+    CURRENT_STATE_FIELDS = ('alert_level', 'current_distance', 'current_water_level')
 
     def __str__(self):
         return f"{self.name} ({self.identifier})"
     
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.CURRENT_STATE_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
     def update_status(self):
         """Update status berdasarkan last_seen"""
         if self.last_seen:
@@ -59,6 +151,30 @@ class Sensor(models.Model):
         ordering = ['-created_at']
 
 
+class SensorApiKey(models.Model):
+    """
+    API key perangkat. Hanya HMAC-SHA256 key yang disimpan; prefix (bagian
+    sebelum titik) dipakai untuk lookup. Saat rotasi key lama tetap berlaku
+    sampai expires_at (lihat authentication.py dan rotate_api_key).
+    """
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='api_keys')
+    prefix = models.CharField(max_length=16, db_index=True)
+    key_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(blank=True, null=True)  # kosong = berlaku sampai dirotasi
+    
+    class Meta:
+        ordering = ['sensor', '-created_at']
+        verbose_name = 'Sensor API Key'
+        verbose_name_plural = 'Sensor API Keys'
+    
+    def __str__(self):
+        return f"{self.sensor.identifier} {self.prefix}..."
+    
+    def is_valid(self, now=None):
+        return self.expires_at is None or self.expires_at > (now or timezone.now())
+
+
 class Reading(models.Model):
     """
     Pembacaan dari sensor
@@ -68,7 +184,7 @@ class Reading(models.Model):
     flow_rate = models.FloatField(blank=True, null=True)   # e.g. liter/s atau m3/s
     distance = models.FloatField(blank=True, null=True)    # SRF (cm)
     battery = models.FloatField(blank=True, null=True)     # optional
-    raw = models.JSONField(blank=True, null=True)          # untuk menyimpan payload tambahan
+    raw = models.JSONField(blank=True, null=True)          # payload tambahan yang tidak dipromosikan ke kolom
     created_at = models.DateTimeField(auto_now_add=True)
     
     # ===== TAMBAHAN FIELDS UNTUK FITUR ALERT =====
@@ -83,57 +199,80 @@ class Reading(models.Model):
         default='safe'
     )
     notes = models.TextField(blank=True, null=True)
+    
+    # ===== IDEMPOTENT INGEST =====
+    sequence = models.PositiveIntegerField(blank=True, null=True)  # nomor urut dari perangkat (opsional)
+    
+    # ===== NILAI TERKALIBRASI (lihat calibration.py) =====
+    water_level = models.FloatField(blank=True, null=True)  # cm di atas datum
+    flow_m3s = models.FloatField(blank=True, null=True)     # flow_rate dalam m³/s
+    
+    # ===== KUALITAS DATA (lihat quality.py) =====
+    quality = models.CharField(
+        max_length=10,
+        choices=[
+            ('good', 'Good'),
+            ('spike', 'Spike'),
+            ('range', 'Out of Range'),
+            ('stuck', 'Stuck Value'),
+        ],
+        default='good'
+    )
+    
+    # ===== KEY RAW YANG DIPROMOSIKAN (RAW_PROMOTED_FIELDS, lihat ingest.promote_raw) =====
+    temperature = models.FloatField(blank=True, null=True)  # °C
+    humidity = models.FloatField(blank=True, null=True)     # %
 
     class Meta:
         indexes = [
             models.Index(fields=['sensor', 'timestamp']),
             models.Index(fields=['alert_level', '-timestamp']),
+            models.Index(fields=['sensor', 'quality', 'timestamp']),
+            models.Index(fields=['sensor', 'temperature']),
+            models.Index(fields=['sensor', 'humidity']),
+        ]
+        constraints = [
+            # Retry dari perangkat tidak boleh membuat reading ganda
+            models.UniqueConstraint(fields=['sensor', 'timestamp'], name='unique_reading_sensor_timestamp'),
         ]
         ordering = ['-timestamp']
 
     def __str__(self):
         return f"{self.sensor.identifier} @ {self.timestamp.isoformat()}"
     
-    def check_thresholds(self):
+    def check_thresholds(self, thresholds=None):
         """
         Cek threshold untuk flow_rate dan distance
         Set alert_level berdasarkan threshold yang aktif
+
+        Args:
+            thresholds: list SensorThreshold aktif milik sensor ini (opsional,
+                        untuk ingest batch supaya tidak query per reading)
         """
-        # Check flow rate thresholds
-        if self.flow_rate is not None:
-            flow_thresholds = self.sensor.thresholds.filter(
-                is_active=True,
-                threshold_type='flow'
-            ).order_by('-min_value')
+        for threshold_type, value in (('flow', self.flow_rate), ('distance', self.distance)):
+            if value is None:
+                continue
             
-            for threshold in flow_thresholds:
-                if threshold.min_value and threshold.max_value:
-                    if threshold.min_value <= self.flow_rate <= threshold.max_value:
-                        self.alert_level = threshold.alert_level
-                        return threshold
-                elif threshold.min_value and self.flow_rate >= threshold.min_value:
-                    self.alert_level = threshold.alert_level
-                    return threshold
-                elif threshold.max_value and self.flow_rate <= threshold.max_value:
-                    self.alert_level = threshold.alert_level
-                    return threshold
-        
-        # Check distance thresholds
-        if self.distance is not None:
-            distance_thresholds = self.sensor.thresholds.filter(
-                is_active=True,
-                threshold_type='distance'
-            ).order_by('-min_value')
+            if thresholds is None:
+                candidates = self.sensor.thresholds.filter(
+                    is_active=True,
+                    threshold_type=threshold_type
+                ).order_by('-min_value')
+            else:
+                candidates = sorted(
+                    (t for t in thresholds if t.is_active and t.threshold_type == threshold_type),
+                    key=lambda t: (t.min_value is None, -(t.min_value or 0))
+                )
             
-            for threshold in distance_thresholds:
+            for threshold in candidates:
                 if threshold.min_value and threshold.max_value:
-                    if threshold.min_value <= self.distance <= threshold.max_value:
+                    if threshold.min_value <= value <= threshold.max_value:
                         self.alert_level = threshold.alert_level
                         return threshold
-                elif threshold.min_value and self.distance >= threshold.min_value:
+                elif threshold.min_value and value >= threshold.min_value:
                     self.alert_level = threshold.alert_level
                     return threshold
-                elif threshold.max_value and self.distance <= threshold.max_value:
+                elif threshold.max_value and value <= threshold.max_value:
                     self.alert_level = threshold.alert_level
                     return threshold
         
@@ -155,6 +294,7 @@ class SensorThreshold(models.Model):
     THRESHOLD_TYPES = [
         ('flow', 'Flow Rate'),
         ('distance', 'Distance (Water Level)'),
+        ('rise', 'Rise Rate (cm/jam)'),  # min_value = laju naik muka air, lihat detectors.py
     ]
     
     sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='thresholds')
@@ -198,6 +338,7 @@ class AlertNotification(models.Model):
     sent_at = models.DateTimeField(blank=True, null=True)
     error_message = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    alert_count = models.PositiveIntegerField(default=1)  # >1 untuk digest; reading = alert terparah
     
     class Meta:
         ordering = ['-created_at']
@@ -208,6 +349,30 @@ class AlertNotification(models.Model):
         return f"{self.notification_type} to {self.recipient} - {self.status}"
 
 
+class PendingAlert(models.Model):
+    """
+    Alert yang menunggu digabung menjadi satu digest per penerima
+    (ALERT_DIGEST_WINDOW, dikirim oleh send_alert_digests)
+    """
+    reading = models.ForeignKey(Reading, on_delete=models.CASCADE, related_name='pending_alerts')
+    notification_type = models.CharField(max_length=20, choices=AlertNotification.NOTIFICATION_TYPES)
+    recipient = models.CharField(max_length=200)
+    level = models.CharField(max_length=20)
+    message = models.TextField()
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['notification_type', 'recipient', 'created_at']),
+        ]
+        verbose_name = 'Pending Alert'
+        verbose_name_plural = 'Pending Alerts'
+    
+    def __str__(self):
+        return f"{self.notification_type} to {self.recipient} - {self.level}"
+
+
 class SystemLog(models.Model):
     """Model untuk system logging"""
     LOG_LEVELS = [
@@ -265,6 +430,43 @@ class UserProfile(models.Model):
         return f"{self.user.username} - {self.role}"
 
 
+class AlertSubscription(models.Model):
+    """
+    Langganan alert per user: satu sensor, satu grup (beserta sub-grupnya)
+    atau semua sensor kalau keduanya kosong. User yang punya langganan aktif
+    hanya menerima alert sesuai langganannya; tanpa langganan berlaku flag
+    receive_*_alerts di UserProfile untuk semua sensor (lihat subscriptions.py).
+    """
+    LEVEL_CHOICES = [
+        ('warning', 'Warning'),
+        ('danger', 'Danger'),
+        ('critical', 'Critical'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='alert_subscriptions')
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, blank=True, null=True, related_name='subscriptions')
+    group = models.ForeignKey(SensorGroup, on_delete=models.CASCADE, blank=True, null=True, related_name='subscriptions')
+    min_level = models.CharField(max_length=20, choices=LEVEL_CHOICES, default='warning')
+    email = models.BooleanField(default=True)
+    telegram = models.BooleanField(default=False)  # butuh UserProfile.telegram_id
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['user', 'id']
+        verbose_name = 'Alert Subscription'
+        verbose_name_plural = 'Alert Subscriptions'
+    
+    def __str__(self):
+        target = self.sensor or self.group or 'semua sensor'
+        return f"{self.user.username} - {target} (>= {self.min_level})"
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self.sensor_id and self.group_id:
+            raise ValidationError('Pilih sensor atau grup, tidak keduanya')
+
+
 class Report(models.Model):
     """Model untuk laporan yang di-generate"""
     REPORT_TYPES = [
@@ -298,4 +500,120 @@ class Report(models.Model):
         verbose_name_plural = 'Reports'
     
     def __str__(self):
-        return f"{self.title} - {self.status}"
\ No newline at end of file
+        return f"{self.title} - {self.status}"
+
+class SensorForecast(models.Model):
+    """Prakiraan distance jangka pendek per sensor, diperbarui oleh update_forecasts"""
+    sensor = models.OneToOneField(Sensor, on_delete=models.CASCADE, related_name='forecast')
+    issued_at = models.DateTimeField()  # akhir bucket data terakhir yang dipakai
+    values = models.JSONField(default=dict)  # {'1h': {'distance', 'model', 'alert_level'}, ...}
+    generated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Sensor Forecast'
+        verbose_name_plural = 'Sensor Forecasts'
+    
+    def __str__(self):
+        return f"{self.sensor.identifier} @ {self.issued_at.isoformat()}"
+    
+    def horizons(self):
+        """List (horizon, nilai) untuk template"""
+        return list(self.values.items())
+
+
+class SensorCalibration(models.Model):
+    """
+    Kalibrasi sensor mulai `valid_from` (lihat calibration.py):
+    water_level = mount_height - (distance * distance_scale + distance_offset)
+    flow_m3s    = flow_rate * flow_scale * faktor flow_unit
+    """
+    FLOW_UNITS = [
+        ('m3/s', 'm³/s'),
+        ('l/s', 'liter/s'),
+        ('m3/h', 'm³/jam'),
+        ('l/min', 'liter/menit'),
+    ]
+    
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='calibrations')
+    valid_from = models.DateTimeField()
+    mount_height = models.FloatField(blank=True, null=True)  # cm, tinggi sensor di atas datum
+    distance_offset = models.FloatField(default=0.0)         # cm
+    distance_scale = models.FloatField(default=1.0)
+    flow_unit = models.CharField(max_length=10, choices=FLOW_UNITS, default='m3/s')  # satuan kiriman perangkat
+    flow_scale = models.FloatField(default=1.0)
+    notes = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['sensor', '-valid_from']
+        constraints = [
+            models.UniqueConstraint(fields=['sensor', 'valid_from'], name='unique_calibration_sensor_valid_from'),
+        ]
+        verbose_name = 'Sensor Calibration'
+        verbose_name_plural = 'Sensor Calibrations'
+    
+    def __str__(self):
+        return f"{self.sensor.identifier} sejak {self.valid_from.isoformat()}"
+
+
+class VolumeIndex(models.Model):
+    """Kepala indeks volume kumulatif per sensor (lihat volume.py)"""
+    sensor = models.OneToOneField(Sensor, on_delete=models.CASCADE, related_name='volume_index')
+    last_timestamp = models.DateTimeField()       # reading flow terakhir yang sudah diintegrasikan
+    cumulative = models.FloatField(default=0.0)   # m³ dari reading pertama sampai last_timestamp
+    
+    class Meta:
+        verbose_name = 'Volume Index'
+        verbose_name_plural = 'Volume Indexes'
+    
+    def __str__(self):
+        return f"{self.sensor.identifier}: {self.cumulative:.1f} m³"
+
+
+class VolumeCheckpoint(models.Model):
+    """Volume kumulatif (m³) sensor pada setiap batas bucket"""
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='volume_checkpoints')
+    timestamp = models.DateTimeField()
+    cumulative = models.FloatField()
+    
+    class Meta:
+        ordering = ['sensor', 'timestamp']
+        constraints = [
+            models.UniqueConstraint(fields=['sensor', 'timestamp'], name='unique_volume_checkpoint'),
+        ]
+    
+    def __str__(self):
+        return f"{self.sensor.identifier} @ {self.timestamp.isoformat()}: {self.cumulative:.1f} m³"
+
+
+class AlertEpisode(models.Model):
+    """
+    Rentang waktu sensor berada di satu alert_level selain safe (lihat episodes.py).
+    Episode berakhir di reading pertama dengan level berbeda; ended_at kosong
+    berarti masih berlangsung.
+    """
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='alert_episodes')
+    level = models.CharField(max_length=20, choices=SensorThreshold.ALERT_LEVELS)
+    started_at = models.DateTimeField()                       # reading pertama di level ini
+    ended_at = models.DateTimeField(blank=True, null=True)    # reading pertama sesudahnya dengan level lain
+    last_timestamp = models.DateTimeField()                   # reading terakhir di level ini
+    reading_count = models.PositiveIntegerField(default=0)
+    peak_flow = models.FloatField(blank=True, null=True)      # flow_rate tertinggi
+    peak_distance = models.FloatField(blank=True, null=True)  # distance terkecil (muka air tertinggi), tanpa spike
+    
+    class Meta:
+        ordering = ['sensor', '-started_at']
+        indexes = [
+            models.Index(fields=['sensor', 'started_at']),
+            models.Index(fields=['level', 'started_at']),
+        ]
+        verbose_name = 'Alert Episode'
+        verbose_name_plural = 'Alert Episodes'
+    
+    def __str__(self):
+        return f"{self.sensor.identifier} {self.level} sejak {self.started_at.isoformat()}"
+    
+    def duration(self, until=None):
+        """Lama episode; episode yang masih berlangsung dihitung sampai `until` (default sekarang)"""
+        end = self.ended_at or until or timezone.now()
+        return end - self.started_at
@@ -0,0 +1,260 @@
+"""
+Profiler sampling yang bisa dinyalakan saat runtime tanpa deploy ulang.
+
+Pemicu:
+    - header `X-Profile: sample|cprofile` dari user staff (atau dengan
+      `X-Profile-Token` = settings.PROFILING_TOKEN), lihat ProfilingMiddleware
+    - settings.PROFILING_VIEWS = {'dashboard': 0.01} untuk menyampel view tertentu
+    - settings.PROFILING_COMMANDS = ['import_readings'] untuk management command
+    - sinyal SIGUSR2 ke proses mana pun (worker web, run_ingest_listener):
+      sampling semua thread sampai PROFILING_MAX_SECONDS atau SIGUSR2 berikutnya
+
+Mode `sample` menulis file .collapsed (format collapsed stack, bisa langsung
+dibaca flamegraph.pl / speedscope); mode `cprofile` menulis file .prof
+(pstats). Durasi dan ukuran file dibatasi lewat settings.
+"""
+import atexit
+import cProfile
+import logging
+import os
+import random
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def profile_dir():
+    directory = _setting('PROFILING_DIR', None) or os.path.join(tempfile.gettempdir(), 'sungai_profiles')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and filename.startswith(prefix):
+            filename = filename[len(prefix):].lstrip(os.sep)
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """
+    Thread yang mengambil stack thread target setiap `interval` detik lewat
+    sys._current_frames() dan menghitung stack yang sama (collapsed stack).
+    """
+
+    def __init__(self, name, thread_ids=None, interval=None, max_seconds=None, autowrite=False):
+        self.name = name
+        self.autowrite = autowrite
+        self.path = None
+        self.thread_ids = thread_ids
+        self.interval = interval or _setting('PROFILING_INTERVAL', 0.005)
+        self.max_seconds = max_seconds or _setting('PROFILING_MAX_SECONDS', 30)
+        self.stacks = Counter()
+        self.samples = 0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        deadline = self._started + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (self.thread_ids and thread_id not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = self._labels.get(code)
+                    if label is None:
+                        label = self._labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                if not self.thread_ids:
+                    # Profil seluruh proses: pisahkan per thread di akar flamegraph
+                    if thread_id not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+        if self.autowrite:
+            # Profil tanpa pemilik (sinyal/command) ditulis saat selesai,
+            # termasuk saat berhenti karena batas waktu
+            self.path = self.write()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.path if self.autowrite else self.write()
+
+    def write(self):
+        """Tulis stack terbanyak dulu sampai batas PROFILING_MAX_BYTES"""
+        max_bytes = _setting('PROFILING_MAX_BYTES', 1024 * 1024)
+        path = _output_path(self.name, 'collapsed')
+        written = 0
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                line = f'{stack} {count}\n'
+                written += len(line)
+                if written > max_bytes:
+                    break
+                f.write(line)
+        logger.info("Profil %s: %d sampel ditulis ke %s", self.name, self.samples, path)
+        return path
+
+
+class CProfileProfiler:
+    """cProfile untuk thread pemanggil; hasil ditulis sebagai file pstats"""
+
+    def __init__(self, name):
+        self.name = name
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+        return self
+
+    def stop(self):
+        self.profile.disable()
+        path = _output_path(self.name, 'prof')
+        self.profile.dump_stats(path)
+        logger.info("Profil %s (cProfile) ditulis ke %s", self.name, path)
+        return path
+
+
+def _output_path(name, extension):
+    directory = profile_dir()
+    _prune(directory)
+    safe_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+    return os.path.join(directory, f'{safe_name}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.{extension}')
+
+
+def _prune(directory):
+    """Simpan maksimal PROFILING_MAX_FILES file terbaru"""
+    max_files = _setting('PROFILING_MAX_FILES', 100)
+    files = sorted(
+        (os.path.join(directory, f) for f in os.listdir(directory)),
+        key=os.path.getmtime,
+    )
+    for path in files[:max(0, len(files) - max_files + 1)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def start_profiler(name, mode='sample'):
+    """Mulai profiler untuk thread saat ini; panggil .stop() untuk menulis file"""
+    if mode == 'cprofile':
+        return CProfileProfiler(name).start()
+    return SamplingProfiler(name, thread_ids={threading.get_ident()}).start()
+
+
+@contextmanager
+def profile(name, mode='sample'):
+    """Profil satu blok kode, mis. `with profile('report_build'): ...`"""
+    profiler = start_profiler(name, mode)
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+
+
+# ========== SIGNAL & MANAGEMENT COMMAND ==========
+
+_signal_profiler = None
+
+
+def _toggle_on_signal(signum, frame):
+    global _signal_profiler
+    if _signal_profiler is not None and _signal_profiler.is_running():
+        # SIGUSR2 kedua: hentikan lebih awal, thread profiler menulis file
+        _signal_profiler._stop.set()
+        _signal_profiler = None
+        return
+    name = f'signal-{os.path.basename(sys.argv[0])}'
+    _signal_profiler = SamplingProfiler(name, autowrite=True).start()
+    logger.info("Profiling proses %d dimulai (SIGUSR2)", os.getpid())
+
+
+def install(argv=None):
+    """Dipanggil dari AppConfig.ready(): pasang handler SIGUSR2 dan profil command"""
+    if _setting('PROFILING_SIGNAL', True) and hasattr(signal, 'SIGUSR2') \
+            and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR2, _toggle_on_signal)
+
+    argv = sys.argv if argv is None else argv
+    commands = _setting('PROFILING_COMMANDS', [])
+    if len(argv) > 1 and os.path.basename(argv[0]) == 'manage.py' and argv[1] in commands:
+        profiler = SamplingProfiler(
+            f'command-{argv[1]}', thread_ids={threading.get_ident()}, autowrite=True
+        ).start()
+        atexit.register(profiler.stop)
+
+
+# ========== MIDDLEWARE ==========
+
+class ProfilingMiddleware:
+    """
+    Profil request yang diminta lewat header X-Profile atau yang view-nya
+    terdaftar di PROFILING_VIEWS. Nama file hasil dikirim di header
+    X-Profile-File.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._profiler = None
+        response = self.get_response(request)
+        profiler = request._profiler
+        if profiler is not None:
+            path = profiler.stop()
+            response['X-Profile-File'] = os.path.basename(path)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mode = self.requested_mode(request)
+        if mode:
+            name = request.resolver_match.view_name or view_func.__name__
+            request._profiler = start_profiler(f'view-{name}', mode)
+
+    @staticmethod
+    def requested_mode(request):
+        header = request.headers.get('X-Profile')
+        if header:
+            token = _setting('PROFILING_TOKEN', None)
+            user = getattr(request, 'user', None)
+            if (token and request.headers.get('X-Profile-Token') == token) or getattr(user, 'is_staff', False):
+                return 'cprofile' if header == 'cprofile' else 'sample'
+            return None
+
+        rate = _setting('PROFILING_VIEWS', {}).get(request.resolver_match.view_name)
+        if rate and random.random() < rate:
+            return 'sample'
+        return None
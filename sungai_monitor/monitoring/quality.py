@@ -0,0 +1,104 @@
+"""
+Pemeriksaan kualitas distance saat ingest (sensor ultrasonik SRF sering
+menghasilkan spike karena sampah/hujan).
+
+Reading tidak dibuang, hanya diberi Reading.quality:
+
+    - good  : lolos semua pemeriksaan
+    - range : di luar QUALITY_DISTANCE_RANGE (jangkauan fisik sensor)
+    - stuck : nilai sama persis QUALITY_STUCK_COUNT kali berturut-turut
+    - spike : menyimpang lebih dari QUALITY_MAD_K x MAD dari median
+              QUALITY_WINDOW reading terakhir
+
+Spike/range distance tidak memicu alert distance dan tidak masuk detektor
+laju kenaikan; agregat cukup memfilter quality='good'. Memori per sensor
+dibatasi ring buffer berukuran QUALITY_WINDOW.
+"""
+import threading
+from collections import deque
+
+from django.conf import settings
+
+# Flag yang nilai distance-nya dianggap tidak nyata
+SUSPECT = ('spike', 'range')
+
+# Skala MAD ke standar deviasi untuk distribusi normal
+MAD_SCALE = 1.4826
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+class QualityState:
+    __slots__ = ('values', 'last', 'repeats')
+
+    def __init__(self, size):
+        self.values = deque(maxlen=size)
+        self.last = None
+        self.repeats = 0
+
+
+class QualityFilter:
+    """Ring buffer distance terakhir per sensor_id untuk proses ini"""
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def evaluate(self, reading):
+        """Isi reading.quality berdasarkan distance dan histori singkat sensor"""
+        value = reading.distance
+        if value is None:
+            reading.quality = 'good'
+            return reading.quality
+
+        with self._lock:
+            state = self._states.get(reading.sensor_id)
+            if state is None:
+                state = self._states[reading.sensor_id] = QualityState(_setting('QUALITY_WINDOW', 15))
+            quality = self._check(state, value)
+            # Spike ikut masuk buffer: median tetap robust, dan perubahan level
+            # yang nyata akan diikuti setelah setengah window
+            state.values.append(value)
+
+        reading.quality = quality
+        return quality
+
+    @staticmethod
+    def _check(state, value):
+        if value == state.last:
+            state.repeats += 1
+        else:
+            state.last, state.repeats = value, 1
+
+        low, high = _setting('QUALITY_DISTANCE_RANGE', (2.0, 800.0))
+        if not low <= value <= high:
+            return 'range'
+        if state.repeats >= _setting('QUALITY_STUCK_COUNT', 12):
+            return 'stuck'
+        if len(state.values) >= _setting('QUALITY_MIN_SAMPLES', 5):
+            center = median(state.values)
+            mad = median([abs(v - center) for v in state.values])
+            limit = max(_setting('QUALITY_MAD_K', 5.0) * MAD_SCALE * mad, _setting('QUALITY_MIN_DEVIATION', 10.0))
+            if abs(value - center) > limit:
+                return 'spike'
+        return 'good'
+
+    def reset(self, sensor_id=None):
+        with self._lock:
+            if sensor_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(sensor_id, None)
+
+
+quality_filter = QualityFilter()
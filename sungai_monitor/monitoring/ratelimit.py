@@ -0,0 +1,206 @@
+"""
+Pembatasan laju ingest per perangkat dan load shedding global.
+
+Per sensor (identifier) berlaku token bucket: INGEST_RATE_LIMIT request per
+detik dengan burst INGEST_RATE_BURST; request yang tidak menyebut sensor
+(paket rusak, sensor_id kosong) memakai bucket alamat klien. Bucket disimpan sebagai GCRA (satu
+angka "theoretical arrival time" per key) sehingga bisa disimpan di:
+
+    local : dict di memori proses (default); dengan N worker batas efektif
+            menjadi N x limit kecuali INGEST_RATE_WORKERS diisi N, maka
+            setiap worker memakai 1/N dari limit
+    cache : Django cache (mis. Redis/Memcached) yang dibagi semua worker.
+            get/set tidak atomik, jadi dua worker yang bersamaan bisa sesekali
+            lolos satu request lebih; cukup untuk menahan perangkat yang loop
+
+Secara global, request ingest masuk lewat antrean terbatas: paling banyak
+INGEST_MAX_CONCURRENT diproses bersamaan dan INGEST_MAX_QUEUE menunggu
+(paling lama INGEST_QUEUE_TIMEOUT detik). Selebihnya langsung ditolak 429
+dengan Retry-After, sehingga latensi tetap terbatas saat overload alih-alih
+semua request melambat bersama.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RateLimited(Exception):
+    """Request ditolak; retry_after dalam detik, reason 'device' atau 'overload'"""
+
+    def __init__(self, message, retry_after, reason='device'):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+# ========== TOKEN BUCKET (GCRA) ==========
+
+def gcra(tat, now, rate, burst, cost=1):
+    """
+    Satu langkah GCRA, setara token bucket (rate token/detik, kapasitas burst)
+
+    Args:
+        tat: theoretical arrival time tersimpan (None untuk key baru)
+
+    Returns:
+        tuple (tat baru atau None kalau ditolak, retry_after detik)
+    """
+    interval = 1.0 / rate
+    tat = max(tat or now, now)
+    new_tat = tat + cost * interval
+    allow_at = new_tat - burst * interval
+    if allow_at > now:
+        return None, allow_at - now
+    return new_tat, 0.0
+
+
+class LocalBackend:
+    """State bucket di memori proses, dibatasi max_keys (LRU)"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._tats = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tat, retry_after = gcra(self._tats.get(key), now, rate, burst, cost)
+            if tat is not None:
+                self._tats[key] = tat
+                self._tats.move_to_end(key)
+                if len(self._tats) > self.max_keys:
+                    self._tats.popitem(last=False)
+        return retry_after
+
+    def clear(self):
+        with self._lock:
+            self._tats.clear()
+
+
+class CacheBackend:
+    """State bucket di Django cache supaya batas berlaku lintas worker"""
+
+    def __init__(self, alias='default', prefix='ingest-rate:'):
+        self.alias = alias
+        self.prefix = prefix
+
+    def take(self, key, rate, burst, cost=1):
+        from django.core.cache import caches
+        cache = caches[self.alias]
+        now = time.time()
+        tat, retry_after = gcra(cache.get(self.prefix + key), now, rate, burst, cost)
+        if tat is not None:
+            cache.set(self.prefix + key, tat, timeout=math.ceil(tat - now) + 1)
+        return retry_after
+
+    def clear(self):
+        pass
+
+
+class DeviceRateLimiter:
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    kind = _setting('INGEST_RATE_BACKEND', 'local')
+                    self._backend = CacheBackend() if kind == 'cache' else LocalBackend()
+        return self._backend
+
+    def reset(self):
+        with self._lock:
+            self._backend = None
+
+    def check(self, identifier, cost=1):
+        """
+        Ambil token untuk sensor ini
+
+        Raises:
+            RateLimited: bucket sensor kosong
+        """
+        rate = _setting('INGEST_RATE_LIMIT', 1.0)
+        if not rate or not identifier:
+            return
+        burst = _setting('INGEST_RATE_BURST', 10)
+        if _setting('INGEST_RATE_BACKEND', 'local') != 'cache':
+            rate /= max(1, _setting('INGEST_RATE_WORKERS', 1))
+        retry_after = self.backend.take(str(identifier), rate, burst, cost)
+        if retry_after:
+            raise RateLimited(f"sensor {identifier} melebihi batas laju ingest", retry_after)
+
+
+device_limiter = DeviceRateLimiter()
+
+
+# ========== ANTREAN INGEST ==========
+
+class AdmissionQueue:
+    """Batasi request yang diproses bersamaan dan yang boleh menunggu"""
+
+    def __init__(self, max_concurrent=None, max_queue=None, timeout=None):
+        self._max_concurrent = max_concurrent
+        self._max_queue = max_queue
+        self._timeout = timeout
+        self._condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+
+    @property
+    def max_concurrent(self):
+        return self._max_concurrent or _setting('INGEST_MAX_CONCURRENT', 8)
+
+    @property
+    def max_queue(self):
+        return _setting('INGEST_MAX_QUEUE', 32) if self._max_queue is None else self._max_queue
+
+    @property
+    def timeout(self):
+        return _setting('INGEST_QUEUE_TIMEOUT', 2.0) if self._timeout is None else self._timeout
+
+    def _retry_after(self):
+        # Perkiraan kasar: antrean penuh butuh sekitar satu timeout untuk kosong
+        return max(1.0, self.timeout)
+
+    @contextmanager
+    def slot(self):
+        """
+        Raises:
+            RateLimited: antrean penuh atau menunggu terlalu lama
+        """
+        with self._condition:
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.max_queue:
+                    raise RateLimited("server sibuk, antrean ingest penuh", self._retry_after(), 'overload')
+                self.waiting += 1
+                try:
+                    admitted = self._condition.wait_for(
+                        lambda: self.active < self.max_concurrent, timeout=self.timeout,
+                    )
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    raise RateLimited("server sibuk, antrean ingest penuh", self._retry_after(), 'overload')
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.active -= 1
+                self._condition.notify()
+
+
+ingest_queue = AdmissionQueue()
@@ -0,0 +1,288 @@
+"""
+Resampling reading ke grid waktu reguler (mis. 1/5/15/60 menit).
+
+Sensor mengirim dengan interval tidak teratur dan kadang putus, sehingga
+perbandingan antar sensor, grafik dan ekspor memakai grid yang sama:
+
+    - bucket [t, t + interval) diratakan ke kelipatan interval (epoch UTC),
+      label bucket adalah waktu awalnya
+    - agregasi per bucket: mean, last, max, min
+    - kebijakan gap untuk bucket kosong:
+        nan    : dibiarkan kosong
+        ffill  : nilai bucket terisi terakhir, paling banyak `limit` bucket
+        linear : interpolasi linear di antara dua bucket terisi, hanya untuk
+                 gap sepanjang <= `limit` bucket (tanpa ekstrapolasi di tepi)
+
+Semua sensor dikerjakan sekaligus sebagai matriks NumPy (sensor x bucket);
+reading diambil per kelompok sensor supaya memori perantara tetap kecil.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+
+from .models import Reading
+
+INTERVALS = (1, 5, 15, 60)  # menit
+AGGREGATIONS = ('mean', 'last', 'max', 'min')
+FILL_POLICIES = ('nan', 'ffill', 'linear')
+FIELDS = ('distance', 'flow_rate', 'water_level', 'flow_m3s', 'battery', 'temperature', 'humidity')
+
+
+class ResampleError(ValueError):
+    """Parameter resampling tidak valid"""
+
+
+class Series:
+    """Hasil resampling: values[field] dan counts berbentuk (sensor, bucket)"""
+
+    def __init__(self, sensor_ids, start, interval, values, counts):
+        self.sensor_ids = list(sensor_ids)
+        self.start = start          # epoch awal bucket pertama
+        self.interval = interval    # detik
+        self.values = values
+        self.counts = counts        # jumlah reading per bucket sebelum gap diisi
+
+    @property
+    def epochs(self):
+        return self.start + self.interval * np.arange(self.counts.shape[1], dtype=float)
+
+    def timestamps(self):
+        return [datetime.fromtimestamp(epoch, tz=dt_timezone.utc) for epoch in self.epochs]
+
+    def column(self, field, sensor_id):
+        """Deret satu sensor sebagai list float/None (siap JSON)"""
+        row = self.values[field][self.sensor_ids.index(sensor_id)]
+        return [None if np.isnan(value) else float(value) for value in row]
+
+
+def grid(start, end, interval):
+    """(epoch awal bucket pertama, jumlah bucket) untuk rentang [start, end)"""
+    first = start.timestamp() // interval * interval
+    buckets = int(-(-(end.timestamp() - first) // interval))
+    return first, max(buckets, 0)
+
+
+def parse_params(interval, how='mean', fill='nan', limit=None):
+    """
+    Validasi parameter dari query string
+
+    Returns:
+        tuple (interval detik, how, fill, limit bucket atau None)
+
+    Raises:
+        ResampleError
+    """
+    try:
+        minutes = int(interval)
+    except (TypeError, ValueError):
+        raise ResampleError(f"interval harus salah satu dari {INTERVALS} (menit)")
+    if minutes not in INTERVALS:
+        raise ResampleError(f"interval harus salah satu dari {INTERVALS} (menit)")
+    if how not in AGGREGATIONS:
+        raise ResampleError(f"agregasi harus salah satu dari {AGGREGATIONS}")
+    if fill not in FILL_POLICIES:
+        raise ResampleError(f"gap fill harus salah satu dari {FILL_POLICIES}")
+    if limit in (None, ''):
+        limit = None
+    else:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise ResampleError("limit harus bilangan bulat")
+        if limit < 0:
+            raise ResampleError("limit tidak boleh negatif")
+    return minutes * 60, how, fill, limit
+
+
+# ========== AGREGASI ==========
+
+def aggregate(rows, epochs, values, n_rows, buckets, how):
+    """
+    Agregasi titik (baris sensor, epoch relatif ke awal grid, nilai) ke matriks
+
+    Args:
+        rows: array int baris sensor; epochs: array kolom bucket (int)
+        values: array float, NaN diabaikan
+
+    Returns:
+        tuple (matriks nilai, matriks jumlah titik)
+    """
+    size = n_rows * buckets
+    valid = ~np.isnan(values)
+    flat = rows[valid] * buckets + epochs[valid]
+    values = values[valid]
+    counts = np.bincount(flat, minlength=size)
+    if how == 'mean':
+        sums = np.bincount(flat, weights=values, minlength=size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = sums / counts
+        return result.reshape(n_rows, buckets), counts.reshape(n_rows, buckets)
+
+    result = np.full(size, np.nan)
+    if len(flat):
+        # Dari resample() titik sudah terurut (sensor, waktu) sehingga sort dilewati;
+        # sort stabil menjaga urutan waktu untuk 'last'
+        if np.any(flat[1:] < flat[:-1]):
+            order = np.argsort(flat, kind='stable')
+            flat, values = flat[order], values[order]
+        starts = np.flatnonzero(np.r_[True, flat[1:] != flat[:-1]])
+        if how == 'last':
+            ends = np.r_[starts[1:], len(flat)] - 1
+            result[flat[starts]] = values[ends]
+        elif how == 'max':
+            result[flat[starts]] = np.maximum.reduceat(values, starts)
+        else:
+            result[flat[starts]] = np.minimum.reduceat(values, starts)
+    return result.reshape(n_rows, buckets), counts.reshape(n_rows, buckets)
+
+
+# ========== GAP FILL ==========
+
+def _previous_valid(valid):
+    """Indeks kolom terisi terakhir <= kolom ini (-1 kalau belum ada)"""
+    index = np.where(valid, np.arange(valid.shape[1]), -1)
+    return np.maximum.accumulate(index, axis=1)
+
+
+def _next_valid(valid):
+    """Indeks kolom terisi pertama >= kolom ini (n kalau tidak ada)"""
+    n = valid.shape[1]
+    index = np.where(valid, np.arange(n), n)
+    return np.minimum.accumulate(index[:, ::-1], axis=1)[:, ::-1]
+
+
+def fill_gaps(matrix, fill='nan', limit=None):
+    """Isi bucket kosong (NaN) per baris sesuai kebijakan gap"""
+    if fill == 'nan' or matrix.size == 0:
+        return matrix
+    valid = ~np.isnan(matrix)
+    rows = np.arange(matrix.shape[0])[:, None]
+    columns = np.arange(matrix.shape[1])
+    previous = _previous_valid(valid)
+    has_previous = previous >= 0
+    previous_value = matrix[rows, np.maximum(previous, 0)]
+
+    if fill == 'ffill':
+        mask = ~valid & has_previous
+        if limit is not None:
+            mask &= (columns - previous) <= limit
+        return np.where(mask, previous_value, matrix)
+
+    following = _next_valid(valid)
+    has_following = following < matrix.shape[1]
+    following_value = matrix[rows, np.minimum(following, matrix.shape[1] - 1)]
+    mask = ~valid & has_previous & has_following
+    if limit is not None:
+        mask &= (following - previous - 1) <= limit
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = (columns - previous) / (following - previous)
+        interpolated = previous_value + (following_value - previous_value) * weight
+    return np.where(mask, interpolated, matrix)
+
+
+# ========== QUERY ==========
+
+def resample(sensor_ids, start, end, interval, fields=('distance',), how='mean', fill='nan',
+             limit=None, good_only=True, chunk_sensors=50):
+    """
+    Resampling reading banyak sensor ke grid reguler [start, end)
+
+    Args:
+        interval: lebar bucket dalam detik
+        good_only: hanya reading quality='good' (sama dengan agregat laporan)
+        chunk_sensors: jumlah sensor per query
+
+    Returns:
+        Series
+
+    Raises:
+        ResampleError: field tidak dikenal atau grid terlalu besar
+    """
+    unknown = set(fields) - set(FIELDS)
+    if unknown:
+        raise ResampleError(f"field tidak dikenal: {', '.join(sorted(unknown))}")
+    sensor_ids = list(sensor_ids)
+    first, buckets = grid(start, end, interval)
+    max_cells = getattr(settings, 'RESAMPLE_MAX_CELLS', 20_000_000)
+    if len(sensor_ids) * buckets * len(fields) > max_cells:
+        raise ResampleError(
+            f"grid terlalu besar ({len(sensor_ids)} sensor x {buckets} bucket x {len(fields)} field); "
+            f"perbesar interval atau perkecil rentang"
+        )
+
+    values = {field: np.full((len(sensor_ids), buckets), np.nan) for field in fields}
+    counts = np.zeros((len(sensor_ids), buckets), dtype=int)
+    readings = Reading.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    if good_only:
+        readings = readings.filter(quality='good')
+
+    # Sensor diproses urut id supaya baris hasil query sudah terurut untuk aggregate()
+    by_id = sorted(range(len(sensor_ids)), key=sensor_ids.__getitem__)
+    for offset in range(0, len(sensor_ids), chunk_sensors):
+        positions = by_id[offset:offset + chunk_sensors]
+        chunk = [sensor_ids[position] for position in positions]
+        row_of = {sensor_id: i for i, sensor_id in enumerate(chunk)}
+        data = list(
+            readings.filter(sensor_id__in=chunk).order_by('sensor_id', 'timestamp')
+            .values_list('sensor_id', 'timestamp', *fields).iterator(chunk_size=10000)
+        )
+        if not data:
+            continue
+        rows = np.fromiter((row_of[row[0]] for row in data), dtype=np.int64, count=len(data))
+        epochs = np.fromiter((row[1].timestamp() for row in data), dtype=float, count=len(data))
+        columns = ((epochs - first) // interval).astype(np.int64)
+        block = np.array(positions)
+        for i, field in enumerate(fields, start=2):
+            raw = np.fromiter((np.nan if row[i] is None else row[i] for row in data), dtype=float, count=len(data))
+            matrix, field_counts = aggregate(rows, columns, raw, len(chunk), buckets, how)
+            values[field][block] = fill_gaps(matrix, fill, limit)
+            counts[block] = np.maximum(counts[block], field_counts)
+
+    return Series(sensor_ids, first, interval, values, counts)
+
+
+# ========== KORELASI LAG ==========
+
+def lag_correlation(reference, others, max_lag):
+    """
+    Korelasi Pearson perubahan per bucket (selisih pertama) antara deret
+    acuan dan deret lain untuk setiap lag -max_lag..max_lag bucket.
+    Lag positif berarti deret lain tertinggal dari acuan (gelombang banjir
+    sampai belakangan). Pasangan yang salah satunya NaN diabaikan.
+
+    Args:
+        reference: array (bucket,)
+        others: array (sensor, bucket)
+
+    Returns:
+        tuple (array lag, korelasi (sensor, lag), jumlah pasangan (sensor, lag))
+    """
+    x = np.diff(np.asarray(reference, dtype=float))
+    y = np.diff(np.atleast_2d(np.asarray(others, dtype=float)), axis=1)
+    n = len(x)
+    max_lag = max(0, min(max_lag, n - 1))
+    lags = np.arange(-max_lag, max_lag + 1)
+    correlation = np.full((y.shape[0], len(lags)), np.nan)
+    samples = np.zeros((y.shape[0], len(lags)), dtype=int)
+    for j, lag in enumerate(lags):
+        if abs(lag) >= n:
+            continue
+        if lag >= 0:
+            a, b = x[:n - lag], y[:, lag:]
+        else:
+            a, b = x[-lag:], y[:, :n + lag]
+        mask = ~np.isnan(a) & ~np.isnan(b)
+        count = mask.sum(axis=1)
+        a0 = np.where(mask, a, 0.0)
+        b0 = np.where(mask, b, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_a = a0.sum(axis=1) / count
+            mean_b = b0.sum(axis=1) / count
+            da = np.where(mask, a - mean_a[:, None], 0.0)
+            db = np.where(mask, b - mean_b[:, None], 0.0)
+            r = (da * db).sum(axis=1) / np.sqrt((da * da).sum(axis=1) * (db * db).sum(axis=1))
+        r[count < 3] = np.nan
+        correlation[:, j] = r
+        samples[:, j] = count
+    return lags, correlation, samples
@@ -1,12 +1,72 @@
 from rest_framework import serializers
-from .models import Sensor, Reading
+from .models import Sensor, SensorGroup, Reading, AlertEpisode, AlertSubscription
 
 class SensorSerializer(serializers.ModelSerializer):
+    forecast = serializers.SerializerMethodField()
+    
     class Meta:
         model = Sensor
         fields = '__all__'
+    
+    def get_forecast(self, obj):
+        """Prakiraan terakhir dari update_forecasts (None kalau belum ada)"""
+        forecast = getattr(obj, 'forecast', None)
+        if forecast is None:
+            return None
+        return {'issued_at': forecast.issued_at, **forecast.values}
 
 class ReadingSerializer(serializers.ModelSerializer):
+    """raw hanya disertakan dengan ?include_raw=1; key yang sering dipakai sudah jadi kolom sendiri"""
     class Meta:
         model = Reading
         fields = '__all__'
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not include_raw(self.context.get('request')):
+            self.fields.pop('raw', None)
+
+def include_raw(request):
+    return request is not None and request.GET.get('include_raw') in ('1', 'true')
+
+class AlertEpisodeSerializer(serializers.ModelSerializer):
+    duration_seconds = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = AlertEpisode
+        fields = '__all__'
+    
+    def get_duration_seconds(self, obj):
+        """Episode yang masih berlangsung dihitung sampai sekarang"""
+        return obj.duration().total_seconds()
+
+class SensorGroupSerializer(serializers.ModelSerializer):
+    """Agregat (count, sum) sudah dipelihara inkremental; di sini hanya diturunkan"""
+    worst_alert = serializers.ReadOnlyField()
+    avg_distance = serializers.ReadOnlyField()
+    avg_water_level = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = SensorGroup
+        fields = '__all__'
+    
+    def validate_parent(self, parent):
+        ancestor = parent
+        while self.instance is not None and ancestor is not None:
+            if ancestor.pk == self.instance.pk:
+                raise serializers.ValidationError('Grup tidak boleh menjadi leluhur dirinya sendiri')
+            ancestor = ancestor.parent
+        return parent
+
+class AlertSubscriptionSerializer(serializers.ModelSerializer):
+    """Langganan alert milik user yang sedang login"""
+    class Meta:
+        model = AlertSubscription
+        exclude = ['user']
+    
+    def validate(self, attrs):
+        sensor = attrs.get('sensor', getattr(self.instance, 'sensor', None))
+        group = attrs.get('group', getattr(self.instance, 'group', None))
+        if sensor is not None and group is not None:
+            raise serializers.ValidationError('Pilih sensor atau grup, tidak keduanya')
+        return attrs
@@ -0,0 +1,133 @@
+"""
+Signal untuk menjaga cache in-process tetap sinkron dengan database
+"""
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+
+from .models import (
+    AlertSubscription, Sensor, SensorApiKey, SensorGroup, SensorThreshold, SensorCalibration, UserProfile,
+)
+from .calibration import calibrations
+from .ingest import clear_sensor_cache
+from .detectors import rise_detector
+from .spatial import spatial_index
+from .devices import device_configs
+from .authentication import invalidate_keys
+from .groups import COUNTERS, STATE_FIELDS, Changes, sensor_state
+from .subscriptions import subscription_index
+
+
+@receiver(post_save, sender=Sensor)
+@receiver(post_delete, sender=Sensor)
+def invalidate_sensor_cache(sender, instance, **kwargs):
+    # Sensor jarang berubah; kosongkan semua supaya rename identifier ikut aman
+    clear_sensor_cache()
+    spatial_index.invalidate()
+    device_configs.clear()
+    invalidate_keys()
+
+
+@receiver(post_save, sender=SensorApiKey)
+@receiver(post_delete, sender=SensorApiKey)
+def invalidate_api_keys(sender, instance, **kwargs):
+    # Rotasi lewat queryset.update() tidak memicu signal; issue_key memanggil invalidate_keys sendiri
+    invalidate_keys()
+
+
+@receiver(post_save, sender=SensorThreshold)
+@receiver(post_delete, sender=SensorThreshold)
+def invalidate_rise_levels(sender, instance, **kwargs):
+    rise_detector.reset_levels(instance.sensor_id)
+
+
+@receiver(post_save, sender=SensorCalibration)
+@receiver(post_delete, sender=SensorCalibration)
+def invalidate_calibrations(sender, instance, **kwargs):
+    # Reading lama tidak ikut berubah; jalankan recalibrate_readings
+    calibrations.changed(instance.sensor_id)
+
+
+# ===== AGREGAT GRUP (lihat groups.py) =====
+
+@receiver(pre_save, sender=Sensor)
+def remember_sensor_state(sender, instance, **kwargs):
+    instance._group_state = None
+    if instance.pk:
+        instance._group_state = Sensor.objects.filter(pk=instance.pk).values_list(*STATE_FIELDS).first()
+
+
+@receiver(post_save, sender=Sensor)
+def update_group_stats(sender, instance, **kwargs):
+    old = getattr(instance, '_group_state', None)
+    new = sensor_state(instance)
+    if old is not None:
+        # alert_level/current_* tidak ikut ditulis save() (Sensor.CURRENT_STATE_FIELDS)
+        new = new[:2] + old[2:]
+    changes = Changes()
+    changes.sensor(old, new)
+    changes.apply()
+
+
+@receiver(post_delete, sender=Sensor)
+def remove_from_group_stats(sender, instance, **kwargs):
+    changes = Changes()
+    changes.sensor(sensor_state(instance), None)
+    changes.apply()
+
+
+@receiver(pre_save, sender=SensorGroup)
+def remember_group_parent(sender, instance, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = SensorGroup.objects.filter(pk=instance.pk).values('parent_id', *COUNTERS).first()
+
+
+@receiver(post_save, sender=SensorGroup)
+def move_group_stats(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous is None or previous['parent_id'] == instance.parent_id:
+        return
+    # Seluruh subtree pindah: total grup ini pindah dari leluhur lama ke yang baru
+    totals = {name: previous[name] for name in COUNTERS}
+    changes = Changes()
+    changes.add(previous['parent_id'], totals, -1)
+    changes.add(instance.parent_id, totals)
+    changes.apply()
+
+
+@receiver(pre_delete, sender=SensorGroup)
+def detach_group_stats(sender, instance, **kwargs):
+    # Anggota dan sub-grup di-SET_NULL tanpa signal; keluarkan totalnya dari leluhur
+    totals = dict(SensorGroup.objects.filter(pk=instance.pk).values(*COUNTERS).first() or {})
+    changes = Changes()
+    changes.add(instance.parent_id, totals, -1)
+    changes.apply()
+
+
+# ===== PENERIMA ALERT (lihat subscriptions.py) =====
+
+@receiver(post_save, sender=AlertSubscription)
+@receiver(post_delete, sender=AlertSubscription)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Sensor)
+@receiver(post_delete, sender=Sensor)
+@receiver(post_save, sender=SensorGroup)
+@receiver(post_delete, sender=SensorGroup)
+def invalidate_subscriptions(sender, instance, **kwargs):
+    # Email, telegram_id, keanggotaan grup dan hirarki ikut menentukan penerima
+    subscription_index.invalidate()
+
+
+# Field User yang ikut menentukan penerima alert
+USER_RECIPIENT_FIELDS = frozenset({'email', 'is_active'})
+
+
+@receiver(post_save, sender=User)
+def invalidate_subscriptions_for_user(sender, instance, update_fields=None, **kwargs):
+    # Login hanya menyimpan last_login (update_fields); jangan bangun ulang indeks setiap login
+    if update_fields is not None and not USER_RECIPIENT_FIELDS & set(update_fields):
+        return
+    subscription_index.invalidate()
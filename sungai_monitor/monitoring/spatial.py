@@ -0,0 +1,212 @@
+"""
+Indeks spasial in-memory untuk peta sensor.
+
+Posisi sensor aktif (latitude/longitude) disimpan sebagai array NumPy dan
+dikelompokkan ke grid berukuran SPATIAL_CELL_DEGREES:
+
+    - bbox    : hanya sel yang bersinggungan dengan bbox yang diperiksa
+    - nearest : pencarian ring sel di sekitar titik, melebar sampai jarak
+                tetangga ke-N sudah pasti tercakup (haversine, km)
+    - cluster : pada zoom rendah sensor dalam bbox digabung per sel grid
+                sesuai zoom; setiap cluster membawa alert_level terburuk
+
+Indeks dibangun ulang (satu query) saat Sensor berubah lewat signal, atau
+setelah SPATIAL_INDEX_TTL detik supaya proses lain ikut menyusul. Level
+alert saat ini diambil dari AlertEpisode yang masih terbuka, bukan dari
+reading.
+"""
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .detectors import LEVEL_ORDER
+from .models import AlertEpisode, Sensor
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Zoom tile web map yang didukung cluster()
+MAX_ZOOM = 22
+
+LEVELS = sorted(LEVEL_ORDER, key=LEVEL_ORDER.get)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def haversine(lat, lon, lats, lons):
+    """Jarak (km) dari satu titik ke array titik"""
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def current_levels():
+    """sensor_id -> alert_level untuk sensor yang sedang tidak safe"""
+    return dict(AlertEpisode.objects.filter(ended_at__isnull=True).values_list('sensor_id', 'level'))
+
+
+class SpatialIndex:
+
+    def __init__(self, cell_degrees=None):
+        self._cell = cell_degrees
+        self._lock = threading.Lock()
+        self._built_at = None
+
+    # ===== BUILD =====
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _ensure(self):
+        ttl = _setting('SPATIAL_INDEX_TTL', 300)
+        if self._built_at is not None and time.monotonic() - self._built_at < ttl:
+            return
+        with self._lock:
+            if self._built_at is not None and time.monotonic() - self._built_at < ttl:
+                return
+            self._build()
+
+    def _build(self):
+        rows = list(
+            Sensor.objects.filter(is_active=True, latitude__isnull=False, longitude__isnull=False)
+            .order_by('pk').values_list('pk', 'identifier', 'name', 'status', 'latitude', 'longitude')
+        )
+        cell = self._cell or _setting('SPATIAL_CELL_DEGREES', 0.1)
+        lats = np.array([float(row[4]) for row in rows], dtype=float)
+        lons = np.array([float(row[5]) for row in rows], dtype=float)
+
+        # Urutkan per sel supaya setiap sel adalah potongan kontigu dari array
+        cx = np.floor(lons / cell).astype(np.int64)
+        cy = np.floor(lats / cell).astype(np.int64)
+        order = np.lexsort((cx, cy))
+        cells = {}
+        for position, key in enumerate(zip(cy[order].tolist(), cx[order].tolist())):
+            start, _ = cells.get(key, (position, position))
+            cells[key] = (start, position + 1)
+
+        # Ganti semua atribut sekaligus supaya query yang berjalan tidak melihat indeks setengah jadi
+        self.__dict__.update(
+            cell=cell, lats=lats, lons=lons, order=order, cells=cells,
+            ids=np.array([row[0] for row in rows], dtype=np.int64),
+            info=[{'id': row[0], 'identifier': row[1], 'name': row[2], 'status': row[3]} for row in rows],
+            _built_at=time.monotonic(),
+        )
+
+    def __len__(self):
+        self._ensure()
+        return len(self.ids)
+
+    # ===== QUERY =====
+
+    def _cell_indices(self, keys):
+        slices = [self.cells[key] for key in keys if key in self.cells]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.order[start:end] for start, end in slices])
+
+    def bbox(self, south, west, north, east):
+        """Indeks sensor di dalam bbox (tidak mendukung bbox yang melewati antimeridian)"""
+        self._ensure()
+        cell = self.cell
+        y0, y1 = math.floor(south / cell), math.floor(north / cell)
+        x0, x1 = math.floor(west / cell), math.floor(east / cell)
+        if (y1 - y0 + 1) * (x1 - x0 + 1) > len(self.cells):
+            # bbox lebih besar dari grid terisi: iterasi sel yang ada saja
+            keys = [(y, x) for y, x in self.cells if y0 <= y <= y1 and x0 <= x <= x1]
+        else:
+            keys = [(y, x) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+        candidates = self._cell_indices(keys)
+        lats, lons = self.lats[candidates], self.lons[candidates]
+        inside = (lats >= south) & (lats <= north) & (lons >= west) & (lons <= east)
+        return candidates[inside]
+
+    def nearest(self, lat, lon, n=5):
+        """
+        N sensor terdekat dari (lat, lon)
+
+        Returns:
+            tuple (indeks, jarak km), terurut dari yang terdekat
+        """
+        self._ensure()
+        n = min(n, len(self.ids))
+        if n <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        cell = self.cell
+        cy, cx = math.floor(lat / cell), math.floor(lon / cell)
+        ring = 0
+        # Ring yang lebih luas dari jumlah sel terisi tidak lebih murah dari memeriksa semua titik
+        while (2 * ring + 1) ** 2 <= len(self.cells):
+            keys = [(y, x) for y in range(cy - ring, cy + ring + 1) for x in range(cx - ring, cx + ring + 1)]
+            candidates = self._cell_indices(keys)
+            if len(candidates) >= n:
+                distances = haversine(lat, lon, self.lats[candidates], self.lons[candidates])
+                kth = np.partition(distances, n - 1)[n - 1]
+                # Titik di luar ring berjarak minimal `ring` sel dari titik pusat
+                widest_lat = min(89.9, abs(lat) + (ring + 1) * cell)
+                covered = ring * cell * KM_PER_DEGREE * math.cos(math.radians(widest_lat))
+                if kth <= covered:
+                    best = np.argsort(distances)[:n]
+                    return candidates[best], distances[best]
+            ring += 1
+
+        distances = haversine(lat, lon, self.lats, self.lons)
+        best = np.argsort(distances)[:n]
+        return best, distances[best]
+
+    def markers(self, indices, levels):
+        """Marker per sensor untuk response API"""
+        return [
+            {**self.info[i], 'lat': float(self.lats[i]), 'lon': float(self.lons[i]),
+             'alert_level': levels.get(self.info[i]['id'], 'safe')}
+            for i in indices
+        ]
+
+    def cluster(self, indices, zoom, levels):
+        """
+        Gabungkan sensor per sel grid sesuai zoom (sekitar SPATIAL_CLUSTER_PIXELS
+        piksel pada tile 256 px)
+
+        Returns:
+            tuple (list cluster, list marker sensor yang sendirian)
+        """
+        if not 0 <= zoom <= MAX_ZOOM:
+            raise ValueError(f"zoom harus 0-{MAX_ZOOM}")
+        if len(indices) == 0:
+            return [], []
+        size = 360.0 / (2 ** zoom) * _setting('SPATIAL_CLUSTER_PIXELS', 60) / 256
+        lats, lons = self.lats[indices], self.lons[indices]
+        keys = np.floor(lats / size).astype(np.int64) * (2 ** 32) + np.floor(lons / size).astype(np.int64)
+        _, group, counts = np.unique(keys, return_inverse=True, return_counts=True)
+
+        order = np.array([LEVEL_ORDER.get(levels.get(int(pk), 'safe'), 0) for pk in self.ids[indices]], dtype=int)
+        worst = np.zeros(len(counts), dtype=int)
+        np.maximum.at(worst, group, order)
+        lat_mean = np.bincount(group, weights=lats) / counts
+        lon_mean = np.bincount(group, weights=lons) / counts
+        south = np.full(len(counts), np.inf)
+        north = np.full(len(counts), -np.inf)
+        west = np.full(len(counts), np.inf)
+        east = np.full(len(counts), -np.inf)
+        np.minimum.at(south, group, lats)
+        np.maximum.at(north, group, lats)
+        np.minimum.at(west, group, lons)
+        np.maximum.at(east, group, lons)
+
+        clusters = [
+            {
+                'lat': float(lat_mean[g]), 'lon': float(lon_mean[g]), 'count': int(counts[g]),
+                'alert_level': LEVELS[worst[g]],
+                'bbox': [float(west[g]), float(south[g]), float(east[g]), float(north[g])],
+            }
+            for g in np.flatnonzero(counts > 1)
+        ]
+        single = indices[counts[group] == 1]
+        return clusters, self.markers(single, levels)
+
+
+spatial_index = SpatialIndex()
@@ -0,0 +1,161 @@
+"""
+Indeks penerima alert in-memory.
+
+Penerima alert sebuah sensor ditentukan oleh AlertSubscription (per sensor,
+per grup beserta sub-grupnya, atau semua sensor) dengan level minimum dan
+channel masing-masing. User tanpa langganan aktif memakai perilaku lama:
+flag receive_email_alerts/receive_telegram_alerts di UserProfile berlaku
+untuk semua sensor mulai level warning.
+
+Indeks dibangun dengan beberapa query lalu disimpan sebagai:
+
+    global[level][channel]            -> tuple penerima untuk semua sensor
+    by_sensor[sensor_id][level][channel] -> tuple penerima khusus sensor itu
+                                         (langganan sensor + grup leluhurnya)
+
+sehingga saat alert dikirim cukup dua lookup dictionary. Indeks dikosongkan
+lewat signal saat User, UserProfile, AlertSubscription, Sensor atau
+SensorGroup berubah, dan dibangun ulang setelah SUBSCRIPTION_INDEX_TTL detik
+supaya proses lain ikut menyusul.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .detectors import LEVEL_ORDER
+from .groups import GroupTree
+from .models import AlertSubscription, Sensor, UserProfile
+
+CHANNELS = ('email', 'telegram')
+ALERT_LEVELS = [level for level in sorted(LEVEL_ORDER, key=LEVEL_ORDER.get) if level != 'safe']
+
+
+def _levels_from(min_level):
+    """Level alert yang sama atau lebih tinggi dari min_level"""
+    minimum = LEVEL_ORDER.get(min_level, LEVEL_ORDER['warning'])
+    return [level for level in ALERT_LEVELS if LEVEL_ORDER[level] >= minimum]
+
+
+class _Builder:
+    """Kumpulkan penerima per level/channel tanpa duplikat, lalu bekukan jadi tuple"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, min_level, channel, recipient):
+        for level in _levels_from(min_level):
+            self.entries.setdefault(level, {}).setdefault(channel, {})[recipient] = None
+
+    def freeze(self):
+        return {
+            level: {channel: tuple(recipients) for channel, recipients in channels.items()}
+            for level, channels in self.entries.items()
+        }
+
+
+class SubscriptionIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._global = {}
+        self._by_sensor = {}
+
+    # ===== BUILD =====
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _ensure(self):
+        ttl = getattr(settings, 'SUBSCRIPTION_INDEX_TTL', 300)
+        if self._built_at is not None and time.monotonic() - self._built_at < ttl:
+            return
+        with self._lock:
+            if self._built_at is not None and time.monotonic() - self._built_at < ttl:
+                return
+            self._build()
+
+    def _build(self):
+        everyone = _Builder()
+        specific = {}       # ('sensor' | 'group', id) -> _Builder
+        subscribed = set()
+
+        rows = AlertSubscription.objects.filter(is_active=True, user__is_active=True).values_list(
+            'user_id', 'user__email', 'user__profile__telegram_id',
+            'sensor_id', 'group_id', 'min_level', 'email', 'telegram',
+        )
+        for user_id, email, telegram_id, sensor_id, group_id, min_level, by_email, by_telegram in rows:
+            subscribed.add(user_id)
+            if sensor_id is not None:
+                builder = specific.setdefault(('sensor', sensor_id), _Builder())
+            elif group_id is not None:
+                builder = specific.setdefault(('group', group_id), _Builder())
+            else:
+                builder = everyone
+            if by_email and email:
+                builder.add(min_level, 'email', email)
+            if by_telegram and telegram_id:
+                builder.add(min_level, 'telegram', telegram_id)
+
+        # Perilaku lama untuk user yang belum punya langganan
+        profiles = UserProfile.objects.filter(user__is_active=True).values_list(
+            'user_id', 'user__email', 'telegram_id', 'receive_email_alerts', 'receive_telegram_alerts',
+        )
+        for user_id, email, telegram_id, by_email, by_telegram in profiles:
+            if user_id in subscribed:
+                continue
+            if by_email and email:
+                everyone.add('warning', 'email', email)
+            if by_telegram and telegram_id:
+                everyone.add('warning', 'telegram', telegram_id)
+
+        # Langganan grup berlaku untuk semua sensor di subtree-nya
+        by_sensor = {}
+        groups = {key[1]: builder for key, builder in specific.items() if key[0] == 'group'}
+        if groups:
+            tree = GroupTree()
+            for sensor_id, group_id in Sensor.objects.filter(group__isnull=False).values_list('pk', 'group_id'):
+                for ancestor in tree.ancestors(group_id):
+                    if ancestor in groups:
+                        by_sensor.setdefault(sensor_id, []).append(groups[ancestor])
+        for (kind, target), builder in specific.items():
+            if kind == 'sensor':
+                by_sensor.setdefault(target, []).append(builder)
+
+        merged = {}
+        for sensor_id, builders in by_sensor.items():
+            combined = _Builder()
+            for builder in builders:
+                for level, channels in builder.entries.items():
+                    for channel, recipients in channels.items():
+                        combined.entries.setdefault(level, {}).setdefault(channel, {}).update(recipients)
+            merged[sensor_id] = combined.freeze()
+
+        # Ganti semua atribut sekaligus supaya pembaca tidak melihat indeks setengah jadi
+        self.__dict__.update(_global=everyone.freeze(), _by_sensor=merged, _built_at=time.monotonic())
+
+    # ===== QUERY =====
+
+    def recipients(self, sensor_id, level):
+        """
+        Penerima alert sensor pada level ini
+
+        Returns:
+            dict channel -> list alamat (email / telegram_id), tanpa duplikat
+        """
+        self._ensure()
+        common = self._global.get(level, {})
+        own = self._by_sensor.get(sensor_id, {}).get(level)
+        if not own:
+            return {channel: list(recipients) for channel, recipients in common.items()}
+        result = {}
+        for channel in CHANNELS:
+            recipients = common.get(channel, ()) + own.get(channel, ())
+            if recipients:
+                result[channel] = list(dict.fromkeys(recipients))
+        return result
+
+
+subscription_index = SubscriptionIndex()
@@ -1,3 +1,2044 @@
-from django.test import TestCase
+import logging
+import os
+import pstats
+import shutil
+import struct
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models.signals import pre_delete
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from sungai_monitor.utils import DIGEST_MAX_LINES, format_alert_digest, send_alert_digests
+
+from . import calibration, episodes, forecasting, groups, metrics, profiling, resample, volume
+from .authentication import GENERATION_KEY, hash_key, issue_key, key_cache, key_prefix, verify_key
+from .calibration import Transform, calibrations
+from .detectors import RiseState, level_for_rate, rise_detector, rise_levels, rise_rates
+from .devices import device_configs, report_interval
+from .episodes import AlertTrigger
+from .ingest import (
+    BINARY_HEADER, BINARY_RECORD, BINARY_VERSION, SEQUENCE_WINDOW, IngestError, RecentKeys, build_reading,
+    clean_timestamp, clear_sensor_cache, ingest_batch, pack_readings, promote_raw, promoted_fields, recent_readings,
+    save_readings, unpack_readings,
+)
+from .listener import BatchWriter, MQTTSubscriber, UDPIngestProtocol, decode_payload
+from .log_handlers import SystemLogHandler
+from .management.commands.generate_load_data import FLOOD_PEAK, FLOOD_RECEDE, FLOOD_RISE, flood_factor
+from .management.commands.import_readings import parse_record, parse_timestamp
+from .middleware import PerformanceStats, percentile, sql_shape, stats as middleware_stats
+from .models import (
+    AlertEpisode, AlertNotification, AlertSubscription, PendingAlert, Reading, Sensor, SensorApiKey, SensorCalibration,
+    SensorForecast, SensorGroup, SensorThreshold, SystemLog, UserProfile, VolumeCheckpoint, VolumeIndex,
+)
+from .quality import quality_filter
+from .ratelimit import AdmissionQueue, DeviceRateLimiter, LocalBackend, RateLimited, device_limiter, gcra, ingest_queue
+from .spatial import current_levels, haversine, spatial_index
+from .subscriptions import subscription_index
+
+
+def reset_caches():
+    """Cache in-process tidak ikut di-rollback bersama transaksi test"""
+    clear_sensor_cache()
+    recent_readings.clear()
+    rise_detector.reset()
+    quality_filter.reset()
+    calibrations.invalidate()
+    device_configs.clear()
+    key_cache.clear()
+    device_limiter.reset()
+    spatial_index.invalidate()
+    subscription_index.invalidate()
+
+
+def app_log_handlers():
+    """SystemLogHandler dari konfigurasi LOGGING aplikasi"""
+    handlers = {h for name in ('monitoring', 'sungai_monitor') for h in logging.getLogger(name).handlers}
+    return [handler for handler in handlers if isinstance(handler, SystemLogHandler)]
+
+
+def tearDownModule():
+    # Tulis log yang masih antre ke database test; kalau menunggu atexit,
+    # database test sudah dihapus dan log masuk ke db.sqlite3
+    for handler in app_log_handlers():
+        handler.close()
+
+
+class MonitoringTestCase(TestCase):
+
+    def setUp(self):
+        reset_caches()
+        self.addCleanup(reset_caches)
+
+    @staticmethod
+    def minutes_ago(minutes):
+        return timezone.now().replace(microsecond=0) - timedelta(minutes=minutes)
+
+
+# ========== user-026: protokol biner & validasi bersama ==========
+
+class BinaryProtocolTests(MonitoringTestCase):
+
+    def test_pack_unpack_roundtrip(self):
+        payload = pack_readings('SRF001', [(1760000000, 1.5, 120.0, None), (1760000060, None, 118.5, 87.0)])
+        self.assertEqual(len(payload), BINARY_HEADER.size + 2 * BINARY_RECORD.size)
+
+        identifier, records = unpack_readings(payload)
+        records = list(records)
+        self.assertEqual(identifier, 'SRF001')
+        self.assertEqual(records[0][:3], (1760000000, 1.5, 120.0))
+        self.assertNotEqual(records[0][3], records[0][3])  # NaN untuk nilai kosong
+        self.assertEqual(records[1][0], 1760000060)
+
+    def test_unpack_rejects_malformed_packets(self):
+        valid = pack_readings('SRF001', [(1760000000, 1.0, 100.0, 90.0)])
+        cases = {
+            'terlalu pendek': valid[:3],
+            'versi protokol': bytes([BINARY_VERSION + 1]) + valid[1:],
+            'panjang paket': valid[:-1],
+            'terlalu banyak': BINARY_HEADER.pack(BINARY_VERSION, b'SRF001', 5000),
+            'bukan ASCII': BINARY_HEADER.pack(BINARY_VERSION, b'\xff' * 8, 0),
+        }
+        for message, payload in cases.items():
+            with self.subTest(message), self.assertRaisesMessage(IngestError, message):
+                unpack_readings(payload)
+
+    def test_binary_endpoint_saves_batch(self):
+        base = int(self.minutes_ago(10).timestamp())
+        payload = pack_readings('BIN001', [(base + 60 * i, None, 150.0 - i, 80.0) for i in range(3)])
+
+        response = self.client.post('/api/ingest/binary/', payload, content_type='application/octet-stream')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['accepted'], 3)
+        self.assertIn('report_interval', response.json()['config'])
+        self.assertEqual(Reading.objects.filter(sensor__identifier='BIN001').count(), 3)
+
+    def test_binary_endpoint_rejects_malformed_packet(self):
+        with self.assertLogs('monitoring.views', 'WARNING'):
+            response = self.client.post('/api/ingest/binary/', b'\x01abc', content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Reading.objects.exists())
+
+
+class CleanTimestampTests(TestCase):
+
+    def test_parses_iso_strings_and_defaults_to_now(self):
+        now = datetime(2026, 10, 1, 12, 0, tzinfo=dt_timezone.utc)
+        self.assertEqual(clean_timestamp(None, now), now)
+        self.assertEqual(clean_timestamp('', now), now)
+        self.assertEqual(clean_timestamp('2026-10-01T11:00:00+00:00', now), now - timedelta(hours=1))
+        # Tanpa zona waktu dianggap UTC
+        self.assertEqual(clean_timestamp('2026-10-01T11:00:00', now), now - timedelta(hours=1))
+
+    def test_rejects_invalid_values(self):
+        now = datetime(2026, 10, 1, 12, 0, tzinfo=dt_timezone.utc)
+        for value in (1760000000, '2026-13-45T00:00:00', 'garbage', ['2026-10-01'], '2026-10-02T00:00:00Z'):
+            with self.subTest(value=value), self.assertRaises(IngestError):
+                clean_timestamp(value, now)
+
+
+class JsonIngestValidationTests(MonitoringTestCase):
+
+    def post(self, data):
+        return self.client.post('/api/ingest/', data, content_type='application/json')
+
+    def test_valid_reading_is_saved(self):
+        timestamp = self.minutes_ago(5)
+        response = self.post({'sensor_id': 'JSON01', 'timestamp': timestamp.isoformat(), 'distance': 140})
+
+        self.assertEqual(response.status_code, 201)
+        reading = Reading.objects.get(sensor__identifier='JSON01')
+        self.assertEqual(reading.timestamp, timestamp)
+        self.assertEqual(reading.distance, 140)
+
+    def test_invalid_payloads_are_rejected_with_400(self):
+        cases = [
+            {'sensor_id': 'JSON01', 'timestamp': 1760000000},
+            {'sensor_id': 'JSON01', 'timestamp': '2026-13-45T00:00:00'},
+            {'sensor_id': 'JSON01', 'timestamp': 'garbage'},
+            {'sensor_id': ['JSON01'], 'distance': 100},
+            {'sensor_id': 'JSON01', 'distance': 'tinggi'},
+            {'sensor_id': 'JSON01', 'battery': 150},
+            {'distance': 100},
+            [{'sensor_id': 'JSON01', 'distance': 100}],
+        ]
+        for data in cases:
+            with self.subTest(data=data), self.assertLogs('monitoring.views', 'WARNING'):
+                response = self.post(data)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        self.assertFalse(Reading.objects.exists())
+
+
+# ========== user-027: listener UDP/MQTT ==========
+
+class ListenerTests(MonitoringTestCase):
+
+    def test_decode_binary_and_json_payloads(self):
+        rows, api_key = decode_payload(pack_readings('UDP001', [(1760000000, None, 120.0, 90.0)]))
+        self.assertIsNone(api_key)
+        self.assertEqual(rows[0][0], 'UDP001')
+        self.assertEqual(rows[0][1], datetime.fromtimestamp(1760000000, tz=dt_timezone.utc))
+
+        rows, api_key = decode_payload(
+            b'[{"sensor_id": "UDP001", "distance": 120, "seq": 4, "api_key": "k"}, {"sensor_id": "UDP002"}]'
+        )
+        self.assertEqual(api_key, 'k')
+        self.assertEqual([row[0] for row in rows], ['UDP001', 'UDP002'])
+        self.assertEqual(rows[0][3], 120)
+        self.assertEqual(rows[0][6], 4)
+        # Tanpa timestamp: waktu terima yang sama untuk seluruh paket
+        self.assertEqual(rows[0][1], rows[1][1])
+
+    def test_decode_rejects_invalid_payloads(self):
+        for payload in (b'', b'{bukan json', b'"teks"', b'[1, 2]', b'{"sensor_id": ["UDP001"]}',
+                        b'{"api_key": ["k"]}', b'[{"api_key": "a"}, {"api_key": "b"}]'):
+            with self.subTest(payload=payload), self.assertRaises(IngestError):
+                decode_payload(payload)
+
+    def test_invalid_timestamps_are_rejected_per_row(self):
+        rows, _ = decode_payload(
+            b'[{"sensor_id": "UDP001", "timestamp": 1760000000, "distance": 100},'
+            b' {"sensor_id": "UDP001", "timestamp": "2026-13-45T00:00:00", "distance": 100},'
+            b' {"sensor_id": "UDP001", "distance": 100}]'
+        )
+        with self.assertLogs('monitoring.listener', 'WARNING'):
+            saved, rejected, unauthorized = BatchWriter._write([(None, row) for row in rows])
+        self.assertEqual((saved, rejected, unauthorized), (1, 2, 0))
+        self.assertEqual(Reading.objects.filter(sensor__identifier='UDP001').count(), 1)
+
+    def test_datagram_counts_rejected_packets(self):
+        writer = BatchWriter()
+        self.addCleanup(writer.executor.shutdown)
+        protocol = UDPIngestProtocol(writer)
+
+        protocol.datagram_received(b'\x07garbage', ('127.0.0.1', 5683))
+        protocol.datagram_received(b'{"sensor_id": "UDP001", "distance": 100}', ('127.0.0.1', 5683))
+
+        self.assertEqual(writer.stats['rejected'], 1)
+        self.assertEqual(writer.stats['received'], 1)
+        self.assertEqual(len(writer.pending), 1)
+
+
+    def test_truncated_mqtt_publish_is_dropped(self):
+        writer = BatchWriter()
+        self.addCleanup(writer.executor.shutdown)
+        subscriber = MQTTSubscriber(writer, 'localhost')
+        payload = b'{"sensor_id": "MQT001", "distance": 100}'
+        topic = struct.pack('!H', 10) + b'sungai/MQT'
+
+        truncated = [
+            (0x30, b''),
+            (0x30, b'\x00'),
+            (0x30, struct.pack('!H', 50) + b'sungai'),
+            (0x32, topic + b'\x00'),  # QoS 1 tanpa packet identifier utuh
+        ]
+        with self.assertLogs('monitoring.listener', 'WARNING'):
+            for header, body in truncated:
+                subscriber._on_publish(header, body)
+        self.assertEqual(writer.stats['rejected'], 4)
+
+        subscriber._on_publish(0x30, topic + payload)
+        subscriber._on_publish(0x32, topic + b'\x00\x01' + payload)
+        self.assertEqual(len(writer.pending), 2)
+
+    @override_settings(INGEST_RATE_LIMIT=1.0, INGEST_RATE_BURST=1)
+    def test_rate_limit_applies_to_every_sensor_in_packet(self):
+        writer = BatchWriter()
+        self.addCleanup(writer.executor.shutdown)
+        protocol = UDPIngestProtocol(writer)
+
+        protocol.datagram_received(b'{"sensor_id": "UDP001", "distance": 100}', ('127.0.0.1', 5683))
+        # Sensor kedua dst. tidak menumpang token sensor pertama
+        protocol.datagram_received(
+            b'[{"sensor_id": "UDP002", "distance": 100}, {"sensor_id": "UDP001", "distance": 101},'
+            b' {"sensor_id": "UDP001", "distance": 102}]', ('127.0.0.1', 5683)
+        )
+        self.assertEqual(writer.stats['limited'], 2)
+        self.assertEqual([row[0] for _, row in writer.pending], ['UDP001', 'UDP002'])
+
+# ========== user-028: import histori ==========
+
+class ImportReadingsTests(MonitoringTestCase):
+
+    def write_file(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def test_parse_timestamp_accepts_iso_and_epoch(self):
+        expected = datetime(2025, 10, 9, 8, 53, 20, tzinfo=dt_timezone.utc)
+        self.assertEqual(parse_timestamp('1760000000'), expected)
+        self.assertEqual(parse_timestamp(1760000000), expected)
+        self.assertEqual(parse_timestamp('2025-10-09T08:53:20'), expected)
+        with self.assertRaises(ValueError):
+            parse_timestamp('')
+
+    def test_parse_record_maps_aliases_and_keeps_unknown_keys_in_raw(self):
+        row = parse_record({'time': '1760000000', 'flow': '1.5', 'seq': '7', 'ph': '7.1', 'note': ''}, 'DEF001')
+        self.assertEqual(row[0], 'DEF001')
+        self.assertEqual(row[2], '1.5')
+        self.assertEqual(row[5], {'ph': '7.1'})
+        self.assertEqual(row[6], '7')
+
+    def test_import_csv_skips_duplicates_and_rejects_bad_rows(self):
+        path = self.write_file('history.csv', '\n'.join([
+            'sensor_id,timestamp,distance,battery',
+            'IMP001,1760000000,150,90',
+            'IMP001,1760000060,149,90',
+            'IMP001,1760000060,149,90',
+            'IMP001,,148,90',
+            'IMP001,1760000120,148,250',
+        ]) + '\n')
+        out, err = StringIO(), StringIO()
+
+        call_command('import_readings', path, stdout=out, stderr=err)
+
+        self.assertIn('Imported 2 of 5 rows (1 duplicates, 2 rejected)', out.getvalue())
+        self.assertIn('Rejected', err.getvalue())
+        self.assertEqual(Reading.objects.filter(sensor__identifier='IMP001').count(), 2)
+
+        # Impor ulang file yang sama tidak menggandakan data
+        call_command('import_readings', path, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Reading.objects.filter(sensor__identifier='IMP001').count(), 2)
+
+    def test_import_ndjson_with_default_sensor(self):
+        path = self.write_file('history.ndjson', '{"time": 1760000000, "distance": 150, "ph": 7}\n')
+        call_command('import_readings', path, sensor='IMP002', stdout=StringIO(), stderr=StringIO())
+        reading = Reading.objects.get(sensor__identifier='IMP002')
+        self.assertEqual(reading.raw, {'ph': 7})
+
+    def test_csv_without_sensor_column_requires_sensor_option(self):
+        path = self.write_file('history.csv', 'timestamp,distance\n1760000000,150\n')
+        with self.assertRaisesMessage(CommandError, 'no sensor column'):
+            call_command('import_readings', path, stdout=StringIO(), stderr=StringIO())
+
+
+# ========== user-029: data sintetis ==========
+
+class GenerateLoadDataTests(MonitoringTestCase):
+
+    def test_flood_factor_shape(self):
+        self.assertEqual(flood_factor(-1), 0.0)
+        self.assertEqual(flood_factor(FLOOD_RISE / 2), 0.5)
+        self.assertEqual(flood_factor(FLOOD_RISE + 1), 1.0)
+        self.assertEqual(flood_factor(FLOOD_RISE + FLOOD_PEAK + FLOOD_RECEDE / 2), 0.5)
+        self.assertEqual(flood_factor(FLOOD_RISE + FLOOD_PEAK + FLOOD_RECEDE), 0.0)
+
+    def test_generates_readings_with_flood_alerts_and_rollups(self):
+        call_command('generate_load_data', sensors=2, days=1, cadence=10, floods=1, prefix='GEN',
+                     stdout=StringIO())
+
+        sensors = Sensor.objects.filter(identifier__startswith='GEN')
+        self.assertEqual(sensors.count(), 2)
+        self.assertEqual(Reading.objects.filter(sensor__in=sensors).count(), 2 * 144)
+        # Puncak banjir melewati threshold danger; episode dan agregat grup ikut dibangun
+        self.assertTrue(Reading.objects.filter(sensor__in=sensors, alert_level='danger').exists())
+        self.assertTrue(AlertEpisode.objects.filter(sensor__in=sensors, level='danger').exists())
+        self.assertEqual(SensorGroup.objects.get(name='DAS Sintetis').sensor_count, 2)
+        self.assertIsNotNone(Reading.objects.filter(sensor__in=sensors).first().temperature)
+
+    def test_same_seed_is_reproducible(self):
+        options = dict(sensors=1, days=1, cadence=30, floods=1, stdout=StringIO())
+        call_command('generate_load_data', prefix='SEEDA', **options)
+        call_command('generate_load_data', prefix='SEEDB', **options)
+        first = list(Reading.objects.filter(sensor__identifier='SEEDA0001').order_by('timestamp')
+                     .values_list('distance', flat=True))
+        second = list(Reading.objects.filter(sensor__identifier='SEEDB0001').order_by('timestamp')
+                      .values_list('distance', flat=True))
+        self.assertEqual(first, second)
+
+
+# ========== user-030: ingest idempoten ==========
+
+class DuplicateSuppressionTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = Sensor.objects.create(identifier='DUP001', name='Dup')
+
+    def build(self, timestamp, sequence=None, distance=150.0):
+        return build_reading(self.sensor, timestamp=timestamp, distance=distance, sequence=sequence)
+
+    def test_http_retry_returns_duplicate(self):
+        data = {'sensor_id': 'DUP001', 'timestamp': self.minutes_ago(5).isoformat(), 'distance': 150, 'seq': 1}
+        first = self.client.post('/api/ingest/', data, content_type='application/json')
+        retry = self.client.post('/api/ingest/', data, content_type='application/json')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 200)
+        self.assertTrue(retry.json()['duplicate'])
+        self.assertEqual(Reading.objects.filter(sensor=self.sensor).count(), 1)
+
+    def test_sequence_duplicate_only_inside_window(self):
+        start = self.minutes_ago(120)
+        self.assertEqual(len(save_readings([self.build(start, sequence=5)])), 1)
+        # Retry dengan timestamp berbeda (jam perangkat bergeser) tetap duplikat
+        self.assertEqual(save_readings([self.build(start + timedelta(seconds=30), sequence=5)]), [])
+        # Setelah reboot nomor urut bisa terpakai lagi
+        later = start + SEQUENCE_WINDOW + timedelta(minutes=1)
+        self.assertEqual(len(save_readings([self.build(later, sequence=5)])), 1)
+
+    def test_duplicates_inside_one_batch_are_skipped(self):
+        timestamp = self.minutes_ago(10)
+        saved = save_readings([self.build(timestamp), self.build(timestamp), self.build(timestamp + timedelta(minutes=1))])
+        self.assertEqual(len(saved), 2)
+
+    def test_database_constraint_catches_keys_evicted_from_cache(self):
+        timestamp = self.minutes_ago(10)
+        save_readings([self.build(timestamp)])
+        recent_readings.clear()
+
+        saved = save_readings([self.build(timestamp), self.build(timestamp + timedelta(minutes=1))])
+
+        self.assertEqual([r.timestamp for r in saved], [timestamp + timedelta(minutes=1)])
+        self.assertEqual(Reading.objects.filter(sensor=self.sensor).count(), 2)
+
+    def test_recent_keys_is_bounded(self):
+        keys = RecentKeys(maxsize=2)
+        readings = [self.build(self.minutes_ago(minutes)) for minutes in (3, 2, 1)]
+        keys.add(readings)
+        self.assertFalse(keys.is_duplicate(readings[0]))
+        self.assertTrue(keys.is_duplicate(readings[2]))
+
+    def test_negative_sequence_is_rejected(self):
+        with self.assertRaises(IngestError):
+            self.build(self.minutes_ago(1), sequence=-1)
+
+
+# ========== user-031: SystemLog batch ==========
+
+class SystemLogHandlerTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Handler aplikasi menulis dari thread latarnya sendiri; kalau bulk_create-nya gagal
+        # (tabel terkunci transaksi test) ia mencatat baris "dibuang" yang terbaca di test ini
+        for handler in app_log_handlers():
+            patcher = mock.patch.object(handler, 'flush')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_handler(self, **kwargs):
+        # Tanpa thread latar: flush dari thread lain memakai koneksi database sendiri di luar
+        # transaksi test (mis. saat close) dan barisnya bocor ke test berikutnya.
+        # flush dipanggil langsung dari test
+        handler = SystemLogHandler(flush_interval=3600, **kwargs)
+        handler._start = lambda: None
+        self.addCleanup(handler.close)
+        return handler
+
+    @staticmethod
+    def logs():
+        # Handler global aplikasi ikut menulis log test lain di thread latar; abaikan
+        return SystemLog.objects.filter(module__in=('monitoring.tests', 'monitoring.log_handlers'))
+
+    @staticmethod
+    def record(message, level=logging.INFO, **extra):
+        record = logging.LogRecord('monitoring.tests', level, __file__, 1, message, (), None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_flush_writes_batch_with_extras(self):
+        handler = self.make_handler()
+        handler.emit(self.record('halo %s' % 'dunia', ip_address='10.0.0.1', extra_data={'sensor_id': 'A'}))
+        handler.emit(self.record('gagal', logging.ERROR))
+        handler.flush()
+
+        logs = list(self.logs().order_by('id'))
+        self.assertEqual([(log.level, log.message) for log in logs], [('info', 'halo dunia'), ('error', 'gagal')])
+        self.assertEqual(logs[0].ip_address, '10.0.0.1')
+        self.assertEqual(logs[0].extra_data, {'sensor_id': 'A'})
+
+    def test_unserializable_extra_data_does_not_drop_batch(self):
+        handler = self.make_handler()
+        when = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        handler.emit(self.record('objek', extra_data={'when': when, 'sensor': object()}))
+        handler.emit(self.record('kunci tuple', extra_data={(1, 2): 'x'}))
+        handler.emit(self.record('biasa'))
+        handler.flush()
+
+        self.assertEqual(self.logs().count(), 3)
+        self.assertEqual(self.logs().get(message='objek').extra_data['when'], str(when))
+        self.assertIn('repr', self.logs().get(message='kunci tuple').extra_data)
+        self.assertEqual(handler.dropped, 0)
+
+    def test_full_queue_drops_and_reports_count(self):
+        handler = self.make_handler(max_queue=2, batch_size=100)
+        for i in range(5):
+            handler.emit(self.record(f'log {i}', logging.WARNING))
+        self.assertEqual(handler.dropped, 3)
+        handler.flush()
+
+        messages = list(self.logs().values_list('message', flat=True))
+        self.assertEqual(len(messages), 3)
+        self.assertIn('3 log record dibuang karena antrian penuh', messages)
+        self.assertEqual(handler.dropped, 0)
+
+    def test_info_records_are_sampled_above_high_watermark(self):
+        handler = self.make_handler(max_queue=10, high_watermark=0.2, info_sample_rate=0.0)
+        for i in range(5):
+            handler.emit(self.record(f'info {i}'))
+        handler.emit(self.record('penting', logging.WARNING))
+        self.assertEqual(len(handler.queue), 3)
+        self.assertEqual(handler.dropped, 3)
+
+
+# ========== user-032: instrumentasi performa ==========
+
+class PerformanceMiddlewareTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        middleware_stats.reset()
+        self.addCleanup(middleware_stats.reset)
+
+    def test_sql_shape_collapses_in_lists(self):
+        self.assertEqual(sql_shape('SELECT 1 WHERE id IN (%s, %s, %s)'), sql_shape('SELECT 1 WHERE id IN (%s, %s)'))
+
+    def test_percentile_and_summary(self):
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 50), 3)
+        stats = PerformanceStats(size=3)
+        for total in (0.1, 0.2, 0.3, 0.4):
+            stats.add('view', total, 2, 0.01, 100)
+        summary = stats.summary()['view']
+        self.assertEqual(summary['count'], 3)
+        self.assertEqual(summary['p50_ms'], 300.0)
+        self.assertEqual(summary['avg_queries'], 2)
+
+    @override_settings(PERF_SAMPLE_RATE=0.0)
+    def test_disabled_by_default(self):
+        response = self.client.get('/api/sensors/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(middleware_stats.summary(), {})
+
+    @override_settings(PERF_SAMPLE_RATE=1.0, PERF_N_PLUS_ONE_THRESHOLD=1)
+    def test_sampled_request_is_timed_and_repeated_queries_logged(self):
+        Sensor.objects.create(identifier='PERF01', name='Perf')
+        with self.assertLogs('monitoring.middleware', 'WARNING') as logs:
+            response = self.client.get('/api/sensors/')
+
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('serializer;dur=', response['Server-Timing'])
+        self.assertIn('Kemungkinan N+1', logs.output[0])
+        self.assertEqual(middleware_stats.summary()['sensor-list']['count'], 1)
+
+    def test_perf_endpoint_requires_admin(self):
+        self.assertEqual(self.client.get('/api/perf/').status_code, 403)
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'rahasia')
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get('/api/perf/').status_code, 200)
+        self.assertEqual(self.client.delete('/api/perf/').status_code, 204)
+
+
+# ========== user-033: endpoint /metrics ==========
+
+class MetricsTests(MonitoringTestCase):
+
+    def test_mmap_stores_are_summed_across_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        stores = [metrics.MmapStore(os.path.join(directory, f'metrics_{pid}.db')) for pid in (1, 2)]
+        key = ('sungai_test', '', ('a',))
+        stores[0].inc(key, 2)
+        stores[1].inc(key, 3)
+        # Cukup banyak key untuk memaksa file diperbesar
+        for i in range(3000):
+            stores[1].inc(('sungai_test', '', (f'k{i}',)), 1)
+        for store in stores:
+            store._map.close()
+            store._file.close()
+
+        totals = metrics.MmapStore.collect_dir(directory)
+        self.assertEqual(totals[key], 5)
+        self.assertEqual(totals[('sungai_test', '', ('k2999',))], 1)
+        # File yang dibuka ulang melanjutkan entri lama
+        reopened = metrics.MmapStore(os.path.join(directory, 'metrics_1.db'))
+        reopened.inc(key, 1)
+        self.assertEqual(metrics.MmapStore.collect_dir(directory)[key], 6)
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram('sungai_test_seconds', 'Test', ['kind'], buckets=(0.1, 1.0))
+        self.addCleanup(metrics.REGISTRY.remove, histogram)
+        key = ('sungai_test_seconds', 0, ('x',))
+        samples = {key: 2.0, ('sungai_test_seconds', 1, ('x',)): 1.0,
+                   ('sungai_test_seconds', 2, ('x',)): 1.0, ('sungai_test_seconds', 'sum', ('x',)): 7.5}
+        lines = histogram.render(samples)
+        self.assertIn('sungai_test_seconds_bucket{kind="x",le="0.1"} 2', lines)
+        self.assertIn('sungai_test_seconds_bucket{kind="x",le="1"} 3', lines)
+        self.assertIn('sungai_test_seconds_bucket{kind="x",le="+Inf"} 4', lines)
+        self.assertIn('sungai_test_seconds_count{kind="x"} 4', lines)
+        self.assertIn('sungai_test_seconds_sum{kind="x"} 7.5', lines)
+
+    def test_label_values_are_escaped(self):
+        counter = metrics.Counter('sungai_test_escape', 'Test', ['label'])
+        self.addCleanup(metrics.REGISTRY.remove, counter)
+        self.assertEqual(counter._format_labels(('a"b\\c\n',)), '{label="a\\"b\\\\c\\n"}')
+
+    def test_ingest_is_counted_on_metrics_endpoint(self):
+        def ingested():
+            return metrics.collect().get(('sungai_readings_ingested', '', ('combined',)), 0)
+
+        before = ingested()
+        response = self.client.post('/api/ingest/', {'sensor_id': 'MET001', 'distance': 120},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ingested(), before + 1)
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE sungai_ingest_latency_seconds histogram', body)
+        self.assertIn('sungai_readings_ingested_total{sensor_type="combined"}', body)
+
+
+# ========== user-034: profiler ==========
+
+class ProfilingTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(PROFILING_DIR=self.directory, PROFILING_INTERVAL=0.001)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    @staticmethod
+    def busy(seconds=0.05):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            sum(range(100))
+
+    def test_sampling_profile_writes_collapsed_stacks(self):
+        with profiling.profile('unit test') as profiler:
+            self.busy()
+
+        self.assertGreater(profiler.samples, 0)
+        [name] = os.listdir(self.directory)
+        self.assertTrue(name.startswith('unit_test-') and name.endswith('.collapsed'))
+        with open(os.path.join(self.directory, name)) as f:
+            lines = f.read().splitlines()
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertIn('busy (', stack)
+        self.assertGreater(int(count), 0)
+
+    def test_cprofile_mode_writes_pstats(self):
+        with profiling.profile('cprof', mode='cprofile'):
+            self.busy(0.01)
+        [name] = os.listdir(self.directory)
+        stats = pstats.Stats(os.path.join(self.directory, name))
+        self.assertTrue(any(func[2] == 'busy' for func in stats.stats))
+
+    def test_output_is_limited_in_size_and_file_count(self):
+        profiler = profiling.SamplingProfiler('limit')
+        profiler.stacks.update({f'a;b{i}': 100 - i for i in range(100)})
+        with override_settings(PROFILING_MAX_BYTES=20, PROFILING_MAX_FILES=2):
+            with open(profiler.write()) as f:
+                self.assertEqual(f.read(), 'a;b0 100\na;b1 99\n')
+            for _ in range(3):
+                profiler.write()
+                time.sleep(0.01)
+            self.assertLessEqual(len(os.listdir(self.directory)), 2)
+
+    def test_middleware_requires_staff_or_token(self):
+        response = self.client.get('/api/sensors/', HTTP_X_PROFILE='sample')
+        self.assertNotIn('X-Profile-File', response)
+
+        with override_settings(PROFILING_TOKEN='rahasia'):
+            response = self.client.get('/api/sensors/', HTTP_X_PROFILE='cprofile', HTTP_X_PROFILE_TOKEN='rahasia')
+        self.assertTrue(response['X-Profile-File'].endswith('.prof'))
+        self.assertIn(response['X-Profile-File'], os.listdir(self.directory))
+
+    def test_profiled_commands_are_selected_by_name(self):
+        with override_settings(PROFILING_COMMANDS=['import_readings'], PROFILING_SIGNAL=False):
+            with mock.patch.object(profiling.atexit, 'register') as register:
+                profiling.install(['manage.py', 'check'])
+                register.assert_not_called()
+                profiling.install(['manage.py', 'import_readings', 'data.csv'])
+        profiler = register.call_args[0][0].__self__
+        self.assertEqual(profiler.name, 'command-import_readings')
+        profiler.stop()
+
+
+# ========== user-035: detektor laju kenaikan ==========
+
+class RiseDetectorTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = Sensor.objects.create(identifier='RISE01', name='Rise')
+
+    def test_linear_rise_rate(self):
+        state = RiseState()
+        self.assertEqual(state.update(0, 200.0, 1800), (None, None))
+        for minute in range(1, 10):
+            rate, _ = state.update(minute * 60, 200.0 - minute, 1800)
+        # Distance turun 1 cm/menit = air naik 60 cm/jam
+        self.assertAlmostEqual(rate, 60.0)
+        # Reading yang lebih lama dari reading terakhir diabaikan
+        self.assertEqual(state.update(60, 150.0, 1800), (None, None))
+
+    def test_vectorized_rates_match_streaming(self):
+        rng = np.random.default_rng(1)
+        t = np.cumsum(rng.uniform(30, 600, 400))
+        x = 200 - np.cumsum(rng.normal(0.2, 2.0, 400))
+        t[50] = t[49]  # timestamp berulang diabaikan di kedua versi
+        tau = 900  # blok _BLOCK_TAUS terlewati beberapa kali
+
+        state = RiseState()
+        expected = []
+        for ti, xi in zip(t, x):
+            rate, z = state.update(ti, xi, tau)
+            expected.append((np.nan if rate is None else rate, np.nan if z is None else z))
+        rates, zscores = rise_rates(t, x, tau)
+
+        np.testing.assert_allclose(rates, [e[0] for e in expected], rtol=1e-6, atol=1e-6)
+        np.testing.assert_allclose(zscores, [e[1] for e in expected], rtol=1e-6, atol=1e-6)
+
+    def test_rise_levels_from_thresholds_or_settings(self):
+        self.assertEqual(rise_levels([]), [(40.0, 'danger'), (20.0, 'warning')])
+        threshold = SensorThreshold(sensor=self.sensor, threshold_type='rise', alert_level='warning', min_value=5)
+        self.assertEqual(rise_levels([threshold]), [(5, 'warning')])
+        self.assertEqual(level_for_rate(25.0, [(40.0, 'danger'), (20.0, 'warning')]), 'warning')
+        self.assertEqual(level_for_rate(5.0, [(40.0, 'danger'), (20.0, 'warning')]), 'safe')
+
+    def test_fast_rise_escalates_after_min_samples(self):
+        start = self.minutes_ago(30)
+        levels = []
+        for minute in range(5):
+            reading = build_reading(self.sensor, timestamp=start + timedelta(minutes=minute), distance=200.0 - minute)
+            save_readings([reading])
+            levels.append(reading.alert_level)
+
+        self.assertEqual(levels[:2], ['safe', 'safe'])
+        self.assertEqual(levels[-1], 'danger')
+        self.assertIn('Muka air naik 60.0 cm/jam', reading.notes)
+
+    def test_backfill_matches_streaming_escalation(self):
+        start = self.minutes_ago(60)
+        Reading.objects.bulk_create([
+            Reading(sensor=self.sensor, timestamp=start + timedelta(minutes=minute), distance=200.0 - minute / 2)
+            for minute in range(10)
+        ])
+        call_command('backfill_rise_alerts', stdout=StringIO())
+
+        levels = list(Reading.objects.filter(sensor=self.sensor).order_by('timestamp')
+                      .values_list('alert_level', flat=True))
+        # 30 cm/jam: warning mulai sampel ke-3
+        self.assertEqual(levels[:2], ['safe', 'safe'])
+        self.assertEqual(set(levels[2:]), {'warning'})
+        self.assertTrue(AlertEpisode.objects.filter(sensor=self.sensor, level='warning').exists())
+
+
+# ========== user-036: prakiraan ==========
+
+class ForecastingTests(MonitoringTestCase):
+
+    def test_forward_fill_and_trend(self):
+        series = np.array([[np.nan, 1.0, np.nan, 3.0], [5.0, np.nan, np.nan, np.nan]])
+        np.testing.assert_array_equal(forecasting.forward_fill(series)[1], [5.0, 5.0, 5.0, 5.0])
+        self.assertTrue(np.isnan(forecasting.forward_fill(series)[0, 0]))
+
+        line = np.array([[10.0, 12.0, 14.0, 16.0, 18.0]])
+        intercept, slope = forecasting._trend(line, 4, 5)
+        self.assertAlmostEqual(intercept[0], 18.0)
+        self.assertAlmostEqual(slope[0], 2.0)
+
+    def test_model_selection_per_sensor(self):
+        buckets = 40
+        falling = 200.0 - 3.0 * np.arange(buckets)
+        flat = np.full(buckets, 150.0)
+        sparse = np.full(buckets, np.nan)
+        sparse[-1] = 120.0
+        values, choice = forecasting.forecast_matrix(np.vstack([falling, flat, sparse]), 4, 12, 96)
+
+        self.assertAlmostEqual(values[0], falling[-1] - 12.0)
+        self.assertEqual(forecasting.MODELS[choice[0]], 'linear')
+        self.assertAlmostEqual(values[1], 150.0)
+        # Satu titik saja: hanya naive yang valid
+        self.assertEqual(forecasting.MODELS[choice[2]], 'naive')
+        self.assertEqual(values[2], 120.0)
+
+    def test_forecast_is_clamped_at_zero(self):
+        falling = np.array([40.0 - 10.0 * i for i in range(5)])
+        values, _ = forecasting.forecast_matrix(falling[None, :], 10, 4, 96)
+        self.assertEqual(values[0], 0.0)
+
+    def test_update_forecasts_stores_levels_for_stale_sensors(self):
+        now = datetime(2026, 10, 1, 12, 0, tzinfo=dt_timezone.utc)
+        sensor = Sensor.objects.create(identifier='FC001', name='Forecast')
+        SensorThreshold.objects.create(sensor=sensor, threshold_type='distance', alert_level='danger',
+                                       min_value=0, max_value=70, message='Bahaya')
+        Reading.objects.bulk_create([
+            Reading(sensor=sensor, timestamp=now - timedelta(minutes=5 * i), distance=100.0 + 2.0 * i)
+            for i in range(1, 60)
+        ])
+        Sensor.objects.filter(pk=sensor.pk).update(last_seen=now - timedelta(minutes=5))
+
+        with override_settings(FORECAST_HORIZONS={'1h': 60, '3h': 180}):
+            self.assertEqual(forecasting.update_forecasts(now=now), 1)
+            # Tidak ada data baru: tidak di-fit ulang
+            self.assertEqual(forecasting.update_forecasts(now=now + timedelta(minutes=15)), 0)
+
+        values = SensorForecast.objects.get(sensor=sensor).values
+        self.assertEqual(values['1h']['model'], 'linear')
+        self.assertAlmostEqual(values['1h']['distance'], 80.0, delta=1.0)
+        self.assertEqual(values['3h']['alert_level'], 'danger')
+
+
+# ========== user-037: filter kualitas ==========
+
+class QualityFilterTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = Sensor.objects.create(identifier='QUAL01', name='Quality')
+        self.start = self.minutes_ago(120)
+
+    def ingest(self, minute, distance):
+        reading = build_reading(self.sensor, timestamp=self.start + timedelta(minutes=minute), distance=distance)
+        save_readings([reading])
+        return reading
+
+    def test_range_spike_and_stuck(self):
+        for minute, distance in enumerate((150, 151, 149, 150, 152)):
+            self.assertEqual(self.ingest(minute, distance).quality, 'good')
+        self.assertEqual(self.ingest(5, 900).quality, 'range')
+        self.assertEqual(self.ingest(6, 60).quality, 'spike')
+        self.assertEqual(self.ingest(7, 151).quality, 'good')
+
+        qualities = [self.ingest(10 + i, 140.0).quality for i in range(12)]
+        self.assertEqual(qualities[-2:], ['good', 'stuck'])
+
+    def test_spike_does_not_raise_distance_alert(self):
+        threshold = SensorThreshold.objects.create(sensor=self.sensor, threshold_type='distance',
+                                                   alert_level='danger', min_value=0, max_value=70,
+                                                   message='Bahaya')
+        for minute in range(6):
+            self.ingest(minute, 150)
+        reading = build_reading(self.sensor, timestamp=self.start + timedelta(minutes=6), distance=50,
+                                thresholds=[threshold])
+        self.assertEqual(reading.quality, 'spike')
+        self.assertEqual(reading.alert_level, 'safe')
+        self.assertEqual(reading.notes, 'Distance ditandai spike')
+
+    @override_settings(INGEST_RATE_LIMIT=0)
+    def test_retries_do_not_update_quality_state(self):
+        data = {'sensor_id': 'QUAL01', 'timestamp': self.start.isoformat(), 'distance': 150}
+        responses = [self.client.post('/api/ingest/', data, content_type='application/json') for _ in range(12)]
+        self.assertEqual(responses[0].status_code, 201)
+        self.assertTrue(all(r.json()['duplicate'] for r in responses[1:]))
+
+        reading = self.ingest(1, 150)
+        self.assertEqual(reading.quality, 'good')
+        self.assertEqual(len(quality_filter._states[self.sensor.pk].values), 2)
+        self.assertEqual(rise_detector.state(self.sensor.pk).count, 2)
+
+    def test_duplicates_inside_batch_do_not_update_state(self):
+        timestamp = self.start.isoformat()
+        rows = [('QUAL01', timestamp, None, 150.0, None, None, None)] * 12 + [
+            ('QUAL01', (self.start + timedelta(minutes=1)).isoformat(), None, 150.0, None, None, None),
+        ]
+        saved, rejected = ingest_batch(rows)
+        self.assertEqual(len(saved), 2)
+        self.assertEqual(rejected, [])
+        self.assertEqual([r.quality for r in saved], ['good', 'good'])
+
+
+# ========== user-038: kalibrasi ==========
+
+class CalibrationTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.group = SensorGroup.objects.create(name='DAS Kalibrasi')
+        self.sensor = Sensor.objects.create(identifier='CAL001', name='Cal', group=self.group)
+        self.start = self.minutes_ago(120)
+
+    def calibrate(self, minutes_after_start, **fields):
+        return SensorCalibration.objects.create(
+            sensor=self.sensor, valid_from=self.start + timedelta(minutes=minutes_after_start), **fields
+        )
+
+    def ingest(self, minute, distance=100.0, flow_rate=None):
+        reading = build_reading(self.sensor, timestamp=self.start + timedelta(minutes=minute),
+                                distance=distance, flow_rate=flow_rate)
+        save_readings([reading])
+        return reading
+
+    def test_transform_matches_update_expressions(self):
+        calibration = SensorCalibration(mount_height=500, distance_offset=20, distance_scale=1.1,
+                                        flow_unit='l/s', flow_scale=2.0)
+        transform = Transform.compile(calibration)
+        reading = Reading(distance=100.0, flow_rate=50.0)
+        transform.apply(reading)
+        self.assertAlmostEqual(reading.water_level, 500 - 20 - 110)
+        self.assertAlmostEqual(reading.flow_m3s, 0.1)
+
+        saved = Reading.objects.create(sensor=self.sensor, timestamp=self.start, distance=100.0, flow_rate=50.0)
+        Reading.objects.filter(pk=saved.pk).update(**transform.expressions())
+        saved.refresh_from_db()
+        self.assertAlmostEqual(saved.water_level, reading.water_level)
+        self.assertAlmostEqual(saved.flow_m3s, reading.flow_m3s)
+
+    def test_ingest_uses_calibration_valid_at_timestamp(self):
+        self.calibrate(10, mount_height=300)
+        self.calibrate(20, mount_height=400, flow_unit='m3/h')
+
+        self.assertIsNone(self.ingest(0).water_level)
+        self.assertEqual(self.ingest(15).water_level, 200)
+        reading = self.ingest(25, flow_rate=3600)
+        self.assertEqual(reading.water_level, 300)
+        self.assertAlmostEqual(reading.flow_m3s, 1.0)
+
+    @mock.patch.object(calibration, 'SYNC_INTERVAL', 0)
+    def test_calibration_changed_by_other_worker(self):
+        current = self.calibrate(0, mount_height=300)
+        self.assertEqual(self.ingest(5).water_level, 200)
+        # update() tanpa signal: proses ini masih memakai transform lama
+        SensorCalibration.objects.filter(pk=current.pk).update(mount_height=400)
+        self.assertEqual(self.ingest(6).water_level, 200)
+        # Signal di worker lain menaikkan generasi di cache bersama
+        cache.incr(calibration.GENERATION_KEY)
+        self.assertEqual(self.ingest(7).water_level, 300)
+
+    def test_new_calibration_invalidates_cache(self):
+        self.calibrate(0, mount_height=300)
+        self.assertEqual(self.ingest(1).water_level, 200)
+        self.calibrate(2, mount_height=350)
+        self.assertEqual(self.ingest(3).water_level, 250)
+
+    def test_recalibrate_rewrites_history_and_current_state(self):
+        for minute in range(3):
+            self.ingest(minute, distance=100.0 + minute, flow_rate=1.0)
+        self.sensor.refresh_from_db()
+        self.assertIsNone(self.sensor.current_water_level)
+
+        self.calibrate(-60, mount_height=300, flow_unit='l/s')
+        call_command('recalibrate_readings', stdout=StringIO())
+
+        levels = list(Reading.objects.filter(sensor=self.sensor).order_by('timestamp')
+                      .values_list('water_level', 'flow_m3s'))
+        self.assertEqual(levels, [(200.0, 0.001), (199.0, 0.001), (198.0, 0.001)])
+        self.sensor.refresh_from_db()
+        self.assertEqual(self.sensor.current_water_level, 198.0)
+        self.group.refresh_from_db()
+        self.assertEqual((self.group.water_level_sum, self.group.water_level_count), (198.0, 1))
+        # Volume dihitung ulang dari flow_m3s baru
+        self.assertAlmostEqual(volume.range_volume(self.sensor.pk, self.start, self.start + timedelta(minutes=2)),
+                               0.12, places=6)
+
+
+# ========== user-039: indeks volume ==========
+
+class VolumeIndexTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = Sensor.objects.create(identifier='VOL001', name='Vol')
+        # Mulai tepat di batas jam supaya batas bucket mudah dihitung
+        self.start = self.minutes_ago(600).replace(minute=0, second=0, microsecond=0)
+
+    def ingest(self, minutes, flow=lambda minute: 2.0):
+        save_readings([
+            build_reading(self.sensor, timestamp=self.start + timedelta(minutes=m), distance=100.0,
+                          flow_rate=flow(m))
+            for m in minutes
+        ])
+
+    def at(self, minute):
+        return self.start + timedelta(minutes=minute)
+
+    def brute_force(self, start_minute, end_minute):
+        t, q = zip(*Reading.objects.filter(sensor=self.sensor).order_by('timestamp')
+                   .values_list('timestamp', 'flow_m3s'))
+        t = np.array([value.timestamp() for value in t])
+        lo, hi = self.at(start_minute).timestamp(), self.at(end_minute).timestamp()
+        points = np.concatenate(([lo], t[(t > lo) & (t < hi)], [hi]))
+        flows = np.interp(points, t, q)
+        return float(np.sum((flows[1:] + flows[:-1]) / 2 * np.diff(points)))
+
+    def test_cumulative_at(self):
+        values = volume.cumulative_at([0, 10, 20], [1.0, 3.0, 3.0], [-5, 0, 5, 10, 20, 30])
+        np.testing.assert_allclose(values, [0, 0, 7.5, 20, 50, 50])
+        np.testing.assert_allclose(volume.cumulative_at([], [], [1, 2]), [0, 0])
+
+    def test_range_volume_constant_flow(self):
+        self.ingest(range(0, 181, 10))
+        self.assertEqual(VolumeCheckpoint.objects.filter(sensor=self.sensor).count(), 3)
+        self.assertAlmostEqual(volume.range_volume(self.sensor.pk, self.at(0), self.at(180)), 2.0 * 180 * 60)
+        self.assertAlmostEqual(volume.range_volume(self.sensor.pk, self.at(25), self.at(145)), 2.0 * 120 * 60)
+        # Di luar rentang data volume tidak bertambah
+        self.assertAlmostEqual(volume.range_volume(self.sensor.pk, self.at(-60), self.at(0)), 0.0)
+        self.assertAlmostEqual(volume.range_volume(self.sensor.pk, self.at(180), self.at(300)), 0.0)
+
+    def test_late_reading_matches_rebuild(self):
+        flow = lambda minute: 1.0 + minute / 60
+        self.ingest([m for m in range(0, 241, 10) if m != 90], flow)
+        self.ingest([90], lambda minute: 10.0)
+        incremental = list(VolumeCheckpoint.objects.filter(sensor=self.sensor).order_by('timestamp')
+                           .values_list('timestamp', 'cumulative'))
+        head = VolumeIndex.objects.get(sensor=self.sensor).cumulative
+
+        self.assertEqual(volume.rebuild(self.sensor.pk), 4)
+        rebuilt = list(VolumeCheckpoint.objects.filter(sensor=self.sensor).order_by('timestamp')
+                       .values_list('timestamp', 'cumulative'))
+        self.assertEqual([t for t, _ in incremental], [t for t, _ in rebuilt])
+        for (_, a), (_, b) in zip(incremental, rebuilt):
+            self.assertAlmostEqual(a, b, places=6)
+        self.assertAlmostEqual(head, VolumeIndex.objects.get(sensor=self.sensor).cumulative, places=6)
+        self.assertAlmostEqual(volume.range_volume(self.sensor.pk, self.at(35), self.at(200)),
+                               self.brute_force(35, 200), delta=1e-3)
+
+    def test_existing_data_waits_for_rebuild(self):
+        Reading.objects.create(sensor=self.sensor, timestamp=self.at(0), flow_rate=1.0, flow_m3s=1.0)
+        self.ingest([10])
+        self.assertFalse(VolumeIndex.objects.filter(sensor=self.sensor).exists())
+        call_command('rebuild_volume_index', stdout=StringIO())
+        self.assertAlmostEqual(VolumeIndex.objects.get(sensor=self.sensor).cumulative, 1.5 * 600)
+
+    def test_volume_endpoint(self):
+        self.ingest(range(0, 61, 10))
+        url = f'/api/sensors/{self.sensor.pk}/volume/'
+        response = self.client.get(url, {'start': self.at(0).isoformat(), 'end': self.at(60).isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(response.json()['volume_m3'], 7200.0)
+        self.assertEqual(self.client.get(url, {'start': 'kemarin', 'end': self.at(60).isoformat()}).status_code, 400)
+        response = self.client.get(url, {'start': self.at(60).isoformat(), 'end': self.at(0).isoformat()})
+        self.assertEqual(response.status_code, 400)
+
+
+# ========== user-040: episode alert ==========
+
+class AlertEpisodeTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = Sensor.objects.create(identifier='EPS001', name='Eps')
+        self.start = self.minutes_ago(600)
+
+    def reading(self, minute, level, distance=100.0, flow=1.0):
+        return Reading(sensor=self.sensor, timestamp=self.at(minute), alert_level=level,
+                       distance=distance, flow_rate=flow)
+
+    def at(self, minute):
+        return self.start + timedelta(minutes=minute)
+
+    def episodes(self):
+        return list(AlertEpisode.objects.filter(sensor=self.sensor).order_by('started_at')
+                    .values_list('level', 'started_at', 'ended_at', 'reading_count'))
+
+    def test_in_order_readings_open_extend_and_close(self):
+        save_readings([self.reading(0, 'safe'), self.reading(5, 'warning', 90)])
+        save_readings([self.reading(10, 'warning', 80, flow=4.0)])
+        save_readings([self.reading(15, 'danger', 60), self.reading(20, 'safe')])
+        self.assertEqual(self.episodes(), [
+            ('warning', self.at(5), self.at(15), 2),
+            ('danger', self.at(15), self.at(20), 1),
+        ])
+        warning = AlertEpisode.objects.get(sensor=self.sensor, level='warning')
+        self.assertEqual((warning.peak_flow, warning.peak_distance), (4.0, 80))
+
+    def test_safe_only_creates_nothing(self):
+        save_readings([self.reading(m, 'safe') for m in range(0, 30, 5)])
+        self.assertEqual(self.episodes(), [])
+
+    def test_late_reading_rebuilds_from_its_timestamp(self):
+        save_readings([self.reading(0, 'warning'), self.reading(10, 'warning'), self.reading(20, 'safe')])
+        # Reading terlambat di tengah episode memecahnya menjadi dua
+        save_readings([self.reading(5, 'danger', 50)])
+        self.assertEqual(self.episodes(), [
+            ('warning', self.at(0), self.at(5), 1),
+            ('danger', self.at(5), self.at(10), 1),
+            ('warning', self.at(10), self.at(20), 1),
+        ])
+        incremental = self.episodes()
+        self.assertEqual(episodes.rebuild(self.sensor.pk), 3)
+        self.assertEqual(self.episodes(), incremental)
+
+    def test_summarize_clips_to_range(self):
+        save_readings([self.reading(0, 'warning'), self.reading(60, 'danger', 40, flow=9.0),
+                       self.reading(90, 'safe'), self.reading(120, 'warning')])
+        summary = episodes.summarize(self.sensor.pk, self.at(30), self.at(150), now=self.at(180))
+        self.assertEqual([entry['level'] for entry in summary], ['danger', 'warning'])
+        danger, warning = summary
+        self.assertEqual(danger['duration'], timedelta(minutes=30))
+        self.assertEqual((danger['peak_flow'], danger['peak_distance']), (9.0, 40))
+        self.assertEqual(warning['episodes'], 2)
+        self.assertEqual(warning['duration'], timedelta(minutes=30 + 30))
+        self.assertEqual(warning['longest'], timedelta(minutes=30))
+
+    def test_episodes_endpoint(self):
+        save_readings([self.reading(0, 'warning'), self.reading(10, 'danger'), self.reading(20, 'safe')])
+        response = self.client.get(f'/api/sensors/{self.sensor.pk}/episodes/', {'level': 'danger'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        results = data['results'] if isinstance(data, dict) else data
+        self.assertEqual([episode['level'] for episode in results], ['danger'])
+
+    def test_episodes_endpoint_validates_params(self):
+        url = f'/api/sensors/{self.sensor.pk}/episodes/'
+        for params in ({'limit': 'abc'}, {'limit': '0'}, {'start': 'kemarin'}, {'end': '2026-13-45T00:00:00Z'}):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+        self.assertEqual(self.client.get(url, {'limit': '100000'}).status_code, 200)
+
+
+# ========== user-041: resampling ==========
+
+class ResampleTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.start = self.minutes_ago(600).replace(minute=0, second=0, microsecond=0)
+        self.end = self.start + timedelta(hours=1)
+        self.sensor = Sensor.objects.create(identifier='RSM001', name='Rsm')
+        self.other = Sensor.objects.create(identifier='RSM002', name='Rsm 2')
+        Reading.objects.bulk_create([
+            Reading(sensor=self.sensor, timestamp=self.start + timedelta(minutes=m), distance=d, quality=q)
+            for m, d, q in [(1, 100.0, 'good'), (3, 110.0, 'good'), (4, 500.0, 'spike'),
+                            (12, 90.0, 'good'), (40, 80.0, 'good')]
+        ] + [Reading(sensor=self.other, timestamp=self.start + timedelta(minutes=7), distance=50.0)])
+
+    def row(self, how='mean', fill='nan', limit=None, sensor=None):
+        series = resample.resample([self.other.pk, self.sensor.pk], self.start, self.end, 300,
+                                   ('distance',), how, fill, limit)
+        return series.column('distance', (sensor or self.sensor).pk)
+
+    def test_parse_params(self):
+        self.assertEqual(resample.parse_params('15', 'max', 'ffill', '3'), (900, 'max', 'ffill', 3))
+        self.assertEqual(resample.parse_params(5), (300, 'mean', 'nan', None))
+        for args in [('7',), ('x',), (None,), ('5', 'median'), ('5', 'mean', 'bfill'),
+                     ('5', 'mean', 'ffill', 'x'), ('5', 'mean', 'ffill', '-1')]:
+            with self.assertRaises(resample.ResampleError, msg=args):
+                resample.parse_params(*args)
+
+    def test_aggregations(self):
+        empty = [None] * 10
+        self.assertEqual(self.row('mean'), [105.0, None, 90.0] + [None] * 5 + [80.0, None, None, None])
+        self.assertEqual(self.row('last')[0], 110.0)
+        self.assertEqual(self.row('max')[0], 110.0)
+        self.assertEqual(self.row('min')[0], 100.0)
+        self.assertEqual(self.row(sensor=self.other), [None, 50.0] + empty)
+
+    def test_gap_fill(self):
+        self.assertEqual(self.row(fill='ffill', limit=2)[:6], [105.0, 105.0, 90.0, 90.0, 90.0, None])
+        self.assertEqual(self.row(fill='ffill')[9:], [80.0, 80.0, 80.0])
+        linear = self.row(fill='linear')
+        self.assertEqual(linear[1], 97.5)
+        self.assertAlmostEqual(linear[5], 90.0 - 10.0 * 3 / 6)
+        # Tanpa ekstrapolasi di tepi, dan gap yang lebih panjang dari limit dibiarkan
+        self.assertEqual(linear[9:], [None, None, None])
+        self.assertEqual(self.row(fill='linear', limit=2)[3:8], [None] * 5)
+
+    def test_counts_and_unknown_field(self):
+        series = resample.resample([self.sensor.pk], self.start, self.end, 300, good_only=False)
+        self.assertEqual(series.counts[0][:3].tolist(), [3, 0, 1])
+        self.assertEqual(series.column('distance', self.sensor.pk)[0], (100 + 110 + 500) / 3)
+        with self.assertRaises(resample.ResampleError):
+            resample.resample([self.sensor.pk], self.start, self.end, 300, fields=('pressure',))
+
+    @override_settings(RESAMPLE_MAX_CELLS=10)
+    def test_grid_limit(self):
+        with self.assertRaises(resample.ResampleError):
+            resample.resample([self.sensor.pk], self.start, self.end, 300)
+
+    def test_readings_endpoint(self):
+        url = f'/api/sensors/{self.sensor.pk}/readings/'
+        params = {'interval': '15', 'start': self.start.isoformat(), 'end': self.end.isoformat()}
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['timestamps']), 4)
+        self.assertEqual(data['sensors'][0]['distance'], [(100 + 110 + 90) / 3, None, 80.0, None])
+        self.assertEqual(data['sensors'][0]['counts'], [3, 0, 1, 0])
+
+        self.assertEqual(self.client.get(url, {**params, 'interval': '7'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {**params, 'end': params['start']}).status_code, 400)
+        for value in ('2026-13-45T00:00:00+00:00', 'kemarin', '2026-01-01T00:00:00'):
+            with self.subTest(start=value):
+                self.assertEqual(self.client.get(url, {**params, 'start': value}).status_code, 400)
+        self.assertEqual(self.client.get(url, {**params, 'field': 'pressure'}).status_code, 400)
+
+    def test_csv_export(self):
+        response = self.client.get(f'/api/sensors/{self.sensor.pk}/readings/', {
+            'interval': '15', 'start': self.start.isoformat(), 'end': self.end.isoformat(),
+            'field': ['distance', 'flow_rate'], 'export': 'csv',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = response.content.decode().splitlines()
+        self.assertEqual(lines[0], 'timestamp,RSM001_distance,RSM001_flow_rate')
+        self.assertEqual(lines[1], f"{self.start:%Y-%m-%d %H:%M:%S},100.000,")
+        self.assertEqual(len(lines), 5)
+
+
+# ========== user-042: perbandingan sensor ==========
+
+class CompareSensorsTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.start = self.minutes_ago(24 * 60).replace(minute=0, second=0, microsecond=0)
+        self.end = self.start + timedelta(hours=4)
+        self.upstream = Sensor.objects.create(identifier='HULU01', name='Hulu')
+        self.downstream = Sensor.objects.create(identifier='HILIR01', name='Hilir')
+        rng = np.random.default_rng(7)
+        levels = 150 + np.cumsum(rng.normal(0, 3, 60))
+        # Gelombang yang sama sampai di hilir 15 menit kemudian
+        Reading.objects.bulk_create(
+            [Reading(sensor=self.upstream, timestamp=self.start + timedelta(minutes=5 * i), distance=float(d))
+             for i, d in enumerate(levels)]
+            + [Reading(sensor=self.downstream, timestamp=self.start + timedelta(minutes=5 * i + 15),
+                       distance=float(d) - 20) for i, d in enumerate(levels)]
+        )
+
+    def compare(self, **params):
+        return self.client.get('/api/compare/', {
+            'sensors': 'HULU01,HILIR01', 'step': '5',
+            'start': self.start.isoformat(), 'end': self.end.isoformat(), **params,
+        })
+
+    def test_matrix(self):
+        response = self.compare()
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([s['identifier'] for s in data['sensors']], ['HULU01', 'HILIR01'])
+        self.assertEqual(len(data['timestamps']), 48)
+        self.assertEqual(len(data['values']), 48)
+        self.assertIsNone(data['values'][0][1])
+        self.assertAlmostEqual(data['values'][3][1], data['values'][0][0] - 20)
+        self.assertNotIn('lag_correlation', data)
+
+    def test_lag_correlation_finds_travel_time(self):
+        data = self.compare(max_lag='30').json()
+        pair = data['lag_correlation']['pairs'][0]
+        self.assertEqual(data['lag_correlation']['reference'], self.upstream.pk)
+        self.assertEqual(pair['lag_minutes'], 15)
+        self.assertAlmostEqual(pair['correlation'], 1.0)
+        self.assertEqual(len(pair['curve']), 13)
+
+    def test_lag_correlation_function(self):
+        x = np.array([0.0, 1, 3, 2, 5, 4, 8, 7])
+        lags, correlation, samples = resample.lag_correlation(x, [np.r_[np.nan, x[:-1]]], 2)
+        self.assertEqual(lags.tolist(), [-2, -1, 0, 1, 2])
+        self.assertAlmostEqual(correlation[0][3], 1.0)
+        self.assertEqual(samples[0][3], 6)
+
+    def test_lookup_by_id_and_errors(self):
+        response = self.compare(sensors=f'{self.upstream.pk},HILIR01')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.compare(sensors='HULU01').status_code, 400)
+        self.assertEqual(self.compare(sensors='HULU01,NOPE').status_code, 404)
+        self.assertEqual(self.compare(max_lag='-5').status_code, 400)
+        self.assertEqual(self.compare(step='7').status_code, 400)
+        with self.settings(COMPARE_MAX_SENSORS=1):
+            self.assertEqual(self.compare().status_code, 400)
+
+
+# ========== user-043: indeks spasial & peta ==========
+
+class SpatialIndexTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(3)
+        self.points = np.column_stack([rng.uniform(-6.0, -5.0, 150), rng.uniform(105.0, 106.0, 150)])
+        Sensor.objects.bulk_create([
+            Sensor(identifier=f'MAP{i:03d}', name=f'Map {i}', latitude=round(lat, 6), longitude=round(lon, 6))
+            for i, (lat, lon) in enumerate(self.points)
+        ])
+        self.ids = list(Sensor.objects.order_by('pk').values_list('pk', flat=True))
+        spatial_index.invalidate()
+
+    def test_bbox_matches_brute_force(self):
+        south, west, north, east = -5.7, 105.2, -5.3, 105.45
+        indices = spatial_index.bbox(south, west, north, east)
+        found = sorted(spatial_index.ids[indices].tolist())
+        lats, lons = spatial_index.lats, spatial_index.lons
+        expected = sorted(spatial_index.ids[(lats >= south) & (lats <= north) & (lons >= west) & (lons <= east)])
+        self.assertEqual(found, expected)
+        self.assertTrue(found)
+
+    def test_nearest_matches_brute_force(self):
+        for lat, lon in [(-5.5, 105.5), (-5.01, 105.99), (-7.0, 104.0)]:
+            indices, distances = spatial_index.nearest(lat, lon, 7)
+            brute = haversine(lat, lon, spatial_index.lats, spatial_index.lons)
+            np.testing.assert_allclose(distances, np.sort(brute)[:7])
+            self.assertTrue(np.all(np.diff(distances) >= 0))
+        self.assertEqual(len(spatial_index.nearest(-5.5, 105.5, 1000)[0]), 150)
+
+    def test_cluster_carries_worst_level(self):
+        first = self.ids[0]
+        AlertEpisode.objects.create(sensor_id=first, level='danger', started_at=timezone.now(),
+                                    last_timestamp=timezone.now(), reading_count=1)
+        indices = spatial_index.bbox(-90, -180, 90, 180)
+        clusters, single = spatial_index.cluster(indices, 1, current_levels())
+        self.assertEqual(single, [])
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual((clusters[0]['count'], clusters[0]['alert_level']), (150, 'danger'))
+
+    def test_index_follows_sensor_changes(self):
+        self.assertEqual(len(spatial_index), 150)
+        Sensor.objects.create(identifier='MAPNEW', name='Baru', latitude=-5.5, longitude=105.5)
+        self.assertEqual(len(spatial_index), 151)
+        sensor = Sensor.objects.get(identifier='MAPNEW')
+        sensor.is_active = False
+        sensor.save()
+        self.assertEqual(len(spatial_index), 150)
+
+    def test_map_endpoints(self):
+        response = self.client.get('/api/map/', {'bbox': '105.0,-6.0,106.0,-5.0'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['total'], len(response.json()['sensors'])), (150, 150))
+        response = self.client.get('/api/map/', {'zoom': '1'})
+        self.assertEqual(response.json()['clusters'][0]['count'], 150)
+        self.assertEqual(self.client.get('/api/map/', {'bbox': '1,2,3'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/map/', {'bbox': '106,-6,105,-5'}).status_code, 400)
+        for zoom in ('-2000', '23', '1.5'):
+            self.assertEqual(self.client.get('/api/map/', {'zoom': zoom}).status_code, 400)
+        self.assertEqual(self.client.get('/api/map/', {'zoom': '0'}).status_code, 200)
+
+        response = self.client.get('/api/map/nearest/', {'lat': '-5.5', 'lon': '105.5', 'n': '3'})
+        self.assertEqual(response.status_code, 200)
+        distances = [sensor['distance_km'] for sensor in response.json()['sensors']]
+        self.assertEqual(distances, sorted(distances))
+        self.assertEqual(len(distances), 3)
+        for params in [{'lat': '-5.5'}, {'lat': '95', 'lon': '105'}, {'lat': '-5', 'lon': '105', 'n': '0'}]:
+            self.assertEqual(self.client.get('/api/map/nearest/', params).status_code, 400)
+
+
+# ========== user-044: agregat grup ==========
+
+class GroupRollupTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.basin = SensorGroup.objects.create(name='DAS Way Sekampung', group_type='basin')
+        self.river = SensorGroup.objects.create(name='Way Sekampung', group_type='river', parent=self.basin)
+        self.other = SensorGroup.objects.create(name='Way Seputih', group_type='river')
+        self.a = Sensor.objects.create(identifier='GRP001', name='A', group=self.river)
+        self.b = Sensor.objects.create(identifier='GRP002', name='B', group=self.river)
+
+    def counters(self, group):
+        return SensorGroup.objects.filter(pk=group.pk).values(*SensorGroup.AGGREGATE_FIELDS).get()
+
+    def snapshot(self):
+        return {group.pk: self.counters(group) for group in SensorGroup.objects.all()}
+
+    def ingest(self, sensor, distance, level='safe', minutes_ago=1):
+        save_readings([Reading(sensor=sensor, timestamp=self.minutes_ago(minutes_ago), distance=distance,
+                               alert_level=level)])
+
+    def test_ingest_rolls_up_to_ancestors(self):
+        self.ingest(self.a, 120.0)
+        self.ingest(self.b, 60.0, 'danger')
+        for group in (self.river, self.basin):
+            counters = self.counters(group)
+            self.assertEqual(counters['sensor_count'], 2)
+            self.assertEqual(counters['online_count'], 2)
+            self.assertEqual(counters['danger_count'], 1)
+            self.assertEqual((counters['distance_sum'], counters['distance_count']), (180.0, 2))
+        self.river.refresh_from_db()
+        self.assertEqual((self.river.worst_alert, self.river.avg_distance), ('danger', 90.0))
+
+        # Reading berikutnya hanya menerapkan selisihnya
+        self.ingest(self.b, 100.0, 'warning', minutes_ago=0)
+        counters = self.counters(self.basin)
+        self.assertEqual((counters['danger_count'], counters['warning_count']), (0, 1))
+        self.assertEqual(counters['distance_sum'], 220.0)
+
+    def test_backfill_does_not_move_current_state(self):
+        self.ingest(self.a, 120.0)
+        self.ingest(self.a, 10.0, 'critical', minutes_ago=60)
+        self.a.refresh_from_db()
+        self.assertEqual((self.a.current_distance, self.a.alert_level), (120.0, 'safe'))
+        self.assertEqual(self.counters(self.river)['critical_count'], 0)
+
+    def test_move_sensor_and_group(self):
+        self.ingest(self.a, 120.0)
+        self.a.refresh_from_db()
+        self.a.group = self.other
+        self.a.save()
+        self.assertEqual(self.counters(self.basin)['sensor_count'], 1)
+        self.assertEqual(self.counters(self.other)['distance_sum'], 120.0)
+
+        # Memindah grup membawa seluruh subtree-nya ke leluhur baru
+        self.other.parent = self.basin
+        self.other.save()
+        self.assertEqual(self.counters(self.basin)['sensor_count'], 2)
+        self.assertEqual(self.counters(self.basin)['distance_sum'], 120.0)
+
+        self.a.delete()
+        self.assertEqual(self.counters(self.basin)['sensor_count'], 1)
+        self.assertEqual(self.counters(self.other)['sensor_count'], 0)
+
+    def test_group_moved_by_other_worker(self):
+        self.ingest(self.a, 120.0)
+        # Worker lain memindah grup; signal-nya tidak sampai ke proses ini
+        SensorGroup.objects.filter(pk=self.river.pk).update(parent=self.other)
+        self.ingest(self.b, 60.0, 'danger')
+        self.assertEqual(self.counters(self.other)['danger_count'], 1)
+        self.assertEqual(self.counters(self.basin)['danger_count'], 0)
+
+    def test_mark_offline(self):
+        self.ingest(self.a, 120.0, minutes_ago=60)
+        self.ingest(self.b, 120.0, minutes_ago=1)
+        Sensor.objects.filter(pk=self.a.pk).update(status='online')
+        groups.rebuild()
+        self.assertEqual(self.counters(self.basin)['online_count'], 2)
+        self.assertEqual(groups.mark_offline(timezone.now() - timedelta(minutes=30)), 1)
+        self.assertEqual(self.counters(self.basin)['online_count'], 1)
+        self.assertEqual(groups.mark_offline(timezone.now() - timedelta(minutes=30)), 0)
+
+    def test_incremental_matches_rebuild(self):
+        self.ingest(self.a, 120.0, 'warning')
+        self.ingest(self.b, 80.0)
+        self.a.group = self.other
+        self.a.save()
+        self.ingest(self.a, 50.0, 'danger', minutes_ago=0)
+        incremental = self.snapshot()
+        SensorGroup.objects.update(sensor_count=99)
+        call_command('rebuild_group_stats', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_api_rejects_cycles_and_keeps_counters(self):
+        self.ingest(self.a, 120.0)
+        response = self.client.patch(f'/api/groups/{self.basin.pk}/', {'parent': self.river.pk},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/api/groups/{self.river.pk}/', {'name': 'Way Sekampung Hulu'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counters(self.river)['sensor_count'], 2)
+        roots = self.client.get('/api/groups/', {'parent': 'root'}).json()
+        roots = roots['results'] if isinstance(roots, dict) else roots
+        self.assertEqual(sorted(group['name'] for group in roots), ['DAS Way Sekampung', 'Way Seputih'])
+
+
+# ========== user-045: langganan & pengiriman alert ==========
+
+# Reading test berjarak satu menit; rise detector akan menaikkan levelnya
+@override_settings(RISE_MIN_SAMPLES=1000)
+class AlertSubscriptionTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.basin = SensorGroup.objects.create(name='DAS Alert', group_type='basin')
+        self.river = SensorGroup.objects.create(name='Sungai Alert', group_type='river', parent=self.basin)
+        self.sensor = Sensor.objects.create(identifier='ALR001', name='Alert 1', group=self.river)
+        self.other = Sensor.objects.create(identifier='ALR002', name='Alert 2')
+        SensorThreshold.objects.create(sensor=self.sensor, threshold_type='distance', alert_level='warning',
+                                       min_value=70, max_value=100, message='Tinggi muka air waspada')
+        SensorThreshold.objects.create(sensor=self.sensor, threshold_type='distance', alert_level='danger',
+                                       min_value=1, max_value=70, message='Tinggi muka air bahaya')
+
+    def user(self, name, telegram_id='', **profile):
+        user = User.objects.create_user(name, f'{name}@example.com')
+        UserProfile.objects.create(user=user, telegram_id=telegram_id, **profile)
+        return user
+
+    def test_recipients_by_scope_and_level(self):
+        legacy = self.user('lama', telegram_id='111', receive_telegram_alerts=True)
+        by_sensor = self.user('sensor')
+        AlertSubscription.objects.create(user=by_sensor, sensor=self.sensor, min_level='danger')
+        by_group = self.user('grup', telegram_id='222')
+        AlertSubscription.objects.create(user=by_group, group=self.basin, email=False, telegram=True)
+        self.user('diam', receive_email_alerts=False)
+
+        self.assertEqual(subscription_index.recipients(self.sensor.pk, 'warning'), {
+            'email': [legacy.email], 'telegram': ['111', '222'],
+        })
+        self.assertEqual(subscription_index.recipients(self.sensor.pk, 'critical'), {
+            'email': [legacy.email, by_sensor.email], 'telegram': ['111', '222'],
+        })
+        # Langganan sensor/grup tidak berlaku untuk sensor lain
+        self.assertEqual(subscription_index.recipients(self.other.pk, 'danger'), {
+            'email': [legacy.email], 'telegram': ['111'],
+        })
+
+    def test_index_follows_subscription_changes(self):
+        user = self.user('baru')
+        self.assertEqual(subscription_index.recipients(self.other.pk, 'warning'), {'email': [user.email]})
+        subscription = AlertSubscription.objects.create(user=user, sensor=self.sensor)
+        self.assertEqual(subscription_index.recipients(self.other.pk, 'warning'), {})
+        subscription.is_active = False
+        subscription.save()
+        self.assertEqual(subscription_index.recipients(self.other.pk, 'warning'), {'email': [user.email]})
+        user.is_active = False
+        user.save()
+        self.assertEqual(subscription_index.recipients(self.other.pk, 'warning'), {})
+
+    def test_login_keeps_index(self):
+        user = self.user('masuk')
+        subscription_index.recipients(self.other.pk, 'warning')
+        built_at = subscription_index._built_at
+        self.client.force_login(user)
+        self.assertEqual(subscription_index._built_at, built_at)
+        user.email = 'baru@example.com'
+        user.save(update_fields=['email'])
+        self.assertEqual(subscription_index.recipients(self.other.pk, 'warning'), {'email': ['baru@example.com']})
+
+    def ingest(self, *distances):
+        start = self.minutes_ago(30)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            save_readings([
+                build_reading(self.sensor, timestamp=start + timedelta(minutes=i), distance=distance)
+                for i, distance in enumerate(distances)
+            ])
+        return callbacks
+
+    @override_settings(ALERT_DIGEST_WINDOW=60)
+    def test_escalation_queues_digest_alerts(self):
+        self.user('operator')
+        self.ingest(150.0, 90.0, 85.0, 60.0, 90.0, 150.0)
+        alerts = list(PendingAlert.objects.order_by('id').values_list('level', 'message'))
+        # warning dan danger dibuka dengan level naik; turun ke warning tidak dikirim ulang
+        self.assertEqual(alerts, [('warning', 'Alert 1 - Tinggi muka air waspada'),
+                                  ('danger', 'Alert 1 - Tinggi muka air bahaya')])
+
+    @override_settings(ALERT_DIGEST_WINDOW=0, TELEGRAM_BOT_TOKEN='token')
+    def test_immediate_notification_after_commit(self):
+        self.sensor.location = 'Jembatan Alert'
+        self.sensor.save()
+        self.user('operator', telegram_id='333', receive_telegram_alerts=True)
+        with mock.patch('sungai_monitor.utils.requests.post') as post:
+            callbacks = self.ingest(150.0, 60.0)
+            self.assertEqual(len(callbacks), 1)
+
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['operator@example.com'])
+        self.assertEqual(message.subject, '⚠️ Alert: Alert 1 - DANGER')
+        for text in ('Distance: 60.00 cm', 'Tinggi muka air bahaya', 'Location: Jembatan Alert'):
+            self.assertIn(text, message.body)
+        (url,), kwargs = post.call_args
+        self.assertTrue(url.endswith('/bottoken/sendMessage'))
+        self.assertEqual(kwargs['json']['chat_id'], '333')
+        self.assertEqual(kwargs['json']['text'], message.body)
+        self.assertEqual(
+            sorted(AlertNotification.objects.values_list('notification_type', 'status')),
+            [('email', 'sent'), ('telegram', 'sent')],
+        )
+
+        # Episode yang masih berjalan tidak mengirim ulang
+        self.assertEqual(len(self.ingest(50.0)), 0)
+
+    @override_settings(ALERT_DIGEST_WINDOW=0)
+    def test_failed_notification_does_not_fail_ingest(self):
+        self.user('operator')
+        with mock.patch('sungai_monitor.utils.send_alert_notification', side_effect=RuntimeError('smtp')):
+            self.ingest(60.0)
+        self.assertEqual(Reading.objects.filter(sensor=self.sensor).count(), 1)
+
+    def test_trigger_message(self):
+        reading = Reading(sensor=self.sensor, alert_level='danger', distance=60.0)
+        self.assertEqual(episodes._trigger(reading), AlertTrigger('danger', 'Tinggi muka air bahaya'))
+        reading.notes = 'Muka air naik 40.0 cm/jam'
+        self.assertEqual(episodes._trigger(reading).message, 'Muka air naik 40.0 cm/jam')
+        reading = Reading(sensor=self.sensor, alert_level='critical', quality='spike', notes='Distance ditandai spike')
+        self.assertEqual(episodes._trigger(reading), AlertTrigger('critical', 'Status CRITICAL'))
+
+    def test_late_reading_does_not_notify(self):
+        self.user('operator')
+        self.ingest(150.0, 150.0)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            save_readings([build_reading(self.sensor, timestamp=self.minutes_ago(45), distance=60.0)])
+        self.assertEqual(callbacks, [])
+        self.assertTrue(AlertEpisode.objects.filter(sensor=self.sensor, level='danger').exists())
+
+    def test_subscription_api_is_per_user(self):
+        owner = self.user('pemilik')
+        self.client.force_login(owner)
+        response = self.client.post('/api/subscriptions/', {'sensor': self.sensor.pk, 'min_level': 'danger'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.client.force_login(self.user('lain'))
+        data = self.client.get('/api/subscriptions/').json()
+        self.assertEqual(data['results'] if isinstance(data, dict) else data, [])
+        self.assertEqual(self.client.delete(f"/api/subscriptions/{response.json()['id']}/").status_code, 404)
+
+
+# ========== user-046: digest alert ==========
+
+@override_settings(ALERT_DIGEST_WINDOW=120, TELEGRAM_BOT_TOKEN='token')
+class AlertDigestTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = Sensor.objects.create(identifier='DGS001', name='Digest')
+        self.now = timezone.now()
+
+    def queue(self, recipient, level='warning', seconds_ago=300, channel='email'):
+        reading = Reading.objects.create(sensor=self.sensor, timestamp=self.now - timedelta(seconds=seconds_ago),
+                                         alert_level=level)
+        return PendingAlert.objects.create(
+            reading=reading, notification_type=channel, recipient=recipient, level=level,
+            message=f'Digest - {level}', created_at=self.now - timedelta(seconds=seconds_ago),
+        )
+
+    def test_one_digest_per_due_recipient(self):
+        self.queue('a@example.com', 'warning', 300)
+        self.queue('a@example.com', 'danger', 60)
+        self.queue('b@example.com', 'warning', 30)
+
+        self.assertEqual(send_alert_digests(now=self.now), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['a@example.com'])
+        self.assertIn('2 alert, tertinggi DANGER', message.subject)
+        self.assertEqual(message.body.count('Digest - '), 2)
+        notification = AlertNotification.objects.get()
+        self.assertEqual((notification.status, notification.alert_count), ('sent', 2))
+        # Penerima yang belum lewat jendela tetap antre sampai flush
+        self.assertEqual(list(PendingAlert.objects.values_list('recipient', flat=True)), ['b@example.com'])
+        self.assertEqual(send_alert_digests(now=self.now, flush=True), 1)
+        self.assertFalse(PendingAlert.objects.exists())
+
+    def test_alert_claimed_elsewhere_is_not_sent_twice(self):
+        first = self.queue('a@example.com', 'warning', 300)
+        taken = self.queue('a@example.com', 'danger', 200)
+        other = self.queue('b@example.com', 'warning', 310)
+
+        # Proses lain menghapus (mengklaim) alert di antara SELECT dan klaim proses ini
+        def claim_elsewhere(sender, instance, **kwargs):
+            PendingAlert.objects.filter(pk__in=[taken.pk, other.pk])._raw_delete('default')
+            pre_delete.disconnect(claim_elsewhere, sender=PendingAlert)
+        pre_delete.connect(claim_elsewhere, sender=PendingAlert)
+        self.addCleanup(pre_delete.disconnect, claim_elsewhere, sender=PendingAlert)
+
+        self.assertEqual(send_alert_digests(now=self.now), 1)
+        self.assertEqual([message.to for message in mail.outbox], [['a@example.com']])
+        self.assertIn('1 alert, tertinggi WARNING', mail.outbox[0].subject)
+        self.assertEqual(AlertNotification.objects.get().reading_id, first.reading_id)
+
+    def test_telegram_failure_is_recorded(self):
+        self.queue('12345', 'critical', 300, channel='telegram')
+        with mock.patch('sungai_monitor.utils.requests.Session') as session:
+            session.return_value.post.side_effect = RuntimeError('timeout')
+            self.assertEqual(send_alert_digests(now=self.now), 1)
+        notification = AlertNotification.objects.get()
+        self.assertEqual((notification.status, notification.error_message), ('failed', 'timeout'))
+        self.assertFalse(PendingAlert.objects.exists())
+
+    def test_long_digest_is_truncated(self):
+        alerts = [self.queue('a@example.com', seconds_ago=300 + i) for i in range(DIGEST_MAX_LINES + 5)]
+        subject, body = format_alert_digest(list(PendingAlert.objects.order_by('created_at')))
+        self.assertIn(f'{len(alerts)} alert', subject)
+        self.assertTrue(body.endswith('... dan 5 alert lainnya'))
+
+    def test_command(self):
+        self.queue('a@example.com')
+        out = StringIO()
+        call_command('send_alert_digests', stdout=out)
+        self.assertIn('Sent 1 alert digests', out.getvalue())
+
+
+# ========== user-047: interval lapor adaptif ==========
+
+class DeviceConfigTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = Sensor.objects.create(identifier='CFG001', name='Config')
+        SensorThreshold.objects.create(sensor=self.sensor, threshold_type='distance', alert_level='danger',
+                                       min_value=1, max_value=70, message='Bahaya')
+
+    def test_report_interval(self):
+        self.assertEqual(report_interval('safe'), 900)
+        self.assertEqual(report_interval('danger'), 60)
+        self.assertEqual(report_interval('unknown'), 900)
+        # Masih safe tapi naik cepat: sudah memakai interval warning
+        self.assertEqual(report_interval('safe', rise_rate=12.0), 300)
+        self.assertEqual(report_interval('safe', rise_rate=5.0), 900)
+        self.assertEqual(report_interval('danger', rise_rate=50.0), 60)
+        with self.settings(DEVICE_REPORT_INTERVALS={'safe': 1800}, DEVICE_RISING_RATE=20.0):
+            self.assertEqual(report_interval('safe', rise_rate=12.0), 1800)
+            self.assertEqual(report_interval('warning'), 300)
+
+    def test_cache_reads_sensor_level_after_ttl(self):
+        Sensor.objects.filter(pk=self.sensor.pk).update(alert_level='warning')
+        self.assertEqual(device_configs.for_sensor(self.sensor.pk), {'report_interval': 300, 'alert_level': 'warning'})
+        Sensor.objects.filter(pk=self.sensor.pk).update(alert_level='critical')
+        self.assertEqual(device_configs.for_sensor(self.sensor.pk)['alert_level'], 'warning')
+        with self.settings(DEVICE_CONFIG_TTL=0):
+            device_configs.update(self.sensor.pk, 'warning')
+            self.assertEqual(device_configs.for_sensor(self.sensor.pk)['alert_level'], 'critical')
+        self.assertEqual(device_configs.for_sensor(999999), {'report_interval': 900, 'alert_level': 'safe'})
+
+    def test_json_ingest_returns_config(self):
+        timestamp = self.minutes_ago(1).isoformat()
+        response = self.client.post('/api/ingest/', {'sensor_id': 'CFG001', 'distance': 50.0, 'timestamp': timestamp},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['config'], {'report_interval': 60, 'alert_level': 'danger'})
+        response = self.client.post('/api/ingest/', {'sensor_id': 'CFG001', 'distance': 50.0, 'timestamp': timestamp},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'duplicate': True, 'config': {'report_interval': 60, 'alert_level': 'danger'}})
+
+    def test_late_reading_keeps_config(self):
+        def ingest(minutes, distance):
+            return self.client.post('/api/ingest/', {
+                'sensor_id': 'CFG001', 'distance': distance, 'timestamp': self.minutes_ago(minutes).isoformat(),
+            }, content_type='application/json')
+
+        self.assertEqual(ingest(1, 50.0).json()['config']['alert_level'], 'danger')
+        # Backfill reading safe yang lebih tua tidak melonggarkan interval
+        response = ingest(30, 150.0)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['config'], {'report_interval': 60, 'alert_level': 'danger'})
+        with self.settings(DEVICE_CONFIG_TTL=0):
+            self.assertEqual(ingest(20, 150.0).json()['config']['alert_level'], 'danger')
+        self.assertEqual(device_configs.for_sensor(self.sensor.pk)['alert_level'], 'danger')
+
+    def test_binary_ingest_returns_config(self):
+        epoch = int(self.minutes_ago(1).timestamp())
+        body = pack_readings('CFG001', [(epoch - 60, None, 120.0, None), (epoch, None, 50.0, None)])
+        response = self.client.post('/api/ingest/binary/', body, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['config']['report_interval'], 60)
+
+    def test_config_endpoint_requires_device_key(self):
+        self.assertEqual(self.client.get('/api/device/config/').status_code, 401)
+        key = issue_key(self.sensor)
+        Sensor.objects.filter(pk=self.sensor.pk).update(alert_level='warning')
+        response = self.client.get('/api/device/config/', HTTP_AUTHORIZATION=f'Device {key}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'report_interval': 300, 'alert_level': 'warning'})
+        self.assertEqual(self.client.get('/api/device/config/', HTTP_X_API_KEY='salah.key').status_code, 401)
+
+
+# ========== user-048: rate limit & load shedding ==========
+
+class RateLimitTests(MonitoringTestCase):
+
+    def test_gcra_is_token_bucket(self):
+        tat, now = None, 100.0
+        for _ in range(3):
+            tat, retry_after = gcra(tat, now, rate=1.0, burst=3)
+            self.assertEqual(retry_after, 0.0)
+        self.assertEqual(gcra(tat, now, rate=1.0, burst=3), (None, 1.0))
+        # Satu token kembali setiap 1/rate detik
+        self.assertEqual(gcra(tat, now + 1.0, rate=1.0, burst=3), (104.0, 0.0))
+        self.assertEqual(gcra(tat, now + 0.5, rate=1.0, burst=3, cost=2)[1], 1.5)
+
+    def test_local_backend_is_bounded(self):
+        backend = LocalBackend(max_keys=2)
+        for key in ('a', 'b', 'c'):
+            backend.take(key, 1.0, 1)
+        self.assertEqual(list(backend._tats), ['b', 'c'])
+        self.assertGreater(backend.take('c', 1.0, 1), 0)
+        self.assertEqual(backend.take('a', 1.0, 1), 0.0)
+
+    @override_settings(INGEST_RATE_LIMIT=1.0, INGEST_RATE_BURST=2, INGEST_RATE_BACKEND='cache',
+                       CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                           'LOCATION': 'ratelimit-test'}})
+    def test_cache_backend_shared_between_limiters(self):
+        first, second = DeviceRateLimiter(), DeviceRateLimiter()
+        first.check('SRF001')
+        second.check('SRF001')
+        with self.assertRaises(RateLimited):
+            first.check('SRF001')
+        second.check('SRF002')
+
+    @override_settings(INGEST_RATE_LIMIT=10.0, INGEST_RATE_BURST=2, INGEST_RATE_WORKERS=4)
+    def test_workers_split_local_rate(self):
+        device_limiter.check('SRF001')
+        device_limiter.check('SRF001')
+        with self.assertRaises(RateLimited) as raised:
+            device_limiter.check('SRF001')
+        self.assertAlmostEqual(raised.exception.retry_after, 1 / 2.5, places=2)
+
+    def test_admission_queue_sheds_load(self):
+        queue = AdmissionQueue(max_concurrent=1, max_queue=0, timeout=0.01)
+        with queue.slot():
+            with self.assertRaises(RateLimited) as raised:
+                with queue.slot():
+                    pass
+            self.assertEqual(raised.exception.reason, 'overload')
+        self.assertEqual(queue.active, 0)
+
+        queue = AdmissionQueue(max_concurrent=1, max_queue=1, timeout=0.01)
+        with queue.slot():
+            with self.assertRaises(RateLimited):
+                with queue.slot():
+                    pass
+        self.assertEqual((queue.active, queue.waiting), (0, 0))
+
+    @override_settings(INGEST_RATE_LIMIT=1.0, INGEST_RATE_BURST=2)
+    def test_ingest_returns_429_with_retry_after(self):
+        Sensor.objects.create(identifier='LIM001', name='Limit')
+        responses = [
+            self.client.post('/api/ingest/', {'sensor_id': 'LIM001', 'distance': 100.0,
+                                              'timestamp': self.minutes_ago(i).isoformat()},
+                             content_type='application/json')
+            for i in (3, 2, 1)
+        ]
+        self.assertEqual([response.status_code for response in responses], [201, 201, 429])
+        self.assertEqual(responses[2]['Retry-After'], '1')
+        self.assertEqual(responses[2].json()['retry_after'], 1)
+
+    @override_settings(INGEST_RATE_LIMIT=1.0, INGEST_RATE_BURST=2)
+    def test_malformed_binary_is_limited_per_address_without_queue_slot(self):
+        with mock.patch.object(ingest_queue, 'slot') as slot:
+            codes = [self.client.post('/api/ingest/binary/', b'rusak', content_type='application/octet-stream',
+                                      REMOTE_ADDR='10.0.0.9').status_code for _ in range(3)]
+            self.assertFalse(slot.called)
+        self.assertEqual(codes, [400, 400, 429])
+        # Alamat lain punya bucket sendiri
+        response = self.client.post('/api/ingest/binary/', b'rusak', content_type='application/octet-stream',
+                                    REMOTE_ADDR='10.0.0.10')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(INGEST_RATE_LIMIT=1.0, INGEST_RATE_BURST=1)
+    def test_json_without_sensor_is_limited_per_address(self):
+        codes = [self.client.post('/api/ingest/', {'distance': 1.0}, content_type='application/json').status_code
+                 for _ in range(2)]
+        self.assertEqual(codes, [400, 429])
+
+    @override_settings(INGEST_MAX_CONCURRENT=1, INGEST_MAX_QUEUE=0)
+    def test_overload_returns_429(self):
+        Sensor.objects.create(identifier='LIM002', name='Limit')
+        with ingest_queue.slot():
+            response = self.client.post('/api/ingest/', {'sensor_id': 'LIM002', 'distance': 100.0},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+# ========== user-049: API key perangkat ==========
+
+class ApiKeyTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = Sensor.objects.create(identifier='KEY001', name='Key')
+
+    def ingest(self, sensor_id='KEY001', **headers):
+        return self.client.post('/api/ingest/', {'sensor_id': sensor_id, 'distance': 100.0},
+                                content_type='application/json', **headers)
+
+    def test_issue_key_stores_only_prefix_and_hash(self):
+        key = issue_key(self.sensor)
+        stored = SensorApiKey.objects.get(sensor=self.sensor)
+        self.assertEqual(stored.prefix, key_prefix(key))
+        self.assertEqual(len(stored.prefix), 8)
+        self.assertEqual(stored.key_hash, hash_key(key))
+        self.assertNotIn(key.split('.', 1)[1], stored.key_hash)
+        self.assertEqual(verify_key(key).identifier, 'KEY001')
+        self.assertIsNone(verify_key(key + 'x'))
+        self.assertIsNone(verify_key(''))
+
+    def test_rotation_keeps_old_key_until_overlap_ends(self):
+        old = issue_key(self.sensor)
+        now = timezone.now()
+        new = issue_key(self.sensor, overlap=timedelta(hours=1), now=now)
+        self.assertIsNotNone(verify_key(old, now=now + timedelta(minutes=59)))
+        self.assertIsNone(verify_key(old, now=now + timedelta(hours=2)))
+        self.assertIsNotNone(verify_key(new, now=now + timedelta(hours=2)))
+
+    def test_rotation_without_overlap_revokes_cached_key(self):
+        old = issue_key(self.sensor)
+        self.assertIsNotNone(verify_key(old))
+        issue_key(self.sensor, overlap=timedelta(0))
+        self.assertIsNone(verify_key(old))
+
+    def test_generation_bump_from_other_process_clears_local_cache(self):
+        key = issue_key(self.sensor)
+        self.assertIsNotNone(verify_key(key))
+        # update() tanpa signal: LRU proses ini masih memakai hasil lama
+        SensorApiKey.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertIsNotNone(verify_key(key))
+        # Proses lain (mis. rotate_api_key) menaikkan generasi di cache bersama
+        cache.incr(GENERATION_KEY)
+        self.assertIsNone(verify_key(key))
+
+    def test_deactivating_sensor_revokes_key(self):
+        key = issue_key(self.sensor)
+        self.assertIsNotNone(verify_key(key))
+        self.sensor.is_active = False
+        self.sensor.save()
+        self.assertIsNone(verify_key(key))
+
+    def test_ingest_accepts_both_headers(self):
+        key = issue_key(self.sensor)
+        self.assertEqual(self.ingest(HTTP_AUTHORIZATION=f'Device {key}').status_code, 201)
+        self.assertEqual(self.ingest(sensor_id='', HTTP_X_API_KEY=key).status_code, 201)
+        self.assertEqual(Reading.objects.filter(sensor=self.sensor).count(), 2)
+
+    def test_invalid_key_is_401(self):
+        issue_key(self.sensor)
+        self.assertEqual(self.ingest(HTTP_X_API_KEY='deadbeef.salah').status_code, 401)
+        self.assertEqual(self.ingest(HTTP_AUTHORIZATION='Device a b').status_code, 401)
+
+    def test_key_for_other_sensor_is_403(self):
+        Sensor.objects.create(identifier='KEY002', name='Lain')
+        key = issue_key(self.sensor)
+        self.assertEqual(self.ingest(sensor_id='KEY002', HTTP_X_API_KEY=key).status_code, 403)
+        self.assertFalse(Reading.objects.exists())
+
+    def test_require_api_key(self):
+        key = issue_key(self.sensor)
+        self.assertEqual(self.ingest().status_code, 201)
+        with override_settings(INGEST_REQUIRE_API_KEY=True):
+            self.assertEqual(self.ingest().status_code, 401)
+            response = self.client.post('/api/ingest/binary/', pack_readings('KEY001', [(1760000000, 1.0, 100.0, 90.0)]),
+                                        content_type='application/octet-stream')
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(self.ingest(HTTP_X_API_KEY=key).status_code, 201)
+
+    def test_rotate_command(self):
+        old = issue_key(self.sensor)
+        out = StringIO()
+        call_command('rotate_api_key', 'KEY001', '--overlap-hours', '0', stdout=out)
+        new = out.getvalue().splitlines()[0]
+        self.assertIn('old keys expire at', out.getvalue())
+        self.assertIsNone(verify_key(old))
+        self.assertEqual(verify_key(new).identifier, 'KEY001')
+
+        call_command('rotate_api_key', 'KEY001', '--keep-old', stdout=StringIO())
+        self.assertIsNotNone(verify_key(new))
+        with self.assertRaises(CommandError):
+            call_command('rotate_api_key', 'TIDAKADA', stdout=StringIO())
+
+
+class ListenerApiKeyTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = Sensor.objects.create(identifier='KEY001', name='Key')
+        Sensor.objects.create(identifier='KEY002', name='Lain')
+        self.key = issue_key(self.sensor)
+
+    def write(self, payload):
+        rows, api_key = decode_payload(payload)
+        return BatchWriter._write([(api_key, row) for row in rows])
+
+    @override_settings(INGEST_REQUIRE_API_KEY=True)
+    def test_packets_without_key_are_dropped_when_required(self):
+        writer = BatchWriter()
+        self.addCleanup(writer.executor.shutdown)
+        protocol = UDPIngestProtocol(writer)
+
+        protocol.datagram_received(pack_readings('KEY001', [(1760000000, 1.0, 100.0, 90.0)]), ('127.0.0.1', 5683))
+        protocol.datagram_received(b'{"sensor_id": "KEY001", "distance": 100}', ('127.0.0.1', 5683))
+        self.assertEqual(writer.stats['unauthorized'], 2)
+        self.assertEqual(writer.pending, [])
+
+        protocol.datagram_received(f'{{"distance": 100, "api_key": "{self.key}"}}'.encode(), ('127.0.0.1', 5683))
+        self.assertEqual(writer.pending[0][0], self.key)
+
+    def test_key_fills_identifier(self):
+        self.assertEqual(self.write(f'{{"distance": 100, "api_key": "{self.key}"}}'.encode()), (1, 0, 0))
+        self.assertEqual(Reading.objects.get().sensor, self.sensor)
+
+    def test_wrong_key_and_other_sensor_are_unauthorized(self):
+        with self.assertLogs('monitoring.listener', 'WARNING'):
+            result = self.write(b'{"sensor_id": "KEY001", "distance": 100, "api_key": "deadbeef.salah"}')
+        self.assertEqual(result, (0, 0, 1))
+        with self.assertLogs('monitoring.listener', 'WARNING'):
+            result = self.write(f'{{"sensor_id": "KEY002", "distance": 100, "api_key": "{self.key}"}}'.encode())
+        self.assertEqual(result, (0, 0, 1))
+        self.assertFalse(Reading.objects.exists())
+
+
+# ========== user-050: kolom raw yang dipromosikan ==========
+
+class PromotedFieldsTests(MonitoringTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = Sensor.objects.create(identifier='RAW001', name='Raw')
+
+    def reading(self, minutes, raw, **values):
+        return Reading(sensor=self.sensor, timestamp=self.minutes_ago(minutes), distance=100.0, raw=raw, **values)
+
+    def test_promote_raw_moves_valid_keys(self):
+        reading = self.reading(1, {'temperature': '28.5', 'humidity': 80, 'ph': 7.1})
+        self.assertTrue(promote_raw(reading))
+        self.assertEqual((reading.temperature, reading.humidity), (28.5, 80.0))
+        self.assertEqual(reading.raw, {'ph': 7.1})
+
+        reading = self.reading(1, {'temperature': 30})
+        promote_raw(reading)
+        self.assertIsNone(reading.raw)
+
+    def test_invalid_values_stay_in_raw(self):
+        reading = self.reading(1, {'temperature': 'panas', 'humidity': 150})
+        self.assertFalse(promote_raw(reading))
+        self.assertEqual(reading.raw, {'temperature': 'panas', 'humidity': 150})
+        self.assertIsNone(reading.temperature)
+        self.assertFalse(promote_raw(self.reading(1, None)))
+
+    @override_settings(RAW_PROMOTED_FIELDS={'suhu': 'temperature', 'jarak': 'distance'})
+    def test_mapping_only_targets_promotable_columns(self):
+        self.assertEqual(promoted_fields(), {'suhu': 'temperature'})
+        reading = self.reading(1, {'suhu': 27, 'jarak': 5})
+        promote_raw(reading)
+        self.assertEqual(reading.temperature, 27.0)
+        self.assertEqual(reading.raw, {'jarak': 5})
+
+    def test_ingest_promotes_raw(self):
+        response = self.client.post('/api/ingest/', {'sensor_id': 'RAW001', 'distance': 100.0,
+                                                     'raw': {'temperature': 29, 'ph': 7}},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        reading = Reading.objects.get()
+        self.assertEqual(reading.temperature, 29.0)
+        self.assertEqual(reading.raw, {'ph': 7})
+
+    def test_command_promotes_historical_readings(self):
+        Reading.objects.bulk_create([
+            self.reading(3, {'temperature': 26, 'humidity': 70}),
+            self.reading(2, {'temperature': 'rusak'}),
+            self.reading(1, None),
+        ])
+        out = StringIO()
+        call_command('promote_raw_fields', '--chunk-size', '1', stdout=out)
+        self.assertIn('on 1 of 2 readings', out.getvalue())
+        first, second, _ = Reading.objects.order_by('timestamp')
+        self.assertEqual((first.temperature, first.humidity, first.raw), (26.0, 70.0, None))
+        self.assertEqual(second.raw, {'temperature': 'rusak'})
+
+    @override_settings(RAW_PROMOTED_FIELDS={'jarak': 'distance'})
+    def test_command_without_usable_columns(self):
+        out = StringIO()
+        call_command('promote_raw_fields', stdout=out)
+        self.assertIn('no usable columns', out.getvalue())
+
+    def test_readings_api_filters_and_include_raw(self):
+        Reading.objects.bulk_create([
+            self.reading(3, {'ph': 7}, temperature=25, humidity=90),
+            self.reading(2, None, temperature=30, humidity=60),
+            self.reading(1, None, temperature=32, humidity=80),
+        ])
+        response = self.client.get('/api/readings/', {'temperature__gt': 29, 'humidity__lte': 70})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['temperature'] for row in response.json()], [30.0])
+        self.assertNotIn('raw', response.json()[0])
+
+        response = self.client.get(f'/api/sensors/{self.sensor.pk}/readings/',
+                                   {'include_raw': '1', 'temperature__lt': 26})
+        self.assertEqual(response.json()[0]['raw'], {'ph': 7})
+
+        # Parameter lain (mis. kolom raw atau lookup tak dikenal) diabaikan
+        response = self.client.get('/api/readings/', {'ph__gt': 1, 'temperature__in': 'x'})
+        self.assertEqual(len(response.json()), 3)
+        response = self.client.get('/api/readings/', {'temperature__gte': 'panas'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('temperature__gte', response.json())
@@ -5,6 +5,18 @@ urlpatterns = [
     path('sensors/', views.SensorListCreate.as_view(), name='sensor-list'),
     path('sensors/<int:pk>/', views.SensorDetail.as_view(), name='sensor-detail'),
     path('sensors/<int:sensor_id>/readings/', views.ReadingBySensor.as_view(), name='sensor-readings'),
+    path('sensors/<int:sensor_id>/episodes/', views.AlertEpisodeBySensor.as_view(), name='sensor-episodes'),
+    path('sensors/<int:sensor_id>/volume/', views.sensor_volume, name='sensor-volume'),
+    path('groups/', views.SensorGroupListCreate.as_view(), name='group-list'),
+    path('groups/<int:pk>/', views.SensorGroupDetail.as_view(), name='group-detail'),
+    path('subscriptions/', views.AlertSubscriptionListCreate.as_view(), name='subscription-list'),
+    path('subscriptions/<int:pk>/', views.AlertSubscriptionDetail.as_view(), name='subscription-detail'),
     path('readings/', views.ReadingList.as_view(), name='reading-list'),
+    path('compare/', views.compare_sensors, name='compare'),
+    path('map/', views.sensor_map, name='sensor-map'),
+    path('map/nearest/', views.sensor_nearest, name='sensor-nearest'),
     path('ingest/', views.ingest_reading, name='ingest'),
+    path('ingest/binary/', views.ingest_binary_reading, name='ingest-binary'),
+    path('device/config/', views.device_config, name='device-config'),
+    path('perf/', views.performance_stats, name='performance-stats'),
 ]
@@ -1,47 +1,466 @@
 from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.utils.dateparse import parse_datetime
-from .models import Sensor, Reading
-from .serializers import SensorSerializer, ReadingSerializer
+from django.utils import timezone
+from datetime import timedelta
+from django.db.models import Q
+from .models import Sensor, SensorGroup, Reading, AlertEpisode, AlertSubscription
+from .serializers import (
+    SensorSerializer, SensorGroupSerializer, ReadingSerializer, AlertEpisodeSerializer, AlertSubscriptionSerializer,
+    include_raw,
+)
+from .ingest import (
+    IngestError, clean_identifier, resolve_sensor, build_reading, save_readings, ingest_binary, unpack_readings,
+)
 from django.shortcuts import get_object_or_404
+from .log_handlers import request_extra
+from . import middleware, metrics, resample, volume
+from .spatial import MAX_ZOOM, spatial_index, current_levels
+from .devices import device_configs
+from .ratelimit import RateLimited, device_limiter, ingest_queue
+from .authentication import DeviceIngestPermission, DeviceKeyAuthentication, device_identifier
+from django.http import HttpResponse
+from django.conf import settings
+import numpy as np
+import logging
+import math
+
+logger = logging.getLogger(__name__)
 
 class SensorListCreate(generics.ListCreateAPIView):
-    queryset = Sensor.objects.all()
+    queryset = Sensor.objects.select_related('forecast')
     serializer_class = SensorSerializer
 
 class SensorDetail(generics.RetrieveUpdateAPIView):
-    queryset = Sensor.objects.all()
+    queryset = Sensor.objects.select_related('forecast')
     serializer_class = SensorSerializer
 
+class SensorGroupListCreate(generics.ListCreateAPIView):
+    """Grup sensor beserta agregat subtree (?parent=<id> atau ?parent=root)"""
+    serializer_class = SensorGroupSerializer
+    def get_queryset(self):
+        groups = SensorGroup.objects.all()
+        parent = self.request.GET.get('parent')
+        if parent == 'root':
+            groups = groups.filter(parent__isnull=True)
+        elif parent:
+            groups = groups.filter(parent_id=parent)
+        return groups
+
+class SensorGroupDetail(generics.RetrieveUpdateAPIView):
+    queryset = SensorGroup.objects.all()
+    serializer_class = SensorGroupSerializer
+
+READING_FILTER_FIELDS = ('distance', 'flow_rate', 'water_level', 'battery', 'temperature', 'humidity')
+READING_FILTER_LOOKUPS = ('gt', 'gte', 'lt', 'lte')
+
+def filter_readings(request, readings):
+    """
+    Filter kolom numerik (?temperature__gte=30&humidity__lt=80); kolom raw
+    tidak dimuat dari database kecuali ?include_raw=1
+    """
+    for name, value in request.GET.items():
+        field, _, lookup = name.partition('__')
+        if field in READING_FILTER_FIELDS and lookup in READING_FILTER_LOOKUPS:
+            try:
+                readings = readings.filter(**{name: float(value)})
+            except ValueError:
+                raise ValidationError({name: 'harus angka'})
+    if not include_raw(request):
+        readings = readings.defer('raw')
+    return readings
+
 class ReadingList(generics.ListAPIView):
-    queryset = Reading.objects.all()
     serializer_class = ReadingSerializer
+    def get_queryset(self):
+        return filter_readings(self.request, Reading.objects.all())
 
 class ReadingBySensor(generics.ListAPIView):
+    """Reading terbaru sensor; dengan ?interval= (menit) dikembalikan sebagai grid reguler"""
     serializer_class = ReadingSerializer
     def get_queryset(self):
         sensor_id = self.kwargs['sensor_id']
         limit = int(self.request.GET.get('limit', 100))
-        return Reading.objects.filter(sensor__id=sensor_id).order_by('-timestamp')[:limit]
+        readings = filter_readings(self.request, Reading.objects.filter(sensor__id=sensor_id))
+        return readings.order_by('-timestamp')[:limit]
+    
+    def list(self, request, *args, **kwargs):
+        if 'interval' not in request.GET:
+            return super().list(request, *args, **kwargs)
+        sensor = get_object_or_404(Sensor, pk=self.kwargs['sensor_id'])
+        return resampled_response(request, [sensor])
+
+def _parse_datetime(value):
+    """
+    Datetime ISO 8601 dari query string; None kalau kosong
+
+    Raises:
+        ValueError: format salah atau tanggal tidak ada (mis. bulan 13)
+    """
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError('harus tanggal ISO 8601')
+    return parsed
+
+def _resample_params(request, interval_param):
+    """(start, end, interval detik, how, fill, limit) dari query string; default 24 jam terakhir"""
+    try:
+        end = _parse_datetime(request.GET.get('end')) or timezone.now()
+        start = _parse_datetime(request.GET.get('start')) or end - timedelta(hours=24)
+        valid = start.tzinfo is not None and end.tzinfo is not None and start < end
+    except ValueError:
+        valid = False
+    if not valid:
+        raise resample.ResampleError('start/end harus ISO 8601 dengan zona waktu dan start < end')
+    interval, how, fill, limit = resample.parse_params(
+        request.GET.get(interval_param), request.GET.get('how', 'mean'),
+        request.GET.get('fill', 'nan'), request.GET.get('limit'),
+    )
+    return start, end, interval, how, fill, limit
+
+def resampled_response(request, sensors):
+    """
+    Response grid reguler untuk beberapa sensor dari query string:
+    ?interval= (menit), ?field= (bisa berulang), ?how=, ?fill=, ?limit=,
+    ?start=/?end= (default 24 jam terakhir), ?export=csv
+    """
+    fields = request.GET.getlist('field') or ['distance']
+    try:
+        start, end, interval, how, fill, limit = _resample_params(request, 'interval')
+        series = resample.resample([s.pk for s in sensors], start, end, interval, fields, how, fill, limit)
+    except resample.ResampleError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if request.GET.get('export') == 'csv':
+        from sungai_monitor.utils import export_resampled_to_csv
+        response = HttpResponse(export_resampled_to_csv(series, sensors, fields), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="readings_resampled.csv"'
+        return response
+    
+    return Response({
+        'interval': interval // 60,
+        'how': how,
+        'fill': fill,
+        'limit': limit,
+        'timestamps': series.timestamps(),
+        'sensors': [
+            {
+                'id': sensor.pk,
+                'identifier': sensor.identifier,
+                'counts': series.counts[i].tolist(),
+                **{field: series.column(field, sensor.pk) for field in fields},
+            }
+            for i, sensor in enumerate(sensors)
+        ],
+    })
+
+EPISODE_LIMIT_MAX = 1000
+
+class AlertEpisodeBySensor(generics.ListAPIView):
+    """Riwayat episode alert sensor, terbaru dulu (?level=, ?start=, ?end=, ?limit= maks 1000)"""
+    serializer_class = AlertEpisodeSerializer
+    def get_queryset(self):
+        params = {}
+        for name in ('start', 'end'):
+            try:
+                params[name] = _parse_datetime(self.request.GET.get(name))
+            except ValueError as e:
+                raise ValidationError({name: str(e)})
+        try:
+            limit = int(self.request.GET.get('limit', 100))
+        except ValueError:
+            raise ValidationError({'limit': 'harus bilangan bulat'})
+        if limit < 1:
+            raise ValidationError({'limit': 'minimal 1'})
+
+        episodes = AlertEpisode.objects.filter(sensor__id=self.kwargs['sensor_id'])
+        if self.request.GET.get('level'):
+            episodes = episodes.filter(level=self.request.GET['level'])
+        if params['start'] is not None:
+            episodes = episodes.filter(Q(ended_at__isnull=True) | Q(ended_at__gt=params['start']))
+        if params['end'] is not None:
+            episodes = episodes.filter(started_at__lte=params['end'])
+        return episodes.order_by('-started_at')[:min(limit, EPISODE_LIMIT_MAX)]
+
+class AlertSubscriptionListCreate(generics.ListCreateAPIView):
+    """Langganan alert user yang login (per sensor, per grup, atau semua sensor)"""
+    serializer_class = AlertSubscriptionSerializer
+    permission_classes = [IsAuthenticated]
+    def get_queryset(self):
+        return AlertSubscription.objects.filter(user=self.request.user)
+    
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+class AlertSubscriptionDetail(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = AlertSubscriptionSerializer
+    permission_classes = [IsAuthenticated]
+    def get_queryset(self):
+        return AlertSubscription.objects.filter(user=self.request.user)
+
+def _rate_limited(request, error):
+    metrics.INGEST_RATE_LIMITED.inc(reason=error.reason)
+    logger.warning("Ingest dibatasi: %s", error, extra=request_extra(request))
+    retry_after = max(1, math.ceil(error.retry_after))
+    return Response(
+        {'error': str(error), 'retry_after': retry_after},
+        status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': str(retry_after)},
+    )
+
+def _ingest_rejected(request, error, identifier=None):
+    logger.warning("Ingest ditolak: %s", error, extra=request_extra(request, sensor_id=identifier))
+    return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+def _limit_key(request, identifier):
+    """Key rate limit: identifier sensor, atau alamat klien kalau request tidak menyebut sensor"""
+    return identifier or f"addr:{request.META.get('REMOTE_ADDR') or 'unknown'}"
 
 @api_view(['POST'])
+@authentication_classes([DeviceKeyAuthentication])
+@permission_classes([DeviceIngestPermission])
 def ingest_reading(request):
     """Ingest sensor readings from IoT devices"""
+    with metrics.INGEST_LATENCY.time(protocol='json'):
+        try:
+            if not isinstance(request.data, dict):
+                raise IngestError("payload harus objek JSON")
+            claimed = clean_identifier(request.data.get('sensor_id'))
+        except IngestError as e:
+            return _ingest_rejected(request, e)
+        identifier = device_identifier(request, claimed)
+        try:
+            # Batas per perangkat dicek dulu supaya perangkat yang loop tidak memakai slot antrean
+            device_limiter.check(_limit_key(request, identifier))
+            with ingest_queue.slot():
+                return _ingest_reading(request, identifier)
+        except RateLimited as e:
+            return _rate_limited(request, e)
+
+def _ingest_reading(request, identifier):
     data = request.data
     
-    # Get or create sensor
-    sensor, _ = Sensor.objects.get_or_create(
-        sensor_id=data.get('sensor_id'),
-        defaults={'name': data.get('name', f'Sensor {data.get("sensor_id")}')}
-    )
+    try:
+        sensor = resolve_sensor(identifier, name=data.get('name'))
+        reading = build_reading(
+            sensor,
+            timestamp=data.get('timestamp'),
+            flow_rate=data.get('flow_rate'),
+            distance=data.get('distance'),
+            battery=data.get('battery'),
+            raw=data.get('raw'),
+            sequence=data.get('seq'),
+        )
+    except IngestError as e:
+        return _ingest_rejected(request, e, identifier)
     
-    # Create reading
-    reading = Reading.objects.create(
-        sensor=sensor,
-        value=data.get('value'),
-        timestamp=parse_datetime(data.get('timestamp')) if data.get('timestamp') else None
-    )
+    if not save_readings([reading]):
+        # Retry dari perangkat: sudah tersimpan sebelumnya
+        return Response({'duplicate': True, 'config': device_configs.for_sensor(sensor.pk)}, status=status.HTTP_200_OK)
     
+    logger.info("Reading %s diterima (%s)", sensor.identifier, reading.alert_level, extra=request_extra(request))
     serializer = ReadingSerializer(reading)
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
+    # Interval lapor berikutnya ikut dikirim supaya perangkat tidak perlu request lagi
+    config = device_configs.update(sensor.pk, reading.alert_level, reading.timestamp)
+    return Response({**serializer.data, 'config': config}, status=status.HTTP_201_CREATED)
+
+@api_view(['POST'])
+@authentication_classes([DeviceKeyAuthentication])
+@permission_classes([DeviceIngestPermission])
+def ingest_binary_reading(request):
+    """Ingest paket biner (lihat monitoring.ingest) dari perangkat hemat kuota"""
+    with metrics.INGEST_LATENCY.time(protocol='binary'):
+        try:
+            identifier = unpack_readings(request.body)[0]
+        except IngestError as e:
+            identifier, error = None, e
+        else:
+            error = None
+            device_identifier(request, identifier)
+        try:
+            # Paket rusak tetap dibatasi (per alamat klien) tapi ditolak tanpa mengambil slot antrean
+            device_limiter.check(_limit_key(request, identifier))
+            if error is not None:
+                return _ingest_rejected(request, error)
+            with ingest_queue.slot():
+                return _ingest_binary_reading(request)
+        except RateLimited as e:
+            return _rate_limited(request, e)
+
+def _ingest_binary_reading(request):
+    try:
+        readings = ingest_binary(request.body)
+    except IngestError as e:
+        logger.warning("Ingest biner ditolak: %s", e, extra=request_extra(request))
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    logger.info("%d reading biner diterima", len(readings), extra=request_extra(request))
+    if readings:
+        latest = max(readings, key=lambda r: r.timestamp)
+        config = device_configs.update(latest.sensor_id, latest.alert_level, latest.timestamp)
+    else:
+        config = device_configs.for_sensor(resolve_sensor(unpack_readings(request.body)[0]).pk)
+    return Response({'accepted': len(readings), 'config': config}, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@authentication_classes([DeviceKeyAuthentication])
+@permission_classes([IsAuthenticated])
+def device_config(request):
+    """
+    Konfigurasi perangkat (interval lapor adaptif) untuk sensor pemilik
+    API key; key dan config dijawab dari cache tanpa query
+    """
+    return Response(device_configs.for_sensor(request.user.sensor_id))
+
+@api_view(['GET'])
+def compare_sensors(request):
+    """
+    Matriks waktu x sensor pada grid yang sama untuk membandingkan stasiun
+    (mis. hulu vs hilir): ?sensors=SRF001,SRF003 (identifier atau id),
+    ?field=, ?step= (menit), ?how=, ?fill=, ?limit=, ?start=/?end=,
+    ?max_lag= (menit) untuk korelasi lag terhadap sensor pertama
+    """
+    tokens = [t.strip() for value in request.GET.getlist('sensors') for t in value.split(',') if t.strip()]
+    max_sensors = getattr(settings, 'COMPARE_MAX_SENSORS', 20)
+    if not 2 <= len(tokens) <= max_sensors:
+        return Response({'error': f'sensors harus berisi 2 sampai {max_sensors} sensor'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    found = Sensor.objects.filter(
+        Q(identifier__in=tokens) | Q(pk__in=[int(t) for t in tokens if t.isdigit()])
+    )
+    lookup = {}
+    for sensor in found:
+        lookup[sensor.identifier] = lookup[str(sensor.pk)] = sensor
+    missing = [t for t in tokens if t not in lookup]
+    if missing:
+        return Response({'error': f"sensor tidak ditemukan: {', '.join(missing)}"}, status=status.HTTP_404_NOT_FOUND)
+    sensors = list({lookup[t].pk: lookup[t] for t in tokens}.values())
+    
+    field = request.GET.get('field', 'distance')
+    try:
+        start, end, interval, how, fill, limit = _resample_params(request, 'step')
+        max_lag = request.GET.get('max_lag') or '0'
+        if not max_lag.isdigit():
+            raise resample.ResampleError('max_lag harus bilangan bulat (menit)')
+        max_lag = int(max_lag)
+        # Satu query untuk semua sensor
+        series = resample.resample([s.pk for s in sensors], start, end, interval, (field,), how, fill, limit,
+                                   chunk_sensors=len(sensors))
+    except resample.ResampleError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    matrix = series.values[field].T
+    data = {
+        'field': field,
+        'step': interval // 60,
+        'how': how,
+        'fill': fill,
+        'sensors': [{'id': s.pk, 'identifier': s.identifier, 'name': s.name} for s in sensors],
+        'timestamps': series.timestamps(),
+        'values': np.where(np.isnan(matrix), None, matrix).tolist(),
+    }
+    if max_lag > 0:
+        lags, correlation, samples = resample.lag_correlation(
+            series.values[field][0], series.values[field][1:], max_lag * 60 // interval
+        )
+        pairs = []
+        for sensor, r, n in zip(sensors[1:], correlation, samples):
+            best = None if np.all(np.isnan(r)) else int(np.nanargmax(r))
+            pairs.append({
+                'sensor': sensor.pk,
+                'lag_minutes': None if best is None else int(lags[best]) * interval // 60,
+                'correlation': None if best is None else float(r[best]),
+                'samples': None if best is None else int(n[best]),
+                'curve': [[int(lag) * interval // 60, None if np.isnan(value) else float(value)]
+                          for lag, value in zip(lags, r)],
+            })
+        data['lag_correlation'] = {'reference': sensors[0].pk, 'pairs': pairs}
+    return Response(data)
+
+def _float_params(request, names):
+    try:
+        return [float(request.GET[name]) for name in names]
+    except (KeyError, ValueError):
+        raise ValueError(f"{', '.join(names)} wajib diisi sebagai angka")
+
+@api_view(['GET'])
+def sensor_map(request):
+    """
+    Marker peta dari indeks spasial: ?bbox=west,south,east,north (default
+    seluruh dunia), ?zoom= (0-22; di bawah SPATIAL_CLUSTER_MAX_ZOOM sensor
+    digabung menjadi cluster dengan alert_level terburuk)
+    """
+    bbox = request.GET.get('bbox', '-180,-90,180,90')
+    try:
+        west, south, east, north = (float(value) for value in bbox.split(','))
+        zoom = int(request.GET['zoom']) if request.GET.get('zoom') else None
+    except ValueError:
+        return Response({'error': 'bbox harus west,south,east,north dan zoom bilangan bulat'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if west > east or south > north:
+        return Response({'error': 'bbox tidak valid'}, status=status.HTTP_400_BAD_REQUEST)
+    if zoom is not None and not 0 <= zoom <= MAX_ZOOM:
+        return Response({'error': f'zoom harus 0-{MAX_ZOOM}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    indices = spatial_index.bbox(south, west, north, east)
+    levels = current_levels()
+    if zoom is not None and zoom < getattr(settings, 'SPATIAL_CLUSTER_MAX_ZOOM', 13):
+        clusters, sensors = spatial_index.cluster(indices, zoom, levels)
+    else:
+        clusters, sensors = [], spatial_index.markers(indices, levels)
+    return Response({'total': len(indices), 'clusters': clusters, 'sensors': sensors})
+
+@api_view(['GET'])
+def sensor_nearest(request):
+    """N sensor terdekat dari ?lat=&lon= (?n=, default 5, maks 100) beserta jarak km"""
+    try:
+        lat, lon = _float_params(request, ('lat', 'lon'))
+        n = int(request.GET.get('n', 5))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or not 1 <= n <= 100:
+        return Response({'error': 'lat/lon di luar jangkauan atau n bukan 1-100'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    indices, distances = spatial_index.nearest(lat, lon, n)
+    sensors = spatial_index.markers(indices, current_levels())
+    for sensor, distance in zip(sensors, distances):
+        sensor['distance_km'] = round(float(distance), 3)
+    return Response({'sensors': sensors})
+
+@api_view(['GET'])
+def sensor_volume(request, sensor_id):
+    """Volume aliran (m³) antara ?start= dan ?end= (ISO 8601) dari indeks kumulatif"""
+    sensor = get_object_or_404(Sensor, pk=sensor_id)
+    start = parse_datetime(request.GET.get('start', ''))
+    end = parse_datetime(request.GET.get('end', ''))
+    if start is None or end is None or start.tzinfo is None or end.tzinfo is None:
+        return Response({'error': 'start dan end wajib diisi dalam format ISO 8601 dengan zona waktu'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if end < start:
+        return Response({'error': 'end harus setelah start'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'sensor': sensor.pk,
+        'start': start,
+        'end': end,
+        'volume_m3': volume.range_volume(sensor.pk, start, end),
+    })
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def performance_stats(request):
+    """Persentil waktu response per view dari PerformanceMiddleware (DELETE untuk reset)"""
+    if request.method == 'DELETE':
+        middleware.stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(middleware.stats.summary())
+
+def metrics_view(request):
+    """Endpoint scrape Prometheus; hanya membaca agregat di memori/mmap"""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
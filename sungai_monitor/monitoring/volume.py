@@ -0,0 +1,214 @@
+"""
+Indeks volume aliran kumulatif (prefix sum) per sensor.
+
+V(t) adalah integral trapesium flow_m3s dari reading pertama sampai t (m³).
+Nilainya disimpan di setiap batas bucket (VOLUME_BUCKET_MINUTES) sebagai
+VolumeCheckpoint, dan VolumeIndex menyimpan V di reading terakhir.
+
+Volume rentang [T1, T2] = V(T2) - V(T1). V(T) adalah checkpoint terakhir
+<= T ditambah integral reading di dalam bucket itu saja (koreksi tepi), jadi
+biayanya tetap berapa pun panjang rentangnya.
+
+Indeks diperbarui di save_readings:
+    - reading yang datang berurutan hanya menambah checkpoint baru
+    - reading terlambat mengoreksi checkpoint di rentangnya, lalu checkpoint
+      sesudahnya digeser dengan satu UPDATE
+
+Sensor yang sudah punya data sebelum indeks ada perlu dibangun sekali dengan
+`python manage.py rebuild_volume_index`.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateTimeField, F, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Reading, VolumeCheckpoint, VolumeIndex
+
+
+def bucket_seconds():
+    return getattr(settings, 'VOLUME_BUCKET_MINUTES', 60) * 60
+
+
+def _to_datetime(epoch):
+    return datetime.fromtimestamp(float(epoch), tz=dt_timezone.utc)
+
+
+def boundaries(start, end, step):
+    """Batas bucket b (epoch) dengan start < b <= end"""
+    first = (start // step + 1) * step
+    if first > end:
+        return np.empty(0)
+    return np.arange(first, end + 1, step, dtype=float)
+
+
+def cumulative_at(t, q, at):
+    """
+    Integral trapesium q terhadap t dari titik pertama sampai setiap nilai `at`;
+    0 sebelum titik pertama dan konstan sesudah titik terakhir
+
+    Args:
+        t: array epoch terurut naik, q: flow (m³/s), at: array epoch
+    """
+    t = np.asarray(t, dtype=float)
+    q = np.asarray(q, dtype=float)
+    at = np.asarray(at, dtype=float)
+    if len(t) == 0:
+        return np.zeros(len(at))
+    running = np.concatenate(([0.0], np.cumsum((q[1:] + q[:-1]) / 2 * np.diff(t))))
+    index = np.clip(np.searchsorted(t, at, side='right') - 1, 0, len(t) - 1)
+    q_at = np.interp(at, t, q)
+    values = running[index] + (q[index] + q_at) / 2 * (np.minimum(at, t[-1]) - t[index])
+    values[at < t[0]] = 0.0
+    return values
+
+
+def _span_points(sensor_id, start, end):
+    """
+    Reading flow dari reading terakhir sebelum `start` sampai reading pertama
+    sesudah `end` (satu query)
+
+    Returns:
+        tuple (ids, epoch array, flow array)
+    """
+    flow = Reading.objects.filter(sensor_id=sensor_id, flow_m3s__isnull=False)
+    before = flow.filter(timestamp__lt=start).order_by('-timestamp').values('timestamp')[:1]
+    after = flow.filter(timestamp__gt=end).order_by('timestamp').values('timestamp')[:1]
+    rows = list(flow.filter(
+        timestamp__gte=Coalesce(Subquery(before), Value(start, output_field=DateTimeField())),
+        timestamp__lte=Coalesce(Subquery(after), Value(end, output_field=DateTimeField())),
+    ).order_by('timestamp').values_list('id', 'timestamp', 'flow_m3s'))
+    ids = [row[0] for row in rows]
+    t = np.array([row[1].timestamp() for row in rows], dtype=float)
+    q = np.array([row[2] for row in rows], dtype=float)
+    return ids, t, q
+
+
+# ========== UPDATE SAAT INGEST ==========
+
+def update_index(readings):
+    """Perbarui indeks untuk reading yang baru tersimpan (dipanggil di dalam transaksi)"""
+    by_sensor = {}
+    for reading in readings:
+        if reading.flow_m3s is not None:
+            by_sensor.setdefault(reading.sensor_id, []).append(reading)
+    for sensor_id, new in by_sensor.items():
+        _update_sensor(sensor_id, new)
+
+
+def _update_sensor(sensor_id, new):
+    step = bucket_seconds()
+    new_ids = {reading.pk for reading in new}
+    ids, t, q = _span_points(
+        sensor_id, min(r.timestamp for r in new), max(r.timestamp for r in new)
+    )
+    old = np.array([pk not in new_ids for pk in ids], dtype=bool)
+    t_old, q_old = t[old], q[old]
+
+    head = VolumeIndex.objects.select_for_update().filter(sensor_id=sensor_id).first()
+    if head is None and len(t_old):
+        # Data lama belum pernah diindeks; tunggu rebuild_volume_index
+        return
+
+    # Perubahan V(b) = integral dengan reading baru - integral tanpa reading baru
+    span_end = t[-1]
+    bounds = boundaries(t[0], span_end, step)
+    points = np.append(bounds, span_end)
+    delta = cumulative_at(t, q, points) - cumulative_at(t_old, q_old, points)
+    total_delta = float(delta[-1])
+
+    if len(bounds):
+        when = [_to_datetime(b) for b in bounds]
+        existing = dict(
+            VolumeCheckpoint.objects.filter(sensor_id=sensor_id, timestamp__in=when)
+            .values_list('timestamp', 'cumulative')
+        )
+        checkpoints = []
+        for b, timestamp, d in zip(bounds, when, delta[:-1]):
+            if timestamp in existing:
+                value = existing[timestamp] + d
+            elif len(t_old) and b > t_old[-1]:
+                # Setelah reading lama terakhir V lama tidak bertambah lagi
+                value = head.cumulative + d
+            else:
+                value = d
+            checkpoints.append(VolumeCheckpoint(sensor_id=sensor_id, timestamp=timestamp, cumulative=value))
+        VolumeCheckpoint.objects.bulk_create(
+            checkpoints, update_conflicts=True, unique_fields=['sensor', 'timestamp'], update_fields=['cumulative'],
+        )
+
+    span_end_time = _to_datetime(span_end)
+    if head is None:
+        VolumeIndex.objects.create(sensor_id=sensor_id, last_timestamp=span_end_time, cumulative=total_delta)
+        return
+    if head.last_timestamp > span_end_time and total_delta:
+        # Reading terlambat: semua checkpoint sesudah rentang ikut bergeser
+        VolumeCheckpoint.objects.filter(sensor_id=sensor_id, timestamp__gt=span_end_time).update(
+            cumulative=F('cumulative') + total_delta
+        )
+    head.cumulative += total_delta
+    head.last_timestamp = max(head.last_timestamp, span_end_time)
+    head.save(update_fields=['cumulative', 'last_timestamp'])
+
+
+# ========== QUERY ==========
+
+def volume_at(sensor_id, when):
+    """V(when) dalam m³: checkpoint terakhir <= when + integral sisa bucket"""
+    step = bucket_seconds()
+    checkpoint = (
+        VolumeCheckpoint.objects.filter(sensor_id=sensor_id, timestamp__lte=when)
+        .order_by('-timestamp').values_list('timestamp', 'cumulative').first()
+    )
+    if checkpoint is None:
+        epoch = when.timestamp()
+        start, base = _to_datetime(epoch - epoch % step), 0.0
+    else:
+        start, base = checkpoint
+    if start >= when:
+        return base
+    _, t, q = _span_points(sensor_id, start, when)
+    edges = cumulative_at(t, q, [start.timestamp(), when.timestamp()])
+    return base + float(edges[1] - edges[0])
+
+
+def range_volume(sensor_id, start, end):
+    """Volume (m³) yang mengalir antara start dan end"""
+    return volume_at(sensor_id, end) - volume_at(sensor_id, start)
+
+
+# ========== REBUILD ==========
+
+def rebuild(sensor_id, batch_size=5000):
+    """
+    Bangun ulang indeks satu sensor dari seluruh reading (NumPy)
+
+    Returns:
+        int: jumlah checkpoint
+    """
+    rows = Reading.objects.filter(sensor_id=sensor_id, flow_m3s__isnull=False) \
+        .order_by('timestamp').values_list('timestamp', 'flow_m3s')
+    t, q = [], []
+    for timestamp, flow in rows.iterator(chunk_size=10000):
+        t.append(timestamp.timestamp())
+        q.append(flow)
+    t, q = np.array(t, dtype=float), np.array(q, dtype=float)
+
+    with transaction.atomic():
+        VolumeCheckpoint.objects.filter(sensor_id=sensor_id).delete()
+        VolumeIndex.objects.filter(sensor_id=sensor_id).delete()
+        if not len(t):
+            return 0
+        bounds = boundaries(t[0], t[-1], bucket_seconds())
+        values = cumulative_at(t, q, np.append(bounds, t[-1]))
+        VolumeCheckpoint.objects.bulk_create(
+            (VolumeCheckpoint(sensor_id=sensor_id, timestamp=_to_datetime(b), cumulative=float(v))
+             for b, v in zip(bounds, values[:-1])),
+            batch_size=batch_size,
+        )
+        VolumeIndex.objects.create(
+            sensor_id=sensor_id, last_timestamp=_to_datetime(t[-1]), cumulative=float(values[-1])
+        )
+    return len(bounds)
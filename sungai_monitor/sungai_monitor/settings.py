@@ -41,15 +41,114 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'monitoring.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Instrumentasi performa per request (monitoring.middleware.PerformanceMiddleware)
+# 0 = nonaktif, 1.0 = semua request, 0.01 = 1% request (aman untuk production)
+PERF_SAMPLE_RATE = 0.0
+PERF_N_PLUS_ONE_THRESHOLD = 10
+PERF_SERVER_TIMING = True
+
+# Metrik Prometheus (/metrics). Untuk server multi-worker isi dengan direktori
+# yang bisa ditulis semua worker, mis. '/run/sungai_monitor/metrics'
+METRICS_DIR = None
+
+# Profiling on-demand (monitoring.profiling): header X-Profile dari staff/token,
+# view tertentu, management command tertentu, atau sinyal SIGUSR2
+PROFILING_DIR = None  # default: <tempdir>/sungai_profiles
+PROFILING_TOKEN = None
+PROFILING_VIEWS = {}  # mis. {'dashboard': 0.01}
+PROFILING_COMMANDS = []  # mis. ['import_readings']
+PROFILING_MAX_SECONDS = 30
+PROFILING_MAX_BYTES = 1024 * 1024
+PROFILING_INTERVAL = 0.005
+PROFILING_MAX_FILES = 100
+
+# Deteksi laju kenaikan muka air (monitoring.detectors); batas dalam cm/jam,
+# bisa dioverride per sensor dengan SensorThreshold tipe 'rise'
+RISE_WINDOW_SECONDS = 1800
+RISE_MIN_SAMPLES = 3
+RISE_RATE_WARNING = 20.0
+RISE_RATE_DANGER = 40.0
+
+# Prakiraan jangka pendek (monitoring.forecasting), diperbarui oleh
+# `python manage.py update_forecasts` dari cron atau dengan --interval
+FORECAST_HORIZONS = {'1h': 60, '3h': 180}  # nama -> menit
+FORECAST_BUCKET_MINUTES = 15
+FORECAST_TREND_MINUTES = 180
+FORECAST_SEASON_MINUTES = 1440
+
+# Indeks volume aliran kumulatif (monitoring.volume): checkpoint per bucket
+VOLUME_BUCKET_MINUTES = 60
+
+# Batas ukuran grid resampling (sensor x bucket x field) per request, lihat monitoring.resample
+RESAMPLE_MAX_CELLS = 20_000_000
+
+# Jumlah sensor maksimum per request /api/compare/ (semua diambil dalam satu query)
+COMPARE_MAX_SENSORS = 20
+
+# Indeks spasial peta (monitoring.spatial): ukuran sel grid, umur maksimum
+# indeks di proses lain, dan zoom di bawah mana marker digabung jadi cluster
+SPATIAL_CELL_DEGREES = 0.1
+SPATIAL_INDEX_TTL = 300
+SPATIAL_CLUSTER_MAX_ZOOM = 13
+SPATIAL_CLUSTER_PIXELS = 60
+
+# Indeks penerima alert (monitoring.subscriptions) dibangun ulang paling lambat
+# setelah sekian detik supaya perubahan dari proses lain ikut terbaca
+SUBSCRIPTION_INDEX_TTL = 300
+
+# Alert untuk satu penerima dalam jendela ini (detik) digabung jadi satu pesan
+# oleh `python manage.py send_alert_digests --interval 30`; 0 = kirim langsung
+ALERT_DIGEST_WINDOW = 120
+
+# Interval lapor perangkat (detik) per alert_level (monitoring.devices); sensor safe
+# yang naik >= DEVICE_RISING_RATE cm/jam memakai interval warning. Config di cache
+# proses paling lama DEVICE_CONFIG_TTL detik
+DEVICE_REPORT_INTERVALS = {'safe': 900, 'warning': 300, 'danger': 60, 'critical': 60}
+DEVICE_RISING_RATE = 10.0
+DEVICE_CONFIG_TTL = 60
+
+# Batas laju ingest per perangkat (monitoring.ratelimit): token bucket
+# INGEST_RATE_LIMIT request/detik dengan burst INGEST_RATE_BURST (0 = nonaktif).
+# Backend 'local' per proses (bagi dengan INGEST_RATE_WORKERS) atau 'cache'
+# lewat Django cache bersama. Saat overload, request di luar
+# INGEST_MAX_CONCURRENT + INGEST_MAX_QUEUE ditolak 429 dengan Retry-After
+INGEST_RATE_LIMIT = 1.0
+INGEST_RATE_BURST = 10
+INGEST_RATE_BACKEND = 'local'
+INGEST_RATE_WORKERS = 1
+INGEST_MAX_CONCURRENT = 8
+INGEST_MAX_QUEUE = 32
+INGEST_QUEUE_TIMEOUT = 2.0
+
+# API key perangkat (monitoring.authentication) disimpan sebagai HMAC-SHA256
+# dengan API_KEY_SECRET (None = SECRET_KEY; mengganti nilainya membatalkan semua
+# key). Hasil verifikasi di-cache LRU per proses; pencabutan key sampai ke semua
+# worker lewat Django cache bersama (CACHES). Selama INGEST_REQUIRE_API_KEY
+# False, ingest tanpa key masih diterima (key yang dikirim tetap diverifikasi);
+# listener UDP/MQTT membaca key dari field api_key payload JSON
+API_KEY_SECRET = None
+API_KEY_CACHE_SIZE = 10000
+API_KEY_CACHE_TTL = 300
+API_KEY_NEGATIVE_TTL = 30
+API_KEY_ROTATION_OVERLAP_HOURS = 24
+INGEST_REQUIRE_API_KEY = False
+
+# Key Reading.raw yang saat ingest dipindah ke kolom bertipe ber-index
+# (key raw -> kolom Reading, lihat monitoring.ingest.PROMOTABLE_FIELDS).
+# Data lama: python manage.py promote_raw_fields
+RAW_PROMOTED_FIELDS = {'temperature': 'temperature', 'humidity': 'humidity'}
+
 ROOT_URLCONF = 'sungai_monitor.urls'
 
 TEMPLATES = [
@@ -117,6 +216,38 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Logging
+# Log aplikasi disimpan ke tabel SystemLog secara batch (lihat monitoring.log_handlers)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'level': 'WARNING',
+        },
+        'systemlog': {
+            'class': 'monitoring.log_handlers.SystemLogHandler',
+            'level': 'INFO',
+            'batch_size': 200,
+            'flush_interval': 0.5,
+        },
+    },
+    'loggers': {
+        'monitoring': {
+            'handlers': ['console', 'systemlog'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'sungai_monitor': {
+            'handlers': ['console', 'systemlog'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -2,7 +2,7 @@ import os
 import requests
 from django.core.mail import send_mail
 from django.conf import settings
-from django.template.loader import render_to_string
+from django.utils import timezone
 from io import BytesIO
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib import colors
@@ -12,6 +12,7 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.graphics.shapes import Drawing
 from reportlab.graphics.charts.linecharts import HorizontalLineChart
 from datetime import datetime, timedelta
+from monitoring import metrics
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,132 +20,244 @@ logger = logging.getLogger(__name__)
 
 def send_alert_notification(sensor_data, threshold):
     """
-    Kirim notifikasi alert ke user yang terdaftar
+    Kirim notifikasi alert ke penerima yang berlangganan sensor ini
+    
+    Penerima diambil dari indeks langganan in-memory (monitoring/subscriptions.py),
+    jadi tidak ada query UserProfile/User per alert. Kalau ALERT_DIGEST_WINDOW > 0
+    alert hanya diantrekan sebagai PendingAlert untuk send_alert_digests.
     
     Args:
-        sensor_data: SensorData instance
-        threshold: SensorThreshold instance
+        sensor_data: Reading instance
+        threshold: SensorThreshold atau episodes.AlertTrigger (alert_level, message)
     """
-    from .models import AlertNotification, UserProfile
-    
-    device = sensor_data.device
+    from monitoring.models import AlertNotification, PendingAlert
+    from monitoring.subscriptions import subscription_index
+    
+    device = sensor_data.sensor
+    recipients = subscription_index.recipients(device.pk, threshold.alert_level)
+    
+    if getattr(settings, 'ALERT_DIGEST_WINDOW', 0) > 0:
+        # Mode digest: antrekan, send_alert_digests menggabungkan per penerima
+        PendingAlert.objects.bulk_create([
+            PendingAlert(
+                reading=sensor_data,
+                notification_type=channel,
+                recipient=recipient,
+                level=threshold.alert_level,
+                message=f"{device.name} - {threshold.message}",
+            )
+            for channel, addresses in recipients.items()
+            for recipient in addresses
+        ])
+        return
     
-    # Get users yang menerima alert
-    users = UserProfile.objects.filter(
-        receive_email_alerts=True
-    ) | UserProfile.objects.filter(
-        receive_telegram_alerts=True
-    )
+    senders = {
+        'email': send_email_alert,
+        'telegram': send_telegram_alert,
+    }
     
-    for user_profile in users:
-        # Email notification
-        if user_profile.receive_email_alerts and user_profile.user.email:
+    for channel, addresses in recipients.items():
+        for recipient in addresses:
             try:
                 notification = AlertNotification.objects.create(
-                    sensor_data=sensor_data,
-                    notification_type='email',
-                    recipient=user_profile.user.email,
+                    reading=sensor_data,
+                    notification_type=channel,
+                    recipient=recipient,
                     message=f"Alert: {device.name} - {threshold.message}"
                 )
                 
-                send_email_alert(
-                    user_profile.user.email,
-                    device,
-                    sensor_data,
-                    threshold
-                )
+                with metrics.NOTIFICATION_LATENCY.time(notification_type=channel):
+                    senders[channel](recipient, device, sensor_data, threshold)
                 
                 notification.status = 'sent'
-                notification.sent_at = datetime.now()
+                notification.sent_at = timezone.now()
                 notification.save()
                 
             except Exception as e:
-                logger.error(f"Failed to send email alert: {str(e)}")
+                logger.error(f"Failed to send {channel} alert: {str(e)}")
+                metrics.NOTIFICATION_FAILURES.inc(notification_type=channel)
                 notification.status = 'failed'
                 notification.error_message = str(e)
                 notification.save()
-        
-        # Telegram notification
-        if user_profile.receive_telegram_alerts and user_profile.telegram_id:
+
+
+# ========== DIGEST ALERT ==========
+
+DIGEST_MAX_LINES = 50  # pesan Telegram dibatasi 4096 karakter
+
+
+def format_alert_digest(alerts):
+    """
+    Susun subject dan isi satu digest
+
+    Args:
+        alerts: list PendingAlert milik satu penerima, terurut waktu
+    """
+    from monitoring.detectors import LEVEL_ORDER
+    
+    worst = max(alerts, key=lambda alert: LEVEL_ORDER.get(alert.level, 0)).level
+    subject = f'⚠️ Ringkasan alert: {len(alerts)} alert, tertinggi {worst.upper()}'
+    lines = [
+        f"[{alert.level.upper()}] {timezone.localtime(alert.reading.timestamp):%Y-%m-%d %H:%M} {alert.message}"
+        for alert in alerts[:DIGEST_MAX_LINES]
+    ]
+    if len(alerts) > DIGEST_MAX_LINES:
+        lines.append(f"... dan {len(alerts) - DIGEST_MAX_LINES} alert lainnya")
+    return subject, subject + '\n\n' + '\n'.join(lines)
+
+
+def send_alert_digests(now=None, flush=False):
+    """
+    Kirim satu pesan per penerima untuk semua alert yang menunggu
+    
+    Penerima diproses kalau alert tertuanya sudah menunggu ALERT_DIGEST_WINDOW
+    detik (atau semuanya dengan flush=True). Semua email dikirim lewat satu
+    koneksi SMTP dan semua pesan Telegram lewat satu HTTP session, sehingga
+    biaya per jendela sebanding dengan jumlah penerima, bukan alert x penerima.
+    
+    Returns:
+        int: jumlah digest yang dikirim (termasuk yang gagal)
+    """
+    from django.core.mail import EmailMessage, get_connection
+    from django.db.models import Min
+    from monitoring.detectors import LEVEL_ORDER
+    from monitoring.models import AlertNotification, PendingAlert
+    
+    now = now or timezone.now()
+    due = PendingAlert.objects.filter(created_at__lte=now).values('notification_type', 'recipient') \
+        .annotate(first=Min('created_at'))
+    if not flush:
+        due = due.filter(first__lte=now - timedelta(seconds=getattr(settings, 'ALERT_DIGEST_WINDOW', 0)))
+    keys = {(row['notification_type'], row['recipient']) for row in due}
+    if not keys:
+        return 0
+    
+    digests = {}
+    pending = PendingAlert.objects.filter(
+        created_at__lte=now,
+        notification_type__in={key[0] for key in keys},
+        recipient__in={key[1] for key in keys},
+    ).select_related('reading').order_by('created_at')
+    for alert in pending:
+        key = (alert.notification_type, alert.recipient)
+        if key in keys:
+            digests.setdefault(key, []).append(alert)
+    # Klaim dulu supaya alert tidak terkirim dua kali kalau pengiriman macet di tengah.
+    # DELETE per baris: kalau dua proses berjalan bersamaan, alert hanya milik
+    # proses yang DELETE-nya benar-benar menghapus baris itu
+    for key in list(digests):
+        claimed = [alert for alert in digests[key] if PendingAlert.objects.filter(pk=alert.pk).delete()[0] == 1]
+        if claimed:
+            digests[key] = claimed
+        else:
+            del digests[key]
+    
+    notifications = []
+    connection = None
+    session = None
+    try:
+        for (channel, recipient), alerts in digests.items():
+            subject, body = format_alert_digest(alerts)
+            worst = max(alerts, key=lambda alert: LEVEL_ORDER.get(alert.level, 0))
+            notification = AlertNotification(
+                reading_id=worst.reading_id,
+                notification_type=channel,
+                recipient=recipient,
+                message=body,
+                alert_count=len(alerts),
+            )
             try:
-                notification = AlertNotification.objects.create(
-                    sensor_data=sensor_data,
-                    notification_type='telegram',
-                    recipient=user_profile.telegram_id,
-                    message=f"Alert: {device.name} - {threshold.message}"
-                )
-                
-                send_telegram_alert(
-                    user_profile.telegram_id,
-                    device,
-                    sensor_data,
-                    threshold
-                )
-                
+                with metrics.NOTIFICATION_LATENCY.time(notification_type=channel):
+                    if channel == 'email':
+                        if connection is None:
+                            connection = get_connection()
+                            connection.open()
+                        EmailMessage(
+                            subject, body, settings.DEFAULT_FROM_EMAIL, [recipient], connection=connection,
+                        ).send()
+                    elif channel == 'telegram':
+                        if session is None:
+                            session = requests.Session()
+                        send_telegram_text(recipient, body, session=session)
+                    else:
+                        raise ValueError(f"channel digest tidak didukung: {channel}")
                 notification.status = 'sent'
-                notification.sent_at = datetime.now()
-                notification.save()
-                
+                notification.sent_at = timezone.now()
             except Exception as e:
-                logger.error(f"Failed to send telegram alert: {str(e)}")
+                logger.error(f"Failed to send {channel} alert digest: {str(e)}")
+                metrics.NOTIFICATION_FAILURES.inc(notification_type=channel)
                 notification.status = 'failed'
                 notification.error_message = str(e)
-                notification.save()
+            notifications.append(notification)
+    finally:
+        if connection is not None:
+            connection.close()
+        if session is not None:
+            session.close()
+        AlertNotification.objects.bulk_create(notifications)
+    return len(notifications)
+
+
+def send_telegram_text(telegram_id, text, session=None):
+    """Kirim teks polos ke Telegram (session dipakai ulang untuk banyak pesan)"""
+    if not hasattr(settings, 'TELEGRAM_BOT_TOKEN'):
+        logger.warning("Telegram bot token not configured")
+        return
+    
+    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
+    response = (session or requests).post(url, json={'chat_id': telegram_id, 'text': text})
+    response.raise_for_status()
+
+
+def format_alert_message(device, sensor_data, threshold):
+    """
+    Susun subject dan isi alert langsung (teks polos, dipakai semua channel)
+
+    Args:
+        device: Sensor
+        sensor_data: Reading
+        threshold: SensorThreshold atau episodes.AlertTrigger (alert_level, message)
+    """
+    subject = f'⚠️ Alert: {device.name} - {threshold.alert_level.upper()}'
+    values = [
+        f"{label}: {value:.2f} {unit}"
+        for label, value, unit in (
+            ('Water Level', sensor_data.water_level, 'cm'),
+            ('Distance', sensor_data.distance, 'cm'),
+            ('Flow Rate', sensor_data.flow_rate, 'm³/s'),
+        )
+        if value is not None
+    ]
+    lines = [
+        f"🚨 ALERT: {threshold.alert_level.upper()}",
+        '',
+        f"📍 Device: {device.name} ({device.identifier})",
+        *(f"📊 {value}" for value in values),
+        f"⏰ Time: {timezone.localtime(sensor_data.timestamp):%Y-%m-%d %H:%M:%S}",
+        '',
+        f"⚠️ {threshold.message}",
+    ]
+    if device.location:
+        lines += ['', f"Location: {device.location}"]
+    return subject, '\n'.join(lines)
 
 
 def send_email_alert(email, device, sensor_data, threshold):
     """Send email alert"""
-    subject = f'⚠️ Alert: {device.name} - {threshold.alert_level.upper()}'
-    
-    context = {
-        'device': device,
-        'sensor_data': sensor_data,
-        'threshold': threshold,
-        'timestamp': sensor_data.timestamp,
-    }
-    
-    html_message = render_to_string('monitoring/email/alert.html', context)
-    
+    subject, body = format_alert_message(device, sensor_data, threshold)
     send_mail(
         subject=subject,
-        message=threshold.message,
+        message=body,
         from_email=settings.DEFAULT_FROM_EMAIL,
         recipient_list=[email],
-        html_message=html_message,
         fail_silently=False,
     )
 
 
 def send_telegram_alert(telegram_id, device, sensor_data, threshold):
     """Send Telegram alert"""
-    if not hasattr(settings, 'TELEGRAM_BOT_TOKEN'):
-        logger.warning("Telegram bot token not configured")
-        return
-    
-    bot_token = settings.TELEGRAM_BOT_TOKEN
-    
-    message = f"""
-🚨 *ALERT: {threshold.alert_level.upper()}*
-
-📍 Device: {device.name}
-📊 Current Value: {sensor_data.value} {sensor_data.unit}
-⏰ Time: {sensor_data.timestamp.strftime('%Y-%m-%d %H:%M:%S')}
-
-⚠️ {threshold.message}
-
-Location: {device.location_name}
-    """.strip()
-    
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    
-    payload = {
-        'chat_id': telegram_id,
-        'text': message,
-        'parse_mode': 'Markdown'
-    }
-    
-    response = requests.post(url, json=payload)
-    response.raise_for_status()
+    _, body = format_alert_message(device, sensor_data, threshold)
+    send_telegram_text(telegram_id, body)
 
 
 def send_whatsapp_alert(phone_number, device, sensor_data, threshold):
@@ -164,20 +277,11 @@ def send_whatsapp_alert(phone_number, device, sensor_data, threshold):
         settings.TWILIO_AUTH_TOKEN
     )
     
-    message = f"""
-*ALERT: {threshold.alert_level.upper()}*
-
-Device: {device.name}
-Value: {sensor_data.value} {sensor_data.unit}
-Time: {sensor_data.timestamp.strftime('%Y-%m-%d %H:%M:%S')}
-
-{threshold.message}
-    """.strip()
-    
+    _, body = format_alert_message(device, sensor_data, threshold)
     client.messages.create(
         from_=f"whatsapp:{settings.TWILIO_WHATSAPP_NUMBER}",
         to=f"whatsapp:{phone_number}",
-        body=message
+        body=body
     )
 
 
@@ -191,8 +295,11 @@ def generate_pdf_report(report):
     Returns:
         BytesIO: PDF file buffer
     """
-    from .models import SensorData
-    from django.db.models import Avg, Max, Min
+    from monitoring.models import Reading
+    from monitoring.volume import range_volume
+    from monitoring.episodes import summarize
+    from monitoring.resample import resample
+    from django.db.models import Avg, Max, Min, Count, Q
     
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
@@ -235,15 +342,15 @@ def generate_pdf_report(report):
     story.append(Spacer(1, 0.3*inch))
     
     # Device Statistics
-    for device in report.devices.all():
+    for device in report.sensors.all():
         # Device header
         device_title = Paragraph(f"<b>{device.name}</b> ({device.sensor_type})", styles['Heading2'])
         story.append(device_title)
         story.append(Spacer(1, 0.1*inch))
         
         # Get data
-        data = SensorData.objects.filter(
-            device=device,
+        data = Reading.objects.filter(
+            sensor=device,
             timestamp__gte=report.start_date,
             timestamp__lte=report.end_date
         )
@@ -253,23 +360,33 @@ def generate_pdf_report(report):
             story.append(Spacer(1, 0.2*inch))
             continue
         
-        # Statistics
+        # Statistics (hanya reading berkualitas baik)
+        good = Q(quality='good')
         stats = data.aggregate(
-            avg=Avg('value'),
-            max=Max('value'),
-            min=Min('value'),
-            count=models.Count('id')
+            avg_flow=Avg('flow_rate', filter=good),
+            max_flow=Max('flow_rate', filter=good),
+            min_flow=Min('flow_rate', filter=good),
+            avg_distance=Avg('distance', filter=good),
+            max_distance=Max('distance', filter=good),
+            min_distance=Min('distance', filter=good),
+            count=Count('id'),
+            flagged=Count('id', filter=~good),
         )
         
+        def fmt(value):
+            return '-' if value is None else f"{value:.2f}"
+        
         stats_data = [
-            ['Metric', 'Value'],
-            ['Average', f"{stats['avg']:.2f}"],
-            ['Maximum', f"{stats['max']:.2f}"],
-            ['Minimum', f"{stats['min']:.2f}"],
-            ['Total Readings', str(stats['count'])],
+            ['Metric', 'Flow Rate (m³/s)', 'Distance (cm)'],
+            ['Average', fmt(stats['avg_flow']), fmt(stats['avg_distance'])],
+            ['Maximum', fmt(stats['max_flow']), fmt(stats['max_distance'])],
+            ['Minimum', fmt(stats['min_flow']), fmt(stats['min_distance'])],
+            ['Total Volume (m³)', fmt(range_volume(device.pk, report.start_date, report.end_date)), ''],
+            ['Total Readings', str(stats['count']), ''],
+            ['Flagged Readings', str(stats['flagged']), ''],
         ]
         
-        stats_table = Table(stats_data, colWidths=[2*inch, 2*inch])
+        stats_table = Table(stats_data, colWidths=[2*inch, 2*inch, 2*inch])
         stats_table.setStyle(TableStyle([
             ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
@@ -284,18 +401,44 @@ def generate_pdf_report(report):
         story.append(stats_table)
         story.append(Spacer(1, 0.3*inch))
         
-        # Alert Summary
-        alerts = data.exclude(alert_level='safe')
-        if alerts.exists():
-            alert_counts = {}
-            for alert in alerts:
-                alert_counts[alert.alert_level] = alert_counts.get(alert.alert_level, 0) + 1
+        # Grafik distance rata-rata per jam atau lebih (grid reguler, gap <= 3 jam diinterpolasi)
+        period = (report.end_date - report.start_date).total_seconds()
+        interval = max(3600, -(-period // (500 * 3600)) * 3600)
+        series = resample([device.pk], report.start_date, report.end_date, interval,
+                          how='mean', fill='linear', limit=int(3 * 3600 // interval))
+        points = series.column('distance', device.pk)
+        if any(value is not None for value in points):
+            drawing = Drawing(6*inch, 2*inch)
+            chart = HorizontalLineChart()
+            chart.x, chart.y = 40, 20
+            chart.width, chart.height = 6*inch - 60, 2*inch - 40
+            chart.data = [points]
+            chart.joinedLines = 1
+            chart.lines[0].strokeColor = colors.HexColor('#3b82f6')
+            labels = [timestamp.strftime('%d/%m %H:%M') for timestamp in series.timestamps()]
+            step = max(1, len(labels) // 6)
+            chart.categoryAxis.categoryNames = [label if i % step == 0 else '' for i, label in enumerate(labels)]
+            chart.categoryAxis.labels.fontSize = 7
+            chart.valueAxis.labels.fontSize = 7
+            drawing.add(chart)
+            story.append(Paragraph(f"<b>Distance (cm), mean per {interval / 3600:.0f} h</b>", styles['Heading3']))
+            story.append(drawing)
+            story.append(Spacer(1, 0.3*inch))
+        
+        # Alert Summary (dari AlertEpisode, bukan memindai reading)
+        alerts = summarize(device.pk, report.start_date, report.end_date)
+        if alerts:
+            def hours(duration):
+                return f"{duration.total_seconds() / 3600:.1f} h"
             
-            alert_data = [['Alert Level', 'Count']]
-            for level, count in alert_counts.items():
-                alert_data.append([level.capitalize(), str(count)])
+            alert_data = [['Alert Level', 'Episodes', 'Total Duration', 'Longest', 'Peak Flow', 'Min Distance']]
+            for entry in alerts:
+                alert_data.append([
+                    entry['level'].capitalize(), str(entry['episodes']), hours(entry['duration']),
+                    hours(entry['longest']), fmt(entry['peak_flow']), fmt(entry['peak_distance']),
+                ])
             
-            alert_table = Table(alert_data, colWidths=[2*inch, 2*inch])
+            alert_table = Table(alert_data, colWidths=[1.1*inch, 0.9*inch, 1.1*inch, 0.9*inch, 0.9*inch, 1.1*inch])
             alert_table.setStyle(TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ef4444')),
                 ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
@@ -350,6 +493,36 @@ def export_data_to_csv(queryset, fields):
     return output.getvalue()
 
 
+def export_resampled_to_csv(series, sensors, fields):
+    """
+    Export hasil monitoring.resample ke CSV (satu baris per bucket,
+    kolom <identifier>_<field>)
+    
+    Args:
+        series: resample.Series
+        sensors: list Sensor sesuai urutan series.sensor_ids
+        fields: List of field names to export
+        
+    Returns:
+        str: CSV content
+    """
+    import csv
+    import math
+    from io import StringIO
+    
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['timestamp'] + [f"{sensor.identifier}_{field}" for sensor in sensors for field in fields])
+    
+    columns = [series.values[field][i] for i in range(len(sensors)) for field in fields]
+    for j, timestamp in enumerate(series.timestamps()):
+        row = [timestamp.strftime('%Y-%m-%d %H:%M:%S')]
+        row.extend('' if math.isnan(value) else f"{value:.3f}" for value in (column[j] for column in columns))
+        writer.writerow(row)
+    
+    return output.getvalue()
+
+
 def calculate_device_health(device):
     """
     Calculate device health metrics
@@ -361,7 +534,6 @@ def calculate_device_health(device):
         dict: Health metrics
     """
     from .models import SensorData
-    from django.utils import timezone
     
     now = timezone.now()
     